@@ -0,0 +1,40 @@
+"""Compare correct_raw with correct_raw_np on synthetic start times.
+
+Run from the root dir:
+
+$ python benchmark/bench_correct_raw.py
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.abspath(sys.path[0]) + '/../')
+import pact.split
+
+
+def synthetic_starts(n, seed = 42):
+    """n increasing start times (ms), with gaps like real speech."""
+    rng = np.random.default_rng(seed)
+    gaps = rng.exponential(1500.0, n)
+    return np.round(np.cumsum(gaps)).tolist()
+
+
+def timed(f):
+    t = time.perf_counter()
+    ret = f()
+    return (ret, time.perf_counter() - t)
+
+
+if __name__ == '__main__':
+    print('n         python (s)  numpy (s)  speedup')
+    for exp in range(3, 7):
+        n = 10 ** exp
+        starts = synthetic_starts(n)
+        expected, py_secs = timed(lambda: pact.split.correct_raw(list(starts), 2000.0, 200))
+        actual, np_secs = timed(lambda: pact.split.correct_raw_np(starts, 2000.0, 200))
+        if actual.tolist() != expected:
+            print(f'MISMATCH for n = {n}')
+            sys.exit(1)
+        print(f'{n:<9} {py_secs:<11.4f} {np_secs:<10.4f} {py_secs / np_secs:.1f}x')
@@ -0,0 +1,76 @@
+"""Compare the pact.decoder backends, decoding clip-sized ranges of a
+long file, like clip popups and the prefetch do.
+
+The ffmpeg backend starts an ffmpeg for each request, so it's about
+as fast as calling ffmpeg directly.  The pyav backend (needs PyAV, see
+requirements-optional.txt) decodes in-process, saving the process
+start on each request.  Backends that aren't installed are skipped.
+
+Run from the root dir:
+
+$ python benchmark/bench_decoder.py
+$ python benchmark/bench_decoder.py --clips 100 --clip-ms 5000 --file some.mp3
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.abspath(sys.path[0]) + '/../')
+import pact.decoder
+import pact.mp3index
+import pact.pcm
+from benchmark import fixtures
+
+
+def run(backend, in_filename, ranges, concurrent):
+    d = pact.decoder.Decoder(backend = backend)
+    t = time.perf_counter()
+    if concurrent:
+        futures = [ d.submit(in_filename, s, e, pact.pcm.ANALYSIS_RATE, 1) for s, e in ranges ]
+        results = [ f.result()[0] for f in futures ]
+    else:
+        results = [ d.decode(in_filename, s, e, pact.pcm.ANALYSIS_RATE, 1)[0] for s, e in ranges ]
+    secs = time.perf_counter() - t
+    stats = d.stats()
+    d.shutdown()
+    return (results, secs, stats)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark decoder backends')
+    parser.add_argument('--file', help='mp3 to decode (default: a generated 10 minute fixture)')
+    parser.add_argument('--clips', type=int, default=50, help='Number of ranges')
+    parser.add_argument('--clip-ms', type=int, default=4000, help='Length of each range')
+    args = parser.parse_args()
+
+    f = args.file or fixtures.fixture(600)
+    length_ms = pact.pcm.duration_ms(f)
+    rng = random.Random(0)
+    starts = [ rng.uniform(0, length_ms - args.clip_ms) for i in range(0, args.clips) ]
+    ranges = [ (s, s + args.clip_ms) for s in starts ]
+
+    # Warm up the frame index, so neither backend pays for it.
+    pact.mp3index.frame_index(f)
+
+    backends = [ 'ffmpeg' ]
+    if pact.decoder.av is not None:
+        backends.append('pyav')
+    else:
+        print('PyAV not installed, skipping the pyav backend')
+
+    print(f'{args.clips} ranges of {args.clip_ms} ms from {f}')
+    expected = None
+    for backend in backends:
+        for concurrent in [ False, True ]:
+            results, secs, stats = run(backend, f, ranges, concurrent)
+            if expected is None:
+                expected = results
+            elif any([ not np.array_equal(a, b) for a, b in zip(results, expected) ]):
+                print(f'MISMATCH: {backend} gave different samples')
+                sys.exit(1)
+            mode = 'concurrent' if concurrent else 'one at a time'
+            print(f'{backend:7} {mode:14} {secs:6.2f}s total, p50 {stats["p50_ms"]} ms, p95 {stats["p95_ms"]} ms')
@@ -0,0 +1,49 @@
+"""Compare the old python envelope calc with pact.peaks.envelope, for
+a 10 minute range as decoded in get_signal_plot_data.
+
+Run from the root dir:
+
+$ python benchmark/bench_peaks.py
+$ python benchmark/bench_peaks.py --minutes 30
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.abspath(sys.path[0]) + '/../')
+import pact.peaks
+
+
+def python_envelope(samples, window_size):
+    """The envelope calc that get_signal_plot_data used to do."""
+    def chunks(lst, n):
+        for i in range(0, len(lst), n):
+            yield lst[i:i + n]
+    minmax = [ [ min(c), max(c) ] for c in chunks(samples, window_size) ]
+    return [j for sub in minmax for j in sub]
+
+
+def timed(f):
+    t = time.perf_counter()
+    ret = f()
+    return (ret, time.perf_counter() - t)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark envelope calc')
+    parser.add_argument('--minutes', type=int, default=10, help='Length of 44.1kHz stereo audio')
+    parser.add_argument('--window', type=int, default=10000, help='Samples per envelope window')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    samples = rng.integers(-32768, 32767, args.minutes * 60 * 44100 * 2, dtype = np.int16)
+
+    expected, py_secs = timed(lambda: python_envelope(samples, args.window))
+    (mins, maxs), np_secs = timed(lambda: pact.peaks.envelope(samples, args.window))
+    if np.column_stack((mins, maxs)).ravel().tolist() != expected:
+        print('MISMATCH')
+        sys.exit(1)
+    print(f'envelope of {args.minutes} minutes: python {py_secs:.3f}s, numpy {np_secs:.3f}s, {py_secs / np_secs:.0f}x')
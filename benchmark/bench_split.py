@@ -0,0 +1,138 @@
+"""Time pact.split on synthetic audio, and check that what it finds
+matches the known silence gaps.
+
+Run from the root dir:
+
+$ python benchmark/bench_split.py
+$ python benchmark/bench_split.py --lengths 1m,10m,1h,10h --engines ffmpeg,numpy,parallel
+
+Fixtures are generated into benchmark/fixtures the first time (the
+10h one takes a while).  Results are written as json to
+benchmark/results (or --out), so runs can be diffed between versions.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.abspath(sys.path[0]) + '/../')
+import pact.split
+from benchmark import fixtures
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Settings that suit the fixtures: silence_duration is between the
+# short and long gap lengths.
+THRESHOLD = -30
+DURATION = 0.3
+
+
+def parse_length(s):
+    """Seconds for e.g. '90s', '10m', '2h'."""
+    units = { 's': 1, 'm': 60, 'h': 3600 }
+    if s[-1] in units:
+        return float(s[:-1]) * units[s[-1]]
+    return float(s)
+
+
+def timed(f):
+    t = time.perf_counter()
+    ret = f()
+    return (ret, round(time.perf_counter() - t, 4))
+
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd = ROOT, capture_output = True, text = True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def bench_engine(mp3, engine, run_cli):
+    """Timings and accuracy for one fixture and engine."""
+    chunks, raw_secs = timed(lambda: pact.split.ENGINES[engine](mp3, THRESHOLD, DURATION))
+    starts, sst_secs = timed(lambda: pact.split.segment_start_times(
+        mp3,
+        silence_threshold = THRESHOLD,
+        silence_duration = DURATION,
+        use_cache = False,
+        engine = engine))
+
+    result = {
+        'engine': engine,
+        'raw_chunks_seconds': raw_secs,
+        'segment_start_times_seconds': sst_secs,
+        'chunks': len(chunks),
+        'segment_start_times': len(starts),
+        'accuracy': fixtures.accuracy(fixtures.known_gaps(mp3), chunks)
+    }
+
+    if run_cli:
+        cmd = [
+            sys.executable, '-m', 'pact.split', mp3,
+            f'--silence-threshold={THRESHOLD}', f'--silence-duration={DURATION}',
+            '--no-cache', '--engine', engine
+        ]
+        p, cli_secs = timed(lambda: subprocess.run(cmd, cwd = ROOT, capture_output = True))
+        result['cli_seconds'] = cli_secs
+        result['cli_ok'] = p.returncode == 0
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pact.split')
+    parser.add_argument('--lengths', default='1m,10m,1h', help='Fixture lengths, comma-separated (e.g. 1m,10m,1h,10h)')
+    parser.add_argument('--engines', default=','.join(pact.split.ENGINES.keys()), help='Engines, comma-separated')
+    parser.add_argument('--no-cli', dest='cli', action='store_false', help='Skip the end-to-end CLI timing')
+    parser.add_argument('--out', help='Output json file')
+    args = parser.parse_args()
+
+    results = []
+    for length in args.lengths.split(','):
+        seconds = parse_length(length)
+        mp3, gen_secs = timed(lambda: fixtures.fixture(seconds))
+        print(f'{length}: {mp3} ({gen_secs}s to get fixture)')
+        for engine in args.engines.split(','):
+            r = bench_engine(mp3, engine, args.cli)
+            r['length'] = length
+            r['length_seconds'] = seconds
+            a = r['accuracy']
+            print(f'  {engine:<9} raw_chunks {r["raw_chunks_seconds"]}s, ' +
+                  f'segment_start_times {r["segment_start_times_seconds"]}s, ' +
+                  f'cli {r.get("cli_seconds", "-")}s, ' +
+                  f'matched {a["matched"]}/{a["expected"]}, spurious {a["spurious"]}')
+            results.append(r)
+
+    now = datetime.datetime.now()
+    out = args.out or os.path.join(
+        ROOT, 'benchmark', 'results', f'split-{now.strftime("%Y%m%d-%H%M%S")}.json')
+    os.makedirs(os.path.dirname(out), exist_ok = True)
+    with open(out, 'w') as f:
+        f.write(json.dumps({
+            'date': now.isoformat(timespec = 'seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'threshold': THRESHOLD,
+            'duration': DURATION,
+            'results': results
+        }, indent = 2))
+    print(f'results written to {out}')
+
+    if not all([ r['accuracy']['ok'] for r in results ]):
+        print('ACCURACY CHECK FAILED')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Time getting clip audio ready for vosk: the old temp wav route vs
+decoding straight to 16 kHz mono in memory.
+
+No vosk model is needed, the audio is fed to a recognizer that just
+counts bytes, so this only measures the handoff.
+
+Run from the root dir:
+
+$ python benchmark/bench_transcription_input.py
+$ python benchmark/bench_transcription_input.py --clips 50 --clip-seconds 8
+"""
+
+import argparse
+import ffmpeg
+import os
+import sys
+import time
+import wave
+from pydub import AudioSegment
+from tempfile import NamedTemporaryFile
+
+sys.path.append(os.path.abspath(sys.path[0]) + '/../')
+import pact.pcm
+from pact.plugins.transcription import vosktranscription
+from benchmark import fixtures
+
+
+class CountingRecognizer:
+
+    def __init__(self):
+        self.bytes = 0
+
+    def AcceptWaveform(self, data):
+        self.bytes += len(data)
+        return False
+
+    def PartialResult(self):
+        return '{}'
+
+    def FinalResult(self):
+        return '{}'
+
+
+def old_audiosegment_from_mp3_time_range(mp3, s, e):
+    """The original pact.utils.audiosegment_from_mp3_time_range: ffmpeg
+    copies the range to a temp mp3, which pydub then decodes.  (The
+    current one goes through the decoder service, so it can't be used
+    for the old route.)"""
+    with NamedTemporaryFile("w+b", suffix=".mp3") as f:
+        (
+            ffmpeg
+            .input(mp3, ss = (s / 1000.0), t = ((e - s) / 1000.0))
+            .output(f.name, acodec='copy', **{'vsync':'vfr', 'loglevel':'error'})
+            .overwrite_output()
+            .run()
+        )
+        return AudioSegment.from_mp3(f.name)
+
+
+def temp_wav_route(mp3, s, e):
+    """What transcribe_audiosegment used to do: temp mp3 ->
+    AudioSegment -> temp wav.  Returns (bytes fed, bytes written to
+    disk)."""
+    seg = old_audiosegment_from_mp3_time_range(mp3, s, e).set_channels(1)
+    rec = CountingRecognizer()
+    with NamedTemporaryFile("w+b", suffix=".wav") as f:
+        seg.export(f.name, format='wav')
+        written = os.path.getsize(f.name)
+        wf = wave.open(f.name, "rb")
+        while True:
+            data = wf.readframes(4000)
+            rec.AcceptWaveform(data)
+            if len(data) == 0:
+                break
+        wf.close()
+    return (rec.bytes, written)
+
+
+def memory_route(mp3, s, e):
+    seg = pact.pcm.speech_segment(mp3, s, e)
+    rec = CountingRecognizer()
+    vosktranscription.feed_recognizer(rec, seg.raw_data, vosktranscription.TranscriptionCallback())
+    return (rec.bytes, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark clip handoff to vosk')
+    parser.add_argument('--clips', type=int, default=20, help='Number of clips')
+    parser.add_argument('--clip-seconds', type=float, default=8, help='Clip length')
+    args = parser.parse_args()
+
+    mp3 = fixtures.fixture(600)
+    clip_ms = args.clip_seconds * 1000
+    ranges = [ (i * 25000 + 1234, i * 25000 + 1234 + clip_ms) for i in range(0, args.clips) ]
+
+    for name, route in [ ('temp wav', temp_wav_route), ('in memory', memory_route) ]:
+        t = time.perf_counter()
+        fed = 0
+        written = 0
+        for s, e in ranges:
+            f, w = route(mp3, s, e)
+            fed += f
+            written += w
+        ms = (time.perf_counter() - t) * 1000 / len(ranges)
+        print(f'{name:<10} {ms:.1f} ms/clip, {fed // len(ranges)} bytes fed, {written // len(ranges)} bytes to disk per clip')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Synthetic speech-like mp3s with known silence gaps, for benchmarks.
+
+The audio is "phrases" (a buzzy tone with a syllable-ish wobble, plus
+a bit of noise) separated by gaps of near-silence.  Gaps are either
+short (shorter than a typical silence_duration, so they shouldn't be
+found) or long (so they should), and the long gaps are saved next to
+the mp3 so that the benchmark can check what pact.split finds.
+"""
+
+import bisect
+import json
+import os
+import ffmpeg
+import numpy as np
+
+
+RATE = 16000
+
+# Where generated files go (ignored by git).
+fixture_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Levels, as fractions of full scale.
+PHRASE_LEVEL = 0.5   # about -6 dB peak
+GAP_LEVEL = 0.001    # about -60 dB
+
+# Gap lengths in seconds.  Detection settings used with these should
+# have a silence_duration between the two ranges.
+SHORT_GAPS = (0.05, 0.15)
+LONG_GAPS = (0.5, 1.5)
+
+
+def _phrase(rng, seconds):
+    n = int(seconds * RATE)
+    t = np.arange(n) / RATE
+    f0 = rng.uniform(100, 250)
+    tone = sum([ np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 5) ])
+    tone /= np.abs(tone).max()
+    syllables = 0.6 + 0.4 * np.sin(2 * np.pi * rng.uniform(3, 6) * t)
+    # Fade in and out over 10 ms, so there are no clicks.
+    fade = np.minimum(1, np.minimum(np.arange(n), np.arange(n)[::-1]) / (RATE * 0.01))
+    noise = rng.normal(0, 0.05, n)
+    return PHRASE_LEVEL * fade * (tone * syllables + noise) / 1.2
+
+
+def _gap(rng, seconds):
+    n = int(seconds * RATE)
+    return rng.normal(0, GAP_LEVEL / 3, n).clip(-GAP_LEVEL, GAP_LEVEL)
+
+
+def blocks(rng, length_s):
+    """Generator of (samples, long_gap) where long_gap is a (start_ms,
+    end_ms) for the long gaps, or None.  Starts and ends with a
+    phrase."""
+    pos = 0
+    while True:
+        seconds = rng.uniform(0.5, 4)
+        if pos + seconds * RATE > length_s * RATE:
+            seconds = max(0.5, length_s - pos / RATE)
+        p = _phrase(rng, seconds)
+        yield (p, None)
+        pos += len(p)
+        if pos >= (length_s - 2) * RATE:
+            return
+
+        is_long = rng.random() < 0.5
+        g = _gap(rng, rng.uniform(*(LONG_GAPS if is_long else SHORT_GAPS)))
+        gap = None
+        if is_long:
+            gap = (pos * 1000.0 / RATE, (pos + len(g)) * 1000.0 / RATE)
+        yield (g, gap)
+        pos += len(g)
+
+
+def fixture(length_s, seed = 42):
+    """Path of the mp3 of length_s seconds, generating it if needed.
+    The long gaps are in the .json file with the same name."""
+    name = os.path.join(fixture_dir, f'synthetic_{int(length_s)}s_{seed}')
+    mp3 = f'{name}.mp3'
+    gapfile = f'{name}.json'
+    if os.path.exists(mp3) and os.path.exists(gapfile):
+        return mp3
+
+    os.makedirs(fixture_dir, exist_ok = True)
+    rng = np.random.default_rng(seed)
+    gaps = []
+    p = (
+        ffmpeg
+        .input('pipe:', format='s16le', ar=RATE, ac=1)
+        .output(mp3, audio_bitrate='32k', loglevel='error')
+        .overwrite_output()
+        .run_async(pipe_stdin=True)
+    )
+    # Write in bigger pieces, piping each phrase separately is slow.
+    pending = []
+    pending_len = 0
+    for samples, gap in blocks(rng, length_s):
+        pending.append(samples)
+        pending_len += len(samples)
+        if gap is not None:
+            gaps.append(gap)
+        if pending_len > RATE * 60:
+            p.stdin.write((np.concatenate(pending) * 32767).astype(np.int16).tobytes())
+            pending = []
+            pending_len = 0
+    if pending_len > 0:
+        p.stdin.write((np.concatenate(pending) * 32767).astype(np.int16).tobytes())
+    p.stdin.close()
+    p.wait()
+
+    with open(gapfile, 'w') as f:
+        f.write(json.dumps({ 'length_s': length_s, 'seed': seed, 'gaps': gaps }))
+    return mp3
+
+
+def known_gaps(mp3):
+    """The long gaps saved when the fixture was generated."""
+    with open(os.path.splitext(mp3)[0] + '.json') as f:
+        return [ tuple(g) for g in json.loads(f.read())['gaps'] ]
+
+
+def accuracy(expected_gaps, chunks, tolerance_ms = 50):
+    """How well the silences between chunks match the known gaps.
+
+    A found silence matches a gap if both its start and end are
+    within tolerance_ms of the gap's.
+    """
+    found = [
+        (chunks[i][1], chunks[i + 1][0])
+        for i in range(0, len(chunks) - 1)
+    ]
+    # Both lists are in order and don't overlap, so only the found
+    # silences starting near the gap start need checking.
+    found_starts = [ f[0] for f in found ]
+    used = set()
+    start_errors = []
+    end_errors = []
+    missed = 0
+    for gs, ge in expected_gaps:
+        i = bisect.bisect_left(found_starts, gs - tolerance_ms)
+        match = None
+        while i < len(found) and found[i][0] <= gs + tolerance_ms:
+            if i not in used and abs(found[i][1] - ge) <= tolerance_ms:
+                match = i
+                break
+            i += 1
+        if match is None:
+            missed += 1
+            continue
+        used.add(match)
+        start_errors.append(abs(found[match][0] - gs))
+        end_errors.append(abs(found[match][1] - ge))
+
+    def _mean(vals):
+        return round(sum(vals) / len(vals), 1) if len(vals) > 0 else None
+
+    return {
+        'expected': len(expected_gaps),
+        'found': len(found),
+        'matched': len(start_errors),
+        'missed': missed,
+        'spurious': len(found) - len(used),
+        'mean_start_error_ms': _mean(start_errors),
+        'mean_end_error_ms': _mean(end_errors),
+        'max_error_ms': max(start_errors + end_errors, default = None),
+        'ok': missed == 0 and len(found) == len(used)
+    }
@@ -1,19 +1,16 @@
 # GUI
 
+import bisect
+import concurrent.futures
 import configparser
 import json
-import matplotlib.pyplot as plt
 import numpy as np
-import ffmpeg
 import os
 import pickle
 import tkinter.ttk as ttk
+import threading
 import wave
-import subprocess
 
-from matplotlib import pyplot
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
 from mutagen.mp3 import MP3
 from pydub import AudioSegment
 from tempfile import NamedTemporaryFile
@@ -23,13 +20,18 @@ import tkinter.scrolledtext as scrolledtext
 from tkinter import messagebox
 
 import pact.anki
+import pact.decoder
 import pact.music
+import pact.peaks
+import pact.prefetch
+import pact.pcm
 import pact.utils
 from pact.utils import Profile
 import pact.widgets
 from pact.utils import TimeUtils
 from pact._version import __version__
 import pact.textmatch
+import pact.wordtimeline
 from pact.plugins.transcription import vosktranscription, unknown
 import pact.split
 
@@ -58,6 +60,7 @@ class Config(configparser.ConfigParser):
         # print(f'got vosk model = {voskmodel}')
         if voskmodel != '':
             ts = vosktranscription.VoskTranscriptionStrategy(voskmodel)
+            ts.preload()
         config.transcription_strategy = ts
         
         os.environ['PACT.Vosk.Model'] = 'DUMMY_HERE'
@@ -81,7 +84,6 @@ class MainWindow:
 
         self.config = config
         self.music_file = None
-        # self.candidate_break_times = None
         self.song_length_ms = 0
         self.transcription_file = None
 
@@ -97,6 +99,31 @@ class MainWindow:
         # popup window for editing clips, storing as member for testing.
         self.bookmark_window = None
 
+        # Silences for the whole track, calculated in the background
+        # after the mp3 is loaded.
+        self.silence_index = None
+        self.silence_scan = None
+        self.silence_scan_poll_id = None
+
+        # Optional decoded copy of the track, for fast clip extraction.
+        self.pcm_store = None
+        self.pcm_build = None
+
+        # Words of the whole track, transcribed in the background if
+        # WordTimeline is on in the config.
+        self.word_timeline = None
+        self.track_transcription = None
+
+        # Gets the clips next to the one being edited ready.
+        self.prefetch = None
+
+        # Waveform peaks for the whole track, built in the background.
+        self.peaks = None
+        self.peaks_build = None
+
+        clip_cache_mb = self.config['Pact'].getint('ClipCacheMB', fallback = 100)
+        pact.utils.clip_cache.max_bytes = clip_cache_mb * 1024 * 1024
+
         menubar = Menu(self.window)
         self.menubar = menubar
         self.window['menu'] = menubar
@@ -201,6 +228,15 @@ class MainWindow:
         self.slider_lbl.grid(row=1, column=1, pady=2)
         self.slider_var.trace('w', lambda a,b,c: self.on_slider_var_update())
 
+        self.silence_scan_progress = ttk.Progressbar(
+            slider_frame,
+            orient='horizontal',
+            mode='determinate',
+            length=360
+        )
+        self.silence_scan_progress.grid(row=2, column=1, pady=2)
+        self.silence_scan_progress.grid_remove()
+
         self.music_player = pact.music.MusicPlayer(self.slider, self.update_play_button_text)
 
         # Previously, I had 'space' handle start/stop, but that
@@ -292,7 +328,12 @@ class MainWindow:
             music_file = self.music_file,
             song_length_ms = self.song_length_ms,
             transcription_file = self.transcription_file,
-            on_close = lambda: self.popup_clip_window_closed(i)
+            on_close = lambda: self.popup_clip_window_closed(i),
+            silence_index = self.silence_index,
+            pcm_store = self.pcm_store,
+            peaks = self.peaks,
+            word_timeline = self.word_timeline,
+            prefetch = self.start_prefetch(i)
         )
         self.bookmark_window = popup
 
@@ -471,9 +512,9 @@ class MainWindow:
 
         self.music_player.load_song(f, self.song_length_ms)
 
-        # Possible future optimization: calc and save candidate break
-        # times in advance.
-        # self.candidate_break_times = self.__get_candidate_break_times()
+        self.start_silence_scan()
+        self.start_pcm_store()
+        self.start_peaks()
 
         self.bookmarks = [ MainWindow.FullTrackBookmark() ]
         self.reload_bookmark_list()
@@ -482,22 +523,215 @@ class MainWindow:
             self.session_file = f"{self.music_file}.temp.pact"
             self.save_pact_file()
 
+        self.start_word_timeline()
 
-    def __get_candidate_break_times(self):
-        # TODO: show progress bar on GUI.
-        ref_start = 0
-        def onChunkStartFound(ms):
-            nonlocal ref_start
-            if (ms - ref_start > 60000):
-                print(pact.utils.TimeUtils.time_string(ms))
-                ref_start = ms
 
-        return pact.split.segment_start_times(
-            in_filename = self.music_file,
-            min_duration_ms = 2000.0,
-            shift_ms = 200.0,
-            onChunkStartFound = onChunkStartFound
-        )
+    class SilenceScan:
+        """Scan of the full track for silences, run on a background
+        thread.  If the auto settings aren't cached yet, working them
+        out is a first pass over the track."""
+
+        class Stopped(Exception):
+            pass
+
+        def __init__(self, music_file):
+            self.music_file = music_file
+            self.passes = 1
+            self.passes_done = 0
+            self.progress_ms = 0
+            self.index = None
+            self.error = None
+            self.thread = vosktranscription.VoskTranscriptionStrategy.StoppableThread(target=self.__do_scan, daemon=True)
+            self.thread.start()
+
+        def __do_scan(self):
+            def onProgress(ms):
+                if self.thread.stopped():
+                    raise MainWindow.SilenceScan.Stopped()
+                self.progress_ms = ms
+            try:
+                settings = pact.split.auto_settings(self.music_file, compute = False)
+                if settings is None:
+                    self.passes = 2
+                    settings = pact.split.auto_settings(self.music_file, onProgress = onProgress)
+                    self.passes_done = 1
+                    self.progress_ms = 0
+                threshold, duration = settings
+                chunks = pact.split.cached_raw_chunks(
+                    self.music_file,
+                    threshold,
+                    duration,
+                    onChunkStartFound = onProgress
+                )
+                self.index = pact.split.SilenceIndex(chunks)
+            except MainWindow.SilenceScan.Stopped:
+                pass
+            except Exception as e:
+                self.error = e
+
+        def percent(self, length_ms):
+            """Progress over all the passes, 0 to 100."""
+            if length_ms <= 0:
+                return 0
+            pass_fraction = min(1.0, self.progress_ms / length_ms)
+            return int(100 * (self.passes_done + pass_fraction) / self.passes)
+
+        def done(self):
+            return not self.thread.is_alive()
+
+        def stop(self):
+            self.thread.stop()
+
+
+    def start_silence_scan(self):
+        """Find the silences in the whole track once, so that clip
+        popups don't have to run their own scans.  Reloading the same
+        track keeps a scan that's still running."""
+        old = self.silence_scan
+        if old is not None and old.music_file == self.music_file and not old.thread.stopped():
+            return
+        if old is not None:
+            old.stop()
+        self.silence_index = None
+        self.silence_scan = MainWindow.SilenceScan(self.music_file)
+        self.silence_scan_progress['value'] = 0
+        self.silence_scan_progress.grid()
+        if self.silence_scan_poll_id is None:
+            self.poll_silence_scan()
+
+
+    def poll_silence_scan(self):
+        """Update the GUI with scan progress.  The scan thread doesn't
+        touch tkinter, the GUI checks in on it."""
+        self.silence_scan_poll_id = None
+        scan = self.silence_scan
+        if scan is None:
+            return
+
+        if not scan.done():
+            self.silence_scan_progress['value'] = min(100, scan.percent(self.song_length_ms))
+            self.silence_scan_poll_id = self.window.after(250, self.poll_silence_scan)
+            return
+
+        if scan.error:
+            print(f'silence scan failed: {scan.error}')
+        self.silence_index = scan.index
+        self.silence_scan = None
+        self.silence_scan_progress.grid_remove()
+
+
+    def start_build(self, build):
+        """Start a StoppableThread running build(should_stop)."""
+        t = vosktranscription.VoskTranscriptionStrategy.StoppableThread(
+            target=lambda: build(should_stop = t.stopped), daemon=True)
+        t.start()
+        return t
+
+
+    def building(self, old, new, build_thread):
+        """True if old is new's file, and is ready or still being
+        built, so a reload can keep it."""
+        if old is None or old.path != new.path:
+            return False
+        return old.ready() or (build_thread is not None and build_thread.is_alive())
+
+
+    def start_pcm_store(self):
+        """Decode the track to a PcmStore in the background, if the
+        store is turned on in the config.  Clip windows use the store
+        once it's ready, and fall back to ffmpeg until then.
+        Reloading the same track keeps the store (and its build)."""
+        if not self.config['Pact'].getboolean('PcmStore', fallback = False):
+            self.pcm_store = None
+            return
+        store = pact.pcm.PcmStore(self.music_file)
+        if self.building(self.pcm_store, store, self.pcm_build):
+            return
+        if self.pcm_build is not None:
+            self.pcm_build.stop()
+            self.pcm_build = None
+        self.pcm_store = store
+        if not store.ready():
+            self.pcm_build = self.start_build(store.build)
+
+
+    def start_peaks(self):
+        """Build the track's waveform PeakPyramid in the background, if
+        it's not saved already.  Clip windows decode their own
+        waveform until it's ready.  Reloading the same track keeps
+        the pyramid (and its build)."""
+        peaks = pact.peaks.PeakPyramid(self.music_file)
+        if self.building(self.peaks, peaks, self.peaks_build):
+            return
+        if self.peaks_build is not None:
+            self.peaks_build.stop()
+            self.peaks_build = None
+        self.peaks = peaks
+        if not peaks.ready():
+            self.peaks_build = self.start_build(peaks.build)
+
+
+    class TrackTranscription:
+        """Transcription of the whole track into a WordTimeline, run on
+        a background thread."""
+
+        def __init__(self, music_file, model_dir, timeline):
+            self.music_file = music_file
+            self.model_dir = model_dir
+            self.timeline = timeline
+            self.thread = vosktranscription.VoskTranscriptionStrategy.StoppableThread(target=self.__do_transcription, daemon=True)
+            self.thread.start()
+
+        def __do_transcription(self):
+            try:
+                model = vosktranscription.models.get(self.model_dir)
+                vosktranscription.transcribe_track(
+                    self.music_file, model, self.timeline, should_stop = self.thread.stopped)
+            except Exception as e:
+                print(f'track transcription failed: {e}')
+
+        def stop(self):
+            """Stop, letting the thread save what it has so far."""
+            self.thread.stop()
+            self.thread.join(timeout = 5)
+
+
+    def start_word_timeline(self):
+        """Transcribe the whole track in the background, if WordTimeline
+        is turned on in the config, so clip transcriptions are just
+        lookups.  The timeline is saved next to the session file."""
+        if self.track_transcription is not None:
+            self.track_transcription.stop()
+            self.track_transcription = None
+        self.word_timeline = None
+
+        ts = self.config.transcription_strategy
+        if not isinstance(ts, vosktranscription.VoskTranscriptionStrategy):
+            return
+        if not self.config['Pact'].getboolean('WordTimeline', fallback = False):
+            return
+        path = pact.wordtimeline.WordTimeline.path_for(self.session_file)
+        self.word_timeline = pact.wordtimeline.WordTimeline(
+            path, self.music_file, vosktranscription.model_id(ts.model_dir))
+        if not self.word_timeline.complete:
+            self.track_transcription = MainWindow.TrackTranscription(
+                self.music_file, ts.model_dir, self.word_timeline)
+
+
+    def start_prefetch(self, i):
+        """Start getting the next and previous bookmarks' clips ready
+        while bookmark i is being edited."""
+        if self.prefetch is None:
+            self.prefetch = pact.prefetch.NeighbourPrefetch(
+                self.config.transcription_strategy, self.pcm_store, self.word_timeline)
+        self.prefetch.pcm_store = self.pcm_store
+        self.prefetch.word_timeline = self.word_timeline
+        neighbours = [
+            self.bookmarks[j] for j in [ i + 1, i - 1 ]
+            if j > 0 and j < len(self.bookmarks)  # 0 is the full track
+        ]
+        self.prefetch.start(self.music_file, neighbours)
+        return self.prefetch
 
 
     def load_transcription(self):
@@ -539,7 +773,19 @@ class MainWindow:
 
 
     def quit(self):
+        print(f'clip cache: {pact.utils.clip_cache.stats()}')
+        print(f'decoder: {pact.decoder.service.stats()}')
+        print(f'vosk models: {vosktranscription.models.stats()}')
         self.music_player.stop()
+        if self.prefetch is not None:
+            self.prefetch.stop()
+        if self.track_transcription is not None:
+            self.track_transcription.stop()
+        for t in [ self.silence_scan, self.pcm_build, self.peaks_build ]:
+            if t is not None:
+                t.stop()
+        if self.silence_scan_poll_id is not None:
+            self.window.after_cancel(self.silence_scan_poll_id)
         self.window.destroy()
 
 
@@ -668,11 +914,19 @@ Update '{fieldname}' in the session file and try again."""
         self.reload_bookmark_list()
 
 
+# Workers for the slow parts of opening a BookmarkWindow.
+popup_workers = concurrent.futures.ThreadPoolExecutor(max_workers = 4)
+
+
 class BookmarkWindow(object):
     """Bookmark / clip editing window."""
 
-    def __init__(self, parent, config, bookmark, allbookmarks, music_file, song_length_ms, transcription_file, on_close):
+    def __init__(self, parent, config, bookmark, allbookmarks, music_file, song_length_ms, transcription_file, on_close, silence_index = None, pcm_store = None, peaks = None, word_timeline = None, prefetch = None):
         self.config = config
+        self.word_timeline = word_timeline
+        self.prefetch = prefetch
+        self.pcm_store = pcm_store
+        self.peaks = peaks
         self.bookmark = bookmark
         self.music_file = music_file
         self.song_length_ms = song_length_ms
@@ -687,21 +941,15 @@ class BookmarkWindow(object):
 
         self.from_val, self.to_val = self.get_slider_from_to(bookmark, allbookmarks)
 
-        breaks = Profile('breaks')
-        # List of potential "clip start times" within the range.
-        self.candidate_break_times = pact.split.segment_start_times(
-            in_filename = music_file,
-            start_ms = self.from_val,
-            end_ms = self.to_val,
-            min_duration_ms = 2000.0,
-            shift_ms = 200.0
-        )
-        breaks.stop()
-
-        # Pre-calc graphing data.  If from_val or to_val change, must recalc.
-        pplot = Profile('get_signal_plot_data')
-        self.signal_plot_data = self.get_signal_plot_data(self.from_val, self.to_val)
-        pplot.stop()
+        # The potential "clip start times" within the range and the
+        # graphing data can take a while to calculate (ffmpeg), so
+        # do them in the background, and draw them when they're
+        # ready.  If from_val or to_val change, must recalc.
+        self.candidate_break_times = []
+        self.signal_plot_data = None
+        self.breaks_future = popup_workers.submit(self.get_candidate_break_times, silence_index)
+        self.plot_data_future = popup_workers.submit(self.get_signal_plot_data, self.from_val, self.to_val)
+        self.poll_id = None
 
         # Start the clip at the bookmark value for now, good enough.
         clip_bounds = bookmark.clip_bounds_ms
@@ -719,21 +967,15 @@ class BookmarkWindow(object):
         slider_frame = Frame(self.root)
         slider_frame.grid(row=1, column=0, pady=5)
 
-        pgrid = Profile('plot and grid')
-        w, fig = self.plot(slider_frame, 7)
-        w.grid(row=0, column=0, pady=5)
-        pgrid.stop()
-
-        # Keep a handle on fig, so can close it when the window
-        # closes; otherwise, this eventually gets a warning.
-        # ref https://heitorpb.github.io/bla/2020/03/18/close-matplotlib-figures/
-        self.fig = fig
-
-        # Had to guess the best slider length, as I couldn't figure
-        # out how to calculate it exactly using the matplotlib figure
-        # dimensions.
+        # Had to guess the best slider length, so that the slider
+        # lines up with the waveform and markers.
         length_eyeballed = 7 * 55
 
+        # Waveform, with the signal and breaks drawn when they're ready.
+        wc = Canvas(slider_frame, width=length_eyeballed, height = 30, highlightthickness = 0)
+        wc.grid(row=0, column=0, pady=5)
+        self.waveform = pact.widgets.WaveformWidget(wc, length_eyeballed, 30, self.from_val, self.to_val)
+
         # Slider markers indicating clip start/end.
         c = Canvas(slider_frame, width=length_eyeballed, height = 10)
         c.grid(row = 1, column = 0, pady=0)
@@ -873,10 +1115,69 @@ class BookmarkWindow(object):
         self.root.grab_set()
         self.root.transient(parent.window)
 
+        self.poll_background_work()
+
         if self.config.autoplayclips:
             self.play_clip()
 
 
+    def get_candidate_break_times(self, silence_index):
+        """Potential clip start times in the slider range.  Uses the full
+        track scan if it's done.  Called on a worker thread."""
+        if silence_index is not None:
+            return silence_index.segment_start_times(
+                start_ms = self.from_val,
+                end_ms = self.to_val,
+                min_duration_ms = 2000.0,
+                shift_ms = 200.0
+            )
+
+        # Don't hold up the breaks calculating the auto settings, the
+        # full track scan does that.
+        settings = pact.split.auto_settings(self.music_file, compute = False)
+        if settings is None:
+            settings = (pact.split.DEFAULT_THRESHOLD, pact.split.DEFAULT_DURATION)
+        return pact.split.segment_start_times(
+            in_filename = self.music_file,
+            start_ms = self.from_val,
+            end_ms = self.to_val,
+            silence_threshold = settings[0],
+            silence_duration = settings[1],
+            min_duration_ms = 2000.0,
+            shift_ms = 200.0
+        )
+
+
+    def poll_background_work(self):
+        """Draw the breaks and waveform when the workers are done.  The
+        workers don't touch tkinter, the GUI checks in on them."""
+        self.poll_id = None
+
+        def _result(future, name):
+            try:
+                return future.result()
+            except Exception as e:
+                print(f'{name} failed: {e}')
+                return None
+
+        if self.breaks_future is not None and self.breaks_future.done():
+            breaks = _result(self.breaks_future, 'candidate break times')
+            self.breaks_future = None
+            if breaks is not None:
+                self.candidate_break_times = breaks
+                self.draw_breaks()
+
+        if self.plot_data_future is not None and self.plot_data_future.done():
+            data = _result(self.plot_data_future, 'signal plot data')
+            self.plot_data_future = None
+            if data is not None:
+                self.signal_plot_data = data
+                self.draw_signal()
+
+        if self.breaks_future is not None or self.plot_data_future is not None:
+            self.poll_id = self.root.after(50, self.poll_background_work)
+
+
     def reposition_popup(self, parent, delta_x, delta_y):
         win_x = parent.winfo_rootx() + delta_x
         win_y = parent.winfo_rooty() + delta_y
@@ -894,6 +1195,7 @@ class BookmarkWindow(object):
         set_marker(s)
         if e > s:
             set_marker(e)
+        self.waveform.set_clip_bounds(s, e)
 
 
     def get_slider_from_to(self, bk, allbookmarks):
@@ -962,7 +1264,9 @@ class BookmarkWindow(object):
         bounds = self.get_clip_bounds()
         if not bounds:
             return None
-        return pact.utils.audiosegment_from_mp3_time_range(self.music_file, bounds[0], bounds[1])
+        if self.pcm_store is not None and self.pcm_store.ready():
+            return self.pcm_store.segment(bounds[0], bounds[1])
+        return pact.utils.clip_cache.get(self.music_file, bounds[0], bounds[1])
         
 
     def play_clip(self):
@@ -987,22 +1291,33 @@ class BookmarkWindow(object):
 
 
     def previous_start(self):
+        # candidate_break_times is sorted.
         curr_pos = self.slider_var.get()
-        c = [p for p in self.candidate_break_times if p < curr_pos]
-        if len(c) == 0:
+        i = bisect.bisect_left(self.candidate_break_times, curr_pos)
+        if i == 0:
             return curr_pos
-        return max(c)
+        return self.candidate_break_times[i - 1]
 
     def next_start(self):
         curr_pos = self.slider_var.get()
-        c = [p for p in self.candidate_break_times if p > curr_pos]
-        if len(c) == 0:
+        i = bisect.bisect_right(self.candidate_break_times, curr_pos)
+        if i == len(self.candidate_break_times):
             return curr_pos
-        return min(c)
+        return self.candidate_break_times[i]
+
+    def get_speech_clip(self):
+        """Clip for transcription.  Decoded to mono at the rate vosk
+        uses, unless the whole file is already in memory."""
+        bounds = self.get_clip_bounds()
+        if not bounds:
+            return None
+        if self.pcm_store is not None and self.pcm_store.ready():
+            return self.pcm_store.segment(bounds[0], bounds[1])
+        return pact.utils.clip_cache.speech(self.music_file, bounds[0], bounds[1])
 
     def transcribe(self):
-        c = self.get_clip()
-        if c is None:
+        bounds = self.get_clip_bounds()
+        if bounds is None:
             return
 
         def __set_transcription(transcription):
@@ -1035,11 +1350,33 @@ class BookmarkWindow(object):
 
         self.stop_current_transcription()
         self.transcription_textbox.config(bg='white')
+
+        if self.word_timeline is not None and self.word_timeline.covers(*bounds):
+            __update_progressbar(100)
+            __try_transcription_search(self.word_timeline.text(*bounds))
+            return
+
+        # Only decode the clip if the timeline doesn't have it.
+        c = self.get_speech_clip()
+        if c is None:
+            return
+
+        # Interactive transcription comes first, carry on prefetching
+        # after it's done.
+        if self.prefetch is not None:
+            self.prefetch.stop()
+
+        def __finished(s):
+            __try_transcription_search(s)
+            if self.prefetch is not None:
+                self.prefetch.resume()
+
         self.config.transcription_strategy.start(
             audiosegment = c,
             on_update_transcription = lambda s: __set_transcription(s),
             on_update_progress = lambda n: __update_progressbar(n),
-            on_finished = lambda s: __try_transcription_search(s)
+            on_finished = lambda s: __finished(s),
+            clip = (self.music_file, *bounds)
         )
 
 
@@ -1161,11 +1498,14 @@ class BookmarkWindow(object):
 
 
     def ok(self):
+        if self.poll_id is not None:
+            self.root.after_cancel(self.poll_id)
+        for f in [ self.breaks_future, self.plot_data_future ]:
+            if f is not None:
+                f.cancel()
         self.music_player.stop()
         self.stop_current_transcription()
         self.save_clip()
-        if self.fig:
-            plt.close(self.fig)
         self.root.grab_release()
         self.root.destroy()
 
@@ -1174,17 +1514,12 @@ class BookmarkWindow(object):
 
 
     def get_signal_plot_data(self, from_val, to_val):
-        # ref https://github.com/kkroening/ffmpeg-python/issues/78
+        if self.peaks is not None and self.peaks.ready():
+            times, mins, maxs = self.peaks.peaks(from_val, to_val)
+            return (np.repeat(times, 2), np.column_stack((mins, maxs)).ravel())
+
         p = Profile('get rawsignal')
-        cmd = (
-            ffmpeg
-            .input(self.music_file, ss=(from_val/1000.0), t=(to_val-from_val)/1000.0)
-            .output('pipe:', format='wav')
-            .compile()
-        ) + ['-nostats'],  # FIXME: use .nostats() once it's implemented in ffmpeg-python.
-        sp = subprocess.Popen(cmd[0], stderr = subprocess.PIPE, stdout = subprocess.PIPE)
-        out = sp.communicate()[0]
-        rawsignal = np.frombuffer(out, 'int16')
+        rawsignal, _, _ = pact.decoder.service.decode(self.music_file, from_val, to_val, channels = 1)
         p.stop()
 
         # Since we're only using the signal to generate a plot, we
@@ -1192,13 +1527,9 @@ class BookmarkWindow(object):
         # window of the raw data ...  that suffices for visual plots,
         # and is much faster.
         p = Profile('Make newsig')
-        def chunks(lst, n):
-            """Yield successive n-sized chunks from lst."""
-            for i in range(0, len(lst), n):
-                yield lst[i:i + n]
         window_size = 10000  # arbitrary
-        minmax = [ [ min(c), max(c) ] for c in chunks(rawsignal, window_size) ]
-        newsig = [j for sub in minmax for j in sub]  # flatten
+        mins, maxs = pact.peaks.envelope(rawsignal, window_size)
+        newsig = np.column_stack((mins, maxs)).ravel()
         p.stop()
 
         time = np.linspace(
@@ -1209,33 +1540,13 @@ class BookmarkWindow(object):
         return (time, newsig)
 
 
-    def plot(self, frame, width_inches):
-        """Draws plot, returns widget for subsequent placement."""
-        fig, plot1 = plt.subplots()
-        fig.set_size_inches(width_inches, 0.4)
-
-        # ref https://stackoverflow.com/questions/2176424/
-        #   hiding-axis-text-in-matplotlib-plots
-        for x in ['left', 'right', 'top', 'bottom']:
-            plot1.spines[x].set_visible(False)
-        plot1.set_xticklabels([])
-        plot1.set_xticks([])
-        plot1.set_yticklabels([])
-        plot1.set_yticks([])
-        plot1.axes.get_xaxis().set_visible(False)
-        plot1.axes.get_yaxis().set_visible(False)
-
+    def draw_signal(self):
         time, signal = self.signal_plot_data
+        self.waveform.set_signal(time, signal)
 
-        a = Profile('plotting')
-        plot1.plot(time, signal)
-        for t in self.candidate_break_times:
-            plot1.axvline(x=t, color='red')
-        a.stop()
-
-        canvas = FigureCanvasTkAgg(fig, master = frame)
 
-        return (canvas.get_tk_widget(), fig)
+    def draw_breaks(self):
+        self.waveform.set_breaks(self.candidate_break_times)
 
 
 class LookupWindow(object):
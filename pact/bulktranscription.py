@@ -13,12 +13,18 @@ $ python -m pact.bulktranscription samples/input.mp3 model/spanish --endms 40000
 5 of 6: 00:29.0  "Pronto tendremos también nuestra fiesta para que f ..."
 6 of 6: 00:36.6  "(?) dieciséis de julio de mil novecientos noventa  ..."
 Got 6 bookmarks after 00:25.3.
+
+Use --workers N to transcribe the segments in N processes at once
+(get_transcribed_bookmarks_parallel).
 """
 
 import argparse
+import multiprocessing
+import os
 import sys
-import pact.utils
+from concurrent.futures import Future, ProcessPoolExecutor
 import pact.music
+import pact.pcm
 import pact.textmatch
 
 
@@ -32,24 +38,40 @@ def make_bounds(start_times, end_time):
     return ret
 
 
-def __transcribe(c, bookmark, transcription_strategy, bookmark_done_callback):
+# Searched for each transcription, as in the sample run.
+TRANSCRIPTION_FILE = 'samples/input.txt'
+
+
+def _new_bookmark(bounds):
+    b = pact.music.Bookmark(bounds[0])
+    b.clip_bounds_ms = [ bounds[0], bounds[1] ]
+    return b
+
+
+def _search_transcription(sought, transcription_file):
+    if transcription_file is None:
+        return sought
+    fuzzy_text_match_accuracy = 80
+    result = pact.textmatch.search_transcription(
+        sought, transcription_file, fuzzy_text_match_accuracy)
+    if result is None:
+        return f'(?) {sought}'
+    return '\n\n'.join(result).strip()
+
+
+def _bookmark_done(bookmark, transcription, transcription_file, bookmark_done_callback):
+    """Set the bookmark's final transcription, used by both engines."""
+    bookmark.transcription = _search_transcription(transcription, transcription_file)
+    if bookmark_done_callback:
+        bookmark_done_callback(bookmark)
+
+
+def __transcribe(c, clip, bookmark, transcription_strategy, transcription_file, bookmark_done_callback):
     def __set_transcription(transcription):
         bookmark.transcription = transcription
 
-    def __search_transcription(sought, transcription_file):
-        if transcription_file is None:
-            return sought
-        fuzzy_text_match_accuracy = 80
-        result = pact.textmatch.search_transcription(
-            sought, transcription_file, fuzzy_text_match_accuracy)
-        if result is None:
-            return f'(?) {sought}'
-        return '\n\n'.join(result).strip()
-
-    def __try_transcription_search(sought, ts):
-        sought = __search_transcription(sought, 'samples/input.txt')
-        __set_transcription(sought)
-        bookmark_done_callback(bookmark)
+    def __finished(s, ts):
+        _bookmark_done(bookmark, s, transcription_file, bookmark_done_callback)
         ts.stop()
 
     ts = transcription_strategy
@@ -57,8 +79,9 @@ def __transcribe(c, bookmark, transcription_strategy, bookmark_done_callback):
         audiosegment = c,
         on_update_transcription = lambda s: __set_transcription(s),
         on_update_progress = lambda n: None,
-        on_finished = lambda s: __try_transcription_search(s, ts),
-        on_daemon_thread = False
+        on_finished = lambda s: __finished(s, ts),
+        on_daemon_thread = False,
+        clip = clip
     )
 
 
@@ -67,22 +90,109 @@ def get_transcribed_bookmarks(
         segment_starts,
         end_time,
         transcription_strategy,
-        bookmark_done_callback = None
+        bookmark_done_callback = None,
+        transcription_file = TRANSCRIPTION_FILE
 ):
     if in_filename is None or len(segment_starts) == 0:
         return []
 
     allbookmarks = []
-    for ct in make_bounds(segment_starts, end_time):
-        b = pact.music.Bookmark(ct[0])
-        b.clip_bounds_ms = [ ct[0], ct[1] ]
-        seg = pact.utils.audiosegment_from_mp3_time_range(in_filename, ct[0], ct[1])
-        __transcribe(seg, b, transcription_strategy, bookmark_done_callback)
+    bounds = make_bounds(segment_starts, end_time)
+    # All of the clips come from a single decode of the file, straight
+    # to mono at the rate the recognizer uses.
+    segs = pact.pcm.iter_segments(in_filename, bounds, rate = pact.pcm.ANALYSIS_RATE, channels = 1)
+    for ct, seg in zip(bounds, segs):
+        b = _new_bookmark(ct)
+        __transcribe(seg, (in_filename, ct[0], ct[1]), b, transcription_strategy, transcription_file, bookmark_done_callback)
         allbookmarks.append(b)
 
     return allbookmarks
 
 
+# The model in each worker process of the parallel engine.
+_worker_model = None
+
+
+def _init_worker(model_dir):
+    from pact.plugins.transcription import vosktranscription
+    global _worker_model
+    _worker_model = vosktranscription.models.get(model_dir)
+
+
+def _transcribe_segment(data, rate):
+    from pact.plugins.transcription import vosktranscription
+    cb = vosktranscription.TranscriptionCallback()
+    vosktranscription.transcribe_pcm(data, rate, _worker_model, cb)
+    return (cb.transcription(), cb.results)
+
+
+def _pool_context():
+    """Fork where possible: if the model's already loaded, the workers
+    share its memory (copy-on-write) instead of each loading it."""
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def get_transcribed_bookmarks_parallel(
+        in_filename,
+        segment_starts,
+        end_time,
+        model_dir,
+        workers = None,
+        bookmark_done_callback = None,
+        transcription_file = TRANSCRIPTION_FILE
+):
+    """Same as get_transcribed_bookmarks, but the segments are
+    transcribed by a pool of worker processes, each with its own
+    vosk recognizer.  bookmark_done_callback is still called in
+    bookmark order."""
+    from pact.plugins.transcription import vosktranscription
+
+    if in_filename is None or len(segment_starts) == 0:
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    # Load in this process first, so forked workers get it for free.
+    vosktranscription.models.get(model_dir)
+    cache = vosktranscription.transcription_cache(in_filename, vosktranscription.model_id(model_dir))
+
+    def _done(bookmark, f):
+        transcription, results = f.result()
+        if results is not None:
+            cache.add(bookmark.clip_bounds_ms[0], bookmark.clip_bounds_ms[1], results)
+        _bookmark_done(bookmark, transcription, transcription_file, bookmark_done_callback)
+
+    allbookmarks = []
+    pending = []
+    bounds = make_bounds(segment_starts, end_time)
+    rate = pact.pcm.ANALYSIS_RATE
+    segs = pact.pcm.iter_segments(in_filename, bounds, rate = rate, channels = 1)
+    with ProcessPoolExecutor(
+            max_workers = workers,
+            mp_context = _pool_context(),
+            initializer = _init_worker,
+            initargs = (model_dir,)
+    ) as pool:
+        for ct, seg in zip(bounds, segs):
+            b = _new_bookmark(ct)
+            allbookmarks.append(b)
+            cached = cache.get(ct[0], ct[1])
+            if cached is not None:
+                f = Future()
+                f.set_result((cached, None))
+            else:
+                f = pool.submit(_transcribe_segment, bytes(seg.raw_data), rate)
+            pending.append((b, f))
+            # Don't decode too far ahead of the workers.
+            while len(pending) >= workers * 2:
+                _done(*pending.pop(0))
+        for b, f in pending:
+            _done(b, f)
+
+    return allbookmarks
+
+
 if __name__ == '__main__':
     import pact.split
     from pact.plugins.transcription import vosktranscription
@@ -94,6 +204,8 @@ if __name__ == '__main__':
     parser.add_argument('vosk_model')
     parser.add_argument('--startms', type=int, default=0, help='start time (ms) for bookmarks')
     parser.add_argument('--endms', type=int, default=60000, help='end time (ms) for bookmarks')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes (more than 1 uses the parallel engine)')
+    parser.add_argument('--transcription-file', default=TRANSCRIPTION_FILE, help='text to search for each transcription')
     args = parser.parse_args()
 
     starttime = time.time()
@@ -112,12 +224,23 @@ if __name__ == '__main__':
         n += 1
         print(f'{n} of {len(segment_starts)}: {b.display()}')
 
-    bookmarks = get_transcribed_bookmarks(
-        in_filename = args.in_filename,
-        segment_starts = segment_starts,
-        end_time = args.endms,
-        transcription_strategy = strategy,
-        bookmark_done_callback = print_progress)
+    if args.workers > 1:
+        bookmarks = get_transcribed_bookmarks_parallel(
+            in_filename = args.in_filename,
+            segment_starts = segment_starts,
+            end_time = args.endms,
+            model_dir = args.vosk_model,
+            workers = args.workers,
+            bookmark_done_callback = print_progress,
+            transcription_file = args.transcription_file)
+    else:
+        bookmarks = get_transcribed_bookmarks(
+            in_filename = args.in_filename,
+            segment_starts = segment_starts,
+            end_time = args.endms,
+            transcription_strategy = strategy,
+            bookmark_done_callback = print_progress,
+            transcription_file = args.transcription_file)
 
     endtime = time.time()
     duration = endtime - starttime
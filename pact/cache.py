@@ -0,0 +1,88 @@
+"""On-disk cache for data derived from audio files.
+
+Things like silence scans are expensive to calculate for long files,
+but never change as long as the file itself doesn't change.  Cache
+files are keyed by a fingerprint of the audio file, so if the file is
+edited or replaced, the old cache entries are just ignored.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+# Where cache files are stored.  Relative to the working dir, same as
+# the 'pact/.recent' file.  Tests can point this somewhere else.
+cache_dir = 'pact/.cache'
+
+# Locks for read-modify-write of cache files, by path.
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def fingerprint(filename):
+    """Quick fingerprint of the file contents.
+
+    Hashing the entire content of a multi-hour mp3 would take about
+    as long as the silence scans we're trying to avoid, so just hash
+    the size, mtime, and the first and last 64K.
+    """
+    blocksize = 65536
+    st = os.stat(filename)
+    h = hashlib.sha1()
+    h.update(f'{st.st_size}:{st.st_mtime_ns}'.encode('utf-8'))
+    with open(filename, 'rb') as f:
+        h.update(f.read(blocksize))
+        if st.st_size > blocksize:
+            f.seek(max(blocksize, st.st_size - blocksize))
+            h.update(f.read(blocksize))
+    return h.hexdigest()
+
+
+def cache_file(filename, kind, *keyparts, ext = 'json'):
+    """Path of the cache file of the given kind (e.g. 'silences') for the
+    audio filename, for the given key parts (e.g. threshold)."""
+    key = '_'.join([ str(k) for k in keyparts ])
+    parts = [ os.path.basename(filename), fingerprint(filename)[0:16], kind ]
+    if key != '':
+        parts.append(key)
+    return os.path.join(cache_dir, '.'.join(parts) + '.' + ext)
+
+
+def load(path):
+    """Load cached json, or None if not available or unreadable."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as src:
+            return json.loads(src.read())
+    except (OSError, ValueError) as e:
+        print(f'ignoring bad cache file {path}: {e}')
+        return None
+
+
+def save(path, data):
+    """Save json data.  Written to a temp file first, so that a crash
+    mid-write doesn't leave a corrupt cache file.  Each save has its
+    own temp file, so threads saving the same path don't collide."""
+    d = os.path.dirname(path) or '.'
+    os.makedirs(d, exist_ok = True)
+    fd, tmp = tempfile.mkstemp(dir = d, suffix = '.tmp')
+    try:
+        with os.fdopen(fd, 'w') as dest:
+            dest.write(json.dumps(data))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def lock(path):
+    """Lock to hold while reading, changing and saving the file."""
+    with _locks_lock:
+        if path not in _locks:
+            _locks[path] = threading.Lock()
+        return _locks[path]
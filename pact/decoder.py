@@ -0,0 +1,200 @@
+"""Shared service for decoding time ranges of audio files to PCM.
+
+Clips, waveforms and silence scans of short ranges each used to start
+their own ffmpeg.  They now ask the service, which runs the decodes on
+a few long-lived worker threads:
+
+* if PyAV is installed (it's optional, see requirements-optional.txt),
+  the workers decode in-process, reading only the frames of the range.
+
+* otherwise each request still runs ffmpeg, reading only the frames of
+  the range (see pact.mp3index).  The workers just queue the requests,
+  so each one still pays for starting ffmpeg: the speedup from the
+  service needs PyAV.  benchmark/bench_decoder.py compares the two.
+
+Both backends trim and resample the same way, so they give the same
+samples.
+
+Samples are handed back to the caller as numpy arrays in the same
+process, so there's no copying through pipes besides ffmpeg's own.
+
+The service also keeps the latency of each request, see stats().
+"""
+
+import collections
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from mutagen import MutagenError
+from mutagen.mp3 import MP3
+
+import pact.mp3index
+
+try:
+    import av
+except ImportError:
+    av = None
+
+
+class Decoder:
+
+    # Latencies kept for the stats.
+    HISTORY = 1000
+
+    def __init__(self, workers = 4, backend = None):
+        if backend is None:
+            backend = 'pyav' if av is not None else 'ffmpeg'
+        if backend == 'pyav' and av is None:
+            raise ValueError('pyav backend needs PyAV ("pip install av")')
+        self.backend = backend
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.latencies_ms = collections.deque(maxlen = Decoder.HISTORY)
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers = self.workers, thread_name_prefix = 'decoder')
+            return self._pool
+
+    def submit(self, in_filename, start_ms = None, end_ms = None, rate = None, channels = None):
+        """Future for decode()."""
+        return self._executor().submit(self._timed_decode, in_filename, start_ms, end_ms, rate, channels)
+
+    def decode(self, in_filename, start_ms = None, end_ms = None, rate = None, channels = None):
+        """Decode exactly the range (the whole file if there's no
+        start or end) to signed 16-bit PCM.  rate and channels default
+        to the file's own.  Returns (numpy int16 samples, interleaved
+        if more than one channel, rate, channels)."""
+        return self.submit(in_filename, start_ms, end_ms, rate, channels).result()
+
+    def _timed_decode(self, in_filename, start_ms, end_ms, rate, channels):
+        t = time.perf_counter()
+        ok = False
+        try:
+            if rate is None or channels is None:
+                native_rate, native_channels = native_format(in_filename)
+                rate = rate or native_rate
+                channels = channels or native_channels
+            if self.backend == 'pyav':
+                try:
+                    samples = self._pyav_decode(in_filename, start_ms, end_ms, rate, channels)
+                except ValueError:
+                    # Not indexable, or past the end: ffmpeg handles those.
+                    samples = ffmpeg_decode(in_filename, start_ms, end_ms, rate, channels)
+                except av.FFmpegError as e:
+                    print(f'pyav failed on {in_filename}, using ffmpeg: {e}')
+                    samples = ffmpeg_decode(in_filename, start_ms, end_ms, rate, channels)
+            else:
+                samples = ffmpeg_decode(in_filename, start_ms, end_ms, rate, channels)
+            ok = True
+            return (samples, rate, channels)
+        finally:
+            elapsed = (time.perf_counter() - t) * 1000
+            with self._lock:
+                self.requests += 1
+                if not ok:
+                    self.errors += 1
+                self.latencies_ms.append(elapsed)
+
+    def _pyav_decode(self, in_filename, start_ms, end_ms, rate, channels):
+        """Same steps as the ffmpeg backend (see
+        pact.mp3index.trimmed_input): start reading at the frame
+        index's byte offset, trim the decoded samples to the range,
+        then convert the trimmed audio to the rate and channels, so
+        both backends give the same samples."""
+        index = pact.mp3index.frame_index(in_filename)
+        start_ms = start_ms or 0
+        start_byte, _, discard = index.byte_range(start_ms, end_ms)
+        keep_to = None
+        if end_ms is not None:
+            keep_to = discard + max(0, int(round((end_ms - start_ms) * index.sample_rate / 1000.0)))
+
+        layout = 'mono' if channels == 1 else 'stereo'
+        resampler = av.AudioResampler(format = 's16', layout = layout, rate = rate)
+        pieces = []
+
+        def _add(frames):
+            for f in frames:
+                pieces.append(f.to_ndarray().reshape(-1))
+
+        pos = 0
+        options = { 'skip_initial_bytes': str(start_byte) }
+        with av.open(in_filename, format = 'mp3', options = options) as container:
+            for frame in container.decode(container.streams.audio[0]):
+                n = frame.samples
+                a = max(0, discard - pos)
+                b = n if keep_to is None else min(n, keep_to - pos)
+                pos += n
+                if b > a:
+                    samples = frame.to_ndarray()
+                    if frame.format.is_planar:
+                        samples = samples[:, a:b]
+                    else:
+                        samples = samples[:, a * frame.layout.nb_channels:b * frame.layout.nb_channels]
+                    trimmed = av.AudioFrame.from_ndarray(
+                        np.ascontiguousarray(samples), format = frame.format.name, layout = frame.layout.name)
+                    trimmed.sample_rate = frame.sample_rate
+                    _add(resampler.resample(trimmed))
+                if keep_to is not None and pos >= keep_to:
+                    break
+        _add(resampler.resample(None))
+
+        if len(pieces) == 0:
+            return np.zeros(0, np.int16)
+        return np.concatenate(pieces).astype(np.int16, copy = False)
+
+    def stats(self):
+        """Request count and latencies (in ms) of recent requests."""
+        with self._lock:
+            lat = np.array(self.latencies_ms)
+            ret = {
+                'backend': self.backend,
+                'requests': self.requests,
+                'errors': self.errors
+            }
+        if len(lat) > 0:
+            ret['mean_ms'] = round(float(lat.mean()), 1)
+            ret['p50_ms'] = round(float(np.percentile(lat, 50)), 1)
+            ret['p95_ms'] = round(float(np.percentile(lat, 95)), 1)
+            ret['max_ms'] = round(float(lat.max()), 1)
+        return ret
+
+    def shutdown(self):
+        with self._lock:
+            pool = self._pool
+            self._pool = None
+        if pool is not None:
+            pool.shutdown(wait = True)
+
+
+def native_format(in_filename):
+    """(sample rate, channels) of the file."""
+    try:
+        index = pact.mp3index.frame_index(in_filename)
+        return (index.sample_rate, index.channels)
+    except ValueError:
+        pass
+    try:
+        info = MP3(in_filename).info
+        return (info.sample_rate, info.channels)
+    except MutagenError as e:
+        raise ValueError(f'can\'t get format of {in_filename}: {e}')
+
+
+def ffmpeg_decode(in_filename, start_ms, end_ms, rate, channels):
+    out, _ = (
+        pact.mp3index.ffmpeg_input(in_filename, start_ms, end_ms)
+        .output('pipe:', format='s16le', acodec='pcm_s16le', ac=channels, ar=rate, loglevel='error')
+        .run(capture_stdout = True, capture_stderr = True)
+    )
+    return np.frombuffer(out, np.int16)
+
+
+# The shared service.
+service = Decoder()
@@ -0,0 +1,301 @@
+"""Index of the frames in an mp3, for exact, fast seeking.
+
+ffmpeg's "ss" seeking in long VBR files either scans from the start of
+the file or estimates the position, and cuts with acodec='copy' land
+on frame boundaries.  Every mp3 frame has the same number of samples,
+so with the byte offset of each frame, the frame holding any time (and
+the bytes to read) can be found directly.
+
+The index is built once per file by reading the frame headers, and
+cached.
+"""
+
+import mmap
+import os
+import tempfile
+import threading
+import ffmpeg
+import numpy as np
+
+import pact.cache
+
+
+# Layer III bitrates (kbps) by bitrate index, for MPEG-1 and MPEG-2/2.5.
+BITRATES_V1 = [ 0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0 ]
+BITRATES_V2 = [ 0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0 ]
+
+# Sample rates by version bits (3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5).
+SAMPLE_RATES = {
+    3: [ 44100, 48000, 32000 ],
+    2: [ 22050, 24000, 16000 ],
+    0: [ 11025, 12000, 8000 ]
+}
+
+# mp3 decoders output this many samples of delay.  ffmpeg only skips
+# it (along with the encoder delay) if the file has a LAME tag.
+DECODER_DELAY = 529
+
+
+def parse_header(b):
+    """(frame length in bytes, sample rate, samples per frame, channels)
+    for the 4 header bytes, or None if it's not a layer III frame header."""
+    if b[0] != 0xFF or (b[1] & 0xE0) != 0xE0:
+        return None
+    version = (b[1] >> 3) & 3
+    layer = (b[1] >> 1) & 3
+    bitrate_index = b[2] >> 4
+    rate_index = (b[2] >> 2) & 3
+    if version == 1 or layer != 1 or rate_index == 3:
+        return None
+    bitrate = (BITRATES_V1 if version == 3 else BITRATES_V2)[bitrate_index]
+    if bitrate == 0:
+        # Free format or bad, can't get the length.
+        return None
+    rate = SAMPLE_RATES[version][rate_index]
+    padding = (b[2] >> 1) & 1
+    channels = 1 if (b[3] >> 6) == 3 else 2
+    if version == 3:
+        return (144000 * bitrate // rate + padding, rate, 1152, channels)
+    return (72000 * bitrate // rate + padding, rate, 576, channels)
+
+
+def id3v2_size(data):
+    """Bytes taken by an ID3v2 tag at the start of the data, if any."""
+    if data[0:3] != b'ID3' or len(data) < 10:
+        return 0
+    s = data[6:10]
+    size = (s[0] << 21) | (s[1] << 14) | (s[2] << 7) | s[3]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def info_frame_padding(frame, samples_per_frame, channels):
+    """If the frame is a Xing/Info header frame (which has no audio),
+    the (encoder delay, end padding) from its LAME tag, or (0, 0) if
+    there's no LAME tag.  None if it's a regular audio frame."""
+    if samples_per_frame == 1152:
+        side_info = 17 if channels == 1 else 32
+    else:
+        side_info = 9 if channels == 1 else 17
+    pos = 4 + side_info
+    if frame[pos:pos + 4] not in (b'Xing', b'Info'):
+        return None
+    flags = int.from_bytes(frame[pos + 4:pos + 8], 'big')
+    pos += 8
+    for flag, size in [ (0x1, 4), (0x2, 4), (0x4, 100), (0x8, 4) ]:
+        if flags & flag:
+            pos += size
+    # The LAME tag (ffmpeg writes "Lavc" in the same format) has
+    # 12 bits each of delay and padding starting 21 bytes in.
+    lame = frame[pos:pos + 24]
+    if len(lame) < 24 or lame[0:4] not in (b'LAME', b'Lavc', b'Lavf'):
+        return (0, 0)
+    delay = (lame[21] << 4) | (lame[22] >> 4)
+    padding = ((lame[22] & 0x0F) << 8) | lame[23]
+    return (DECODER_DELAY + delay, max(0, padding - DECODER_DELAY))
+
+
+class FrameIndex:
+    """Byte offsets of the audio frames in an mp3.
+
+    Times are the same as ffmpeg's: time 0 is the first sample after
+    the encoder and decoder delay.
+    """
+
+    # Frames decoded before the clip start and thrown away.  Layer
+    # III frames can use data from earlier frames (the "bit
+    # reservoir"), and overlap with the previous frame, so the first
+    # few frames decoded from the middle of a file are junk.
+    PREROLL_FRAMES = 10
+
+    def __init__(self, offsets, sample_rate, samples_per_frame, channels, skip_samples = 0, end_padding = 0):
+        # offsets has one more entry than there are frames: the end of
+        # the last frame.
+        self.offsets = offsets
+        self.sample_rate = sample_rate
+        self.samples_per_frame = samples_per_frame
+        self.channels = channels
+        self.skip_samples = skip_samples
+        self.end_padding = end_padding
+
+    def frame_count(self):
+        return len(self.offsets) - 1
+
+    def duration_ms(self):
+        samples = self.frame_count() * self.samples_per_frame - self.skip_samples - self.end_padding
+        return max(0, samples) * 1000.0 / self.sample_rate
+
+    def _stream_sample(self, ms):
+        """Sample number in the decoded frames for the time."""
+        return int(round(ms * self.sample_rate / 1000.0)) + self.skip_samples
+
+    def byte_range(self, start_ms, end_ms = None):
+        """(first byte, end byte, samples to discard) for decoding the
+        range, including the preroll frames."""
+        s = self._stream_sample(start_ms)
+        if s // self.samples_per_frame >= self.frame_count():
+            # ffmpeg_input falls back to ss, which just gives no audio.
+            raise ValueError(f'start {start_ms} ms is past the end of the file')
+        first = max(0, s // self.samples_per_frame - FrameIndex.PREROLL_FRAMES)
+        last = self.frame_count()
+        if end_ms is not None:
+            e = self._stream_sample(end_ms)
+            last = min(last, -(-e // self.samples_per_frame) + 1)
+        last = max(first, last)
+        discard = s - first * self.samples_per_frame
+        return (int(self.offsets[first]), int(self.offsets[last]), discard)
+
+    def time_ms(self, frame):
+        """Start time of the frame."""
+        return (frame * self.samples_per_frame - self.skip_samples) * 1000.0 / self.sample_rate
+
+    def frame_at(self, ms):
+        """The frame holding the time."""
+        f = self._stream_sample(ms) // self.samples_per_frame
+        return min(max(0, f), self.frame_count() - 1)
+
+
+def scan(in_filename):
+    """Build the FrameIndex by reading all of the frame headers."""
+    with open(in_filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f'{in_filename} is empty')
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+            return _scan_data(data)
+
+
+def _scan_data(data):
+    n = len(data)
+    pos = id3v2_size(data)
+    offsets = []
+    fmt = None
+    padding = (0, 0)
+    while pos + 4 <= n:
+        h = parse_header(data[pos:pos + 4])
+        if h is None or (fmt is not None and h[1:3] != fmt[1:3]) or pos + h[0] > n:
+            # Junk, or the ID3v1 tag at the end.  Resync.
+            pos += 1
+            continue
+        if fmt is None:
+            fmt = h
+            info = info_frame_padding(data[pos:pos + h[0]], h[2], h[3])
+            if info is not None:
+                padding = info
+                pos += h[0]
+                continue
+        offsets.append(pos)
+        pos += h[0]
+
+    if fmt is None:
+        raise ValueError('no mp3 frames found')
+    offsets.append(pos)
+    return FrameIndex(np.array(offsets, dtype = np.int64), fmt[1], fmt[2], fmt[3], padding[0], padding[1])
+
+
+# Indexes already loaded, by cache path (which includes the file
+# fingerprint).
+_loaded = {}
+
+# Guards _loaded and _path_locks.  Each cache path has its own lock, so
+# that the threads that all want a new file's index at once (clip
+# extraction, waveform, silence scan) build it only once.
+_lock = threading.Lock()
+_path_locks = {}
+
+
+def _path_lock(path):
+    with _lock:
+        if path not in _path_locks:
+            _path_locks[path] = threading.Lock()
+        return _path_locks[path]
+
+
+def _load_or_build(in_filename, path):
+    if os.path.exists(path):
+        try:
+            d = np.load(path)
+            rate, spf, channels, skip, end_padding = [ int(v) for v in d['meta'] ]
+            return FrameIndex(d['offsets'], rate, spf, channels, skip, end_padding)
+        except (OSError, ValueError, KeyError) as e:
+            print(f'ignoring bad frame index {path}: {e}')
+
+    index = scan(in_filename)
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    fd, tmp = tempfile.mkstemp(dir = os.path.dirname(path), suffix = '.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as dest:
+            meta = [
+                index.sample_rate, index.samples_per_frame, index.channels,
+                index.skip_samples, index.end_padding
+            ]
+            np.savez(dest, offsets = index.offsets, meta = np.array(meta))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return index
+
+
+def frame_index(in_filename):
+    """The FrameIndex for the file, from the cache if it's there."""
+    path = pact.cache.cache_file(in_filename, 'frames', ext = 'npz')
+    with _lock:
+        if path in _loaded:
+            return _loaded[path]
+    with _path_lock(path):
+        with _lock:
+            if path in _loaded:
+                return _loaded[path]
+        index = _load_or_build(in_filename, path)
+        with _lock:
+            _loaded[path] = index
+        return index
+
+
+def trimmed_input(in_filename, start_ms, end_ms = None, index = None):
+    """ffmpeg-python stream of exactly the range.  ffmpeg starts reading
+    at the right frame (skipping the bytes before it), and the
+    samples before the start are trimmed off after decoding."""
+    index = index or frame_index(in_filename)
+    start_byte, _, discard = index.byte_range(start_ms, end_ms)
+    trim = { 'start_sample': discard }
+    if end_ms is not None:
+        nsamples = int(round((end_ms - start_ms) * index.sample_rate / 1000.0))
+        trim['end_sample'] = discard + max(0, nsamples)
+    return (
+        ffmpeg
+        .input(in_filename, format='mp3', skip_initial_bytes=start_byte)
+        .filter('atrim', **trim)
+        .filter('asetpts', 'PTS-STARTPTS')
+    )
+
+
+def ffmpeg_input(in_filename, start_ms = None, end_ms = None):
+    """ffmpeg-python input for the range of the file.  Ranges that
+    don't start at the beginning use the frame index, if the file
+    can be indexed; otherwise ffmpeg's ss and t are used."""
+    if start_ms is not None and start_ms > 0:
+        try:
+            return trimmed_input(in_filename, start_ms, end_ms)
+        except ValueError as e:
+            print(f'not using frame index for {in_filename}: {e}')
+
+    kwargs = {}
+    if start_ms is not None:
+        kwargs['ss'] = (start_ms/1000.0)
+    if end_ms is not None:
+        kwargs['t'] = (end_ms - (start_ms or 0))/1000.0
+    return ffmpeg.input(in_filename, **kwargs)
+
+
+def decode_range(in_filename, start_ms, end_ms):
+    """Decode exactly the range, reading only the frames needed.
+    Returns (interleaved int16 samples, sample rate, channels)."""
+    index = frame_index(in_filename)
+    out, _ = (
+        trimmed_input(in_filename, start_ms, end_ms, index)
+        .output('pipe:', format='s16le', acodec='pcm_s16le', loglevel='error')
+        .run(capture_stdout = True, capture_stderr = True)
+    )
+    return (np.frombuffer(out, np.int16), index.sample_rate, index.channels)
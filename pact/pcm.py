@@ -0,0 +1,294 @@
+"""Decoding mp3s to raw PCM samples, for in-process audio analysis."""
+
+import os
+import tempfile
+import time
+import ffmpeg
+import numpy as np
+import pydub
+from mutagen import MutagenError
+from mutagen.mp3 import MP3
+
+import pact.cache
+import pact.decoder
+import pact.mp3index
+
+
+# Sample rate used when analyzing audio (e.g. finding silences).
+# Speech doesn't need more than this.
+ANALYSIS_RATE = 16000
+
+
+def sample_rate(in_filename):
+    """Native sample rate of the file, or ANALYSIS_RATE if it can't be
+    read.  Decoding at the native rate avoids resampling, which
+    changes the sample peaks a bit."""
+    try:
+        return MP3(in_filename).info.sample_rate
+    except MutagenError:
+        return ANALYSIS_RATE
+
+
+def duration_ms(in_filename):
+    """Length of the mp3 in ms."""
+    return MP3(in_filename).info.length * 1000
+
+
+def _ffmpeg_decode_cmd(in_filename, start_ms, end_ms, rate, channels):
+    return (
+        pact.mp3index.ffmpeg_input(in_filename, start_ms, end_ms)
+        .output('pipe:', format='s16le', acodec='pcm_s16le', ac=channels, ar=rate, loglevel='error')
+    )
+
+
+def decode(in_filename, start_ms = None, end_ms = None, rate = ANALYSIS_RATE, channels = 1):
+    """Decode the file (or the range of the file) to signed 16-bit
+    PCM using ffmpeg.  Returns a numpy int16 array, interleaved if
+    there is more than one channel."""
+    cmd = _ffmpeg_decode_cmd(in_filename, start_ms, end_ms, rate, channels)
+    out, _ = cmd.run(capture_stdout=True, capture_stderr=True)
+    return np.frombuffer(out, np.int16)
+
+
+def decode_blocks(in_filename, start_ms = None, end_ms = None, rate = ANALYSIS_RATE, channels = 1, block_samples = 16000 * 60):
+    """Generator version of decode, yielding int16 arrays of
+    block_samples samples (the last one may be shorter), so that
+    multi-hour files don't have to be held in memory."""
+    cmd = _ffmpeg_decode_cmd(in_filename, start_ms, end_ms, rate, channels)
+    p = cmd.run_async(pipe_stdout=True, pipe_stderr=True)
+    blockbytes = block_samples * channels * 2
+    try:
+        while True:
+            data = p.stdout.read(blockbytes)
+            if not data:
+                break
+            yield np.frombuffer(data, np.int16)
+    finally:
+        if p.poll() is None:
+            p.kill()
+        p.communicate()
+
+
+def window_db(samples, window_size, measure = 'peak'):
+    """Level in dB of each window of window_size samples.  The last
+    partial window, if any, is included.
+
+    measure is 'peak' (the loudest sample in the window, which is what
+    ffmpeg's silencedetect compares against its threshold) or 'rms'.
+    """
+    n = len(samples)
+    if n == 0:
+        return np.zeros(0)
+    nwindows = -(-n // window_size)  # ceiling division
+    padded = np.zeros(nwindows * window_size, dtype=np.float32)
+    padded[0:n] = samples
+    padded /= 32768.0
+    windows = padded.reshape(nwindows, window_size)
+
+    if measure == 'peak':
+        # Zero padding doesn't affect the max.
+        level = np.abs(windows).max(axis=1)
+    elif measure == 'rms':
+        # Don't average the last window with the zero padding.
+        counts = np.full(nwindows, window_size, dtype=np.float32)
+        counts[-1] = n - (nwindows - 1) * window_size
+        level = np.sqrt(np.square(windows).sum(axis=1) / counts)
+    else:
+        raise ValueError(f'unknown measure {measure}')
+
+    return 20 * np.log10(np.maximum(level, 1e-10))
+
+
+def silent_runs(is_silent, min_length):
+    """(start, end) index pairs of runs of True in the boolean array
+    that are at least min_length long.  end is exclusive."""
+    padded = np.concatenate(([False], is_silent, [False])).astype(np.int8)
+    d = np.diff(padded)
+    starts = np.flatnonzero(d == 1)
+    ends = np.flatnonzero(d == -1)
+    keep = (ends - starts) >= min_length
+    return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+
+class PcmStore:
+    """The whole track decoded once to a raw int16 file in the cache
+    dir, and memory-mapped.
+
+    Getting a clip from the store is just a slice of the mapped file,
+    wrapped in an AudioSegment without copying, vs. running ffmpeg
+    and decoding a temp mp3 for every clip.  The file is big (about
+    10 MB per minute for stereo 44.1kHz), so this is optional.
+    """
+
+    def __init__(self, in_filename):
+        self.in_filename = in_filename
+        info = MP3(in_filename).info
+        self.rate = info.sample_rate
+        self.channels = info.channels
+        self.path = pact.cache.cache_file(
+            in_filename, 'pcm', self.rate, self.channels, ext = 'raw')
+        self.samples = None
+        if os.path.exists(self.path):
+            self._open()
+
+    def _open(self):
+        self.samples = np.memmap(self.path, dtype = np.int16, mode = 'r')
+
+    def ready(self):
+        return self.samples is not None
+
+    def build(self, should_stop = lambda: False):
+        """Decode the track to the store file, if not already done.
+        Takes a while for long files, so call it on a background
+        thread.  If another thread is already building it, waits for
+        that one and uses its file.  If should_stop() turns True, the
+        decode is abandoned and the store stays not ready."""
+        if self.ready():
+            return
+        with pact.cache.lock(self.path):
+            if not os.path.exists(self.path):
+                self._decode_to_file(should_stop)
+        if os.path.exists(self.path):
+            self._open()
+
+    def _decode_to_file(self, should_stop):
+        d = os.path.dirname(self.path)
+        os.makedirs(d, exist_ok = True)
+        fd, tmp = tempfile.mkstemp(dir = d, suffix = '.tmp')
+        os.close(fd)
+        process = None
+        try:
+            process = (
+                ffmpeg
+                .input(self.in_filename)
+                .output(tmp, format='s16le', acodec='pcm_s16le', ac=self.channels, ar=self.rate, loglevel='error')
+                .overwrite_output()
+                .run_async()
+            )
+            while process.poll() is None:
+                if should_stop():
+                    return
+                time.sleep(0.1)
+            if process.returncode != 0:
+                raise RuntimeError(f'ffmpeg failed decoding {self.in_filename}')
+            os.replace(tmp, self.path)
+        finally:
+            if process is not None and process.poll() is None:
+                process.kill()
+                process.wait()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _sample_index(self, ms):
+        frame = int(round(ms * self.rate / 1000.0))
+        return min(max(0, frame * self.channels), len(self.samples))
+
+    def segment(self, start_ms, end_ms):
+        """AudioSegment of the range, sharing memory with the store."""
+        s = self._sample_index(start_ms)
+        e = max(s, self._sample_index(end_ms))
+        data = memoryview(self.samples[s:e]).cast('B')
+        return pydub.AudioSegment(
+            data = data, sample_width = 2, frame_rate = self.rate, channels = self.channels)
+
+
+# Ranges further apart than this are decoded in separate passes, rather
+# than decoding all of the audio in between.
+BATCH_MAX_GAP_MS = 60000
+
+
+def _batch_groups(ranges):
+    """Lists of (index, start, end), sorted by start, each list close
+    enough together to decode in one pass."""
+    indexed = sorted([ (i, r[0], r[1]) for i, r in enumerate(ranges) ], key = lambda r: r[1])
+    groups = []
+    group_end = None
+    for r in indexed:
+        if group_end is not None and r[1] - group_end <= BATCH_MAX_GAP_MS:
+            groups[-1].append(r)
+            group_end = max(group_end, r[2])
+        else:
+            groups.append([ r ])
+            group_end = r[2]
+    return groups
+
+
+def _decode_group(in_filename, group, rate, channels):
+    """Generator of (index, samples) for the ranges in the group, as
+    soon as each range has been decoded, from a single ffmpeg run."""
+    group_start = group[0][1]
+    group_end = max([ r[2] for r in group ])
+    def frame(ms):
+        # Same rounding as the decode start.
+        return int(round(ms * rate / 1000.0)) - int(round(group_start * rate / 1000.0))
+    pending = [ (i, frame(s), frame(e)) for i, s, e in group ]
+
+    # Decoded blocks that are still needed, joined only when a range
+    # is taken from them.
+    parts = []
+    buf_start = 0  # frame number of parts[0][0]
+    decoded = 0
+    blocks = decode_blocks(
+        in_filename, group_start, group_end, rate = rate, channels = channels, block_samples = rate * 10)
+
+    def _take(r):
+        if len(parts) > 1:
+            parts[:] = [ np.concatenate(parts) ]
+        buf = parts[0] if len(parts) > 0 else np.zeros(0, dtype = np.int16)
+        s = max(0, r[1] - buf_start) * channels
+        e = max(0, r[2] - buf_start) * channels
+        return (r[0], buf[s:e].copy())
+
+    for block in blocks:
+        parts.append(block)
+        decoded += len(block) // channels
+        done = [ r for r in pending if r[2] <= decoded ]
+        pending = [ r for r in pending if r[2] > decoded ]
+        for r in done:
+            yield _take(r)
+        # Don't keep samples that no remaining range needs.
+        keep_from = min([ r[1] for r in pending ], default = decoded)
+        while len(parts) > 0 and buf_start + len(parts[0]) // channels <= keep_from:
+            buf_start += len(parts.pop(0)) // channels
+        if len(parts) > 0 and keep_from > buf_start:
+            parts[0] = parts[0][(keep_from - buf_start) * channels:]
+            buf_start = keep_from
+
+    # Anything past the end of the file.
+    for r in pending:
+        yield _take(r)
+
+
+def iter_segments(in_filename, ranges, rate = None, channels = None):
+    """Generator of AudioSegments for each (start_ms, end_ms) in ranges,
+    in the same order, decoding the file once rather than once per
+    range.  Ranges can overlap.  rate and channels default to the
+    file's own."""
+    info = MP3(in_filename).info
+    rate = rate or info.sample_rate
+    channels = channels or info.channels
+
+    finished = {}
+    next_index = 0
+    for group in _batch_groups(ranges):
+        for i, samples in _decode_group(in_filename, group, rate, channels):
+            finished[i] = pydub.AudioSegment(
+                data = memoryview(samples).cast('B'), sample_width = 2, frame_rate = rate, channels = channels)
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+
+
+def segments(in_filename, ranges, rate = None, channels = None):
+    """List version of iter_segments."""
+    return list(iter_segments(in_filename, ranges, rate, channels))
+
+
+def speech_segment(in_filename, start_ms, end_ms):
+    """AudioSegment of the range for speech recognition: decoded
+    straight to mono at ANALYSIS_RATE, which is what vosk models use,
+    and kept in memory."""
+    samples, rate, channels = pact.decoder.service.decode(
+        in_filename, start_ms, end_ms, rate = ANALYSIS_RATE, channels = 1)
+    return pydub.AudioSegment(
+        data = memoryview(samples).cast('B'), sample_width = 2, frame_rate = rate, channels = channels)
@@ -0,0 +1,171 @@
+"""Waveform peaks for a whole file, at several zoom levels.
+
+The file is decoded once, and the min and max sample of every block of
+BASE_BLOCK samples is saved, along with coarser levels made by
+combining FACTOR blocks of the level below.  Drawing a waveform for
+any range then only needs a few KB of the saved peaks, picked from the
+level that has about as many blocks in the range as there are points
+to draw, instead of decoding the audio.
+
+Sidecar file layout (little-endian):
+
+  8 bytes   magic, b'PACTPK01'
+  4 int32   sample rate, base block size, factor, number of levels
+  n int64   number of blocks in each level
+  then for each level, int16 (min, max) pairs, one pair per block
+"""
+
+import os
+import tempfile
+import numpy as np
+
+import pact.cache
+import pact.pcm
+
+
+MAGIC = b'PACTPK01'
+
+# Samples per block in the finest level.
+BASE_BLOCK = 256
+
+# Blocks of the level below combined into one block.
+FACTOR = 4
+
+LEVELS = 6
+
+
+def envelope(samples, window_size):
+    """(mins, maxs) arrays of each window of window_size samples.
+    The last window can be shorter."""
+    samples = np.asarray(samples)
+    n = len(samples)
+    full = n // window_size
+    windows = samples[0:full * window_size].reshape(full, window_size)
+    mins = windows.min(axis=1)
+    maxs = windows.max(axis=1)
+    if full * window_size < n:
+        tail = samples[full * window_size:]
+        mins = np.append(mins, tail.min())
+        maxs = np.append(maxs, tail.max())
+    return (mins, maxs)
+
+
+def _combine(mins, maxs, factor):
+    """Min and max of each group of factor blocks, including the
+    last partial group."""
+    if len(mins) == 0:
+        return (mins, maxs)
+    starts = np.arange(0, len(mins), factor)
+    return (np.minimum.reduceat(mins, starts), np.maximum.reduceat(maxs, starts))
+
+
+class PeakPyramid:
+
+    def __init__(self, in_filename):
+        self.in_filename = in_filename
+        self.path = pact.cache.cache_file(in_filename, 'peaks', BASE_BLOCK, FACTOR, LEVELS, ext = 'bin')
+        self.levels = None
+        self.sample_rate = None
+        if os.path.exists(self.path):
+            self._open()
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            header = f.read(len(MAGIC) + 16)
+        if header[0:len(MAGIC)] != MAGIC:
+            print(f'ignoring bad peaks file {self.path}')
+            return
+        rate, base, factor, nlevels = np.frombuffer(header[len(MAGIC):], '<i4').tolist()
+        counts = np.fromfile(self.path, '<i8', count = nlevels, offset = len(header)).tolist()
+
+        data = np.memmap(self.path, dtype = '<i2', mode = 'r', offset = len(header) + 8 * nlevels)
+        levels = []
+        pos = 0
+        for i, n in enumerate(counts):
+            pairs = data[pos:pos + 2 * n].reshape(n, 2)
+            levels.append((base * factor ** i, pairs))
+            pos += 2 * n
+        self.sample_rate = rate
+        self.levels = levels
+
+    def ready(self):
+        return self.levels is not None
+
+    def build(self, should_stop = lambda: False):
+        """Decode the file and save the peaks, if not already done.
+        Takes a while for long files, so call it on a background
+        thread.  If another thread is already building them, waits for
+        that one and uses its file.  If should_stop() turns True, the
+        decode is abandoned and nothing is saved."""
+        if self.ready():
+            return
+        with pact.cache.lock(self.path):
+            if not os.path.exists(self.path):
+                calculated = self._calculate(should_stop)
+                if calculated is None:
+                    return
+                self._save(*calculated)
+        self._open()
+
+    def _calculate(self, should_stop):
+        """(rate, levels) for the file, or None if stopped."""
+        rate = pact.pcm.sample_rate(self.in_filename)
+        blocks = pact.pcm.decode_blocks(
+            self.in_filename, rate = rate, channels = 1, block_samples = BASE_BLOCK * 4096)
+        mins = []
+        maxs = []
+        for samples in blocks:
+            if should_stop():
+                blocks.close()
+                return None
+            # Decoded blocks are a multiple of BASE_BLOCK, except for
+            # the last one, so this is the same as doing the whole file.
+            m, x = envelope(samples, BASE_BLOCK)
+            mins.append(m)
+            maxs.append(x)
+
+        level_mins = np.concatenate(mins) if mins else np.zeros(0, np.int16)
+        level_maxs = np.concatenate(maxs) if maxs else np.zeros(0, np.int16)
+        levels = []
+        for i in range(0, LEVELS):
+            if i > 0:
+                level_mins, level_maxs = _combine(level_mins, level_maxs, FACTOR)
+            levels.append(np.column_stack((level_mins, level_maxs)).astype('<i2'))
+        return (rate, levels)
+
+    def _save(self, rate, levels):
+        d = os.path.dirname(self.path)
+        os.makedirs(d, exist_ok = True)
+        fd, tmp = tempfile.mkstemp(dir = d, suffix = '.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(MAGIC)
+                f.write(np.array([ rate, BASE_BLOCK, FACTOR, LEVELS ], '<i4').tobytes())
+                f.write(np.array([ len(lv) for lv in levels ], '<i8').tobytes())
+                for lv in levels:
+                    f.write(lv.tobytes())
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def peaks(self, start_ms, end_ms, points = 1000):
+        """(times, mins, maxs) for the range, from the coarsest level
+        that still has at least points blocks in the range (or the
+        finest level, for short ranges).  times are the block start
+        times."""
+        samples = max(0, (end_ms - start_ms) * self.sample_rate / 1000.0)
+        block, pairs = self.levels[0]
+        for b, p in reversed(self.levels):
+            if samples / b >= points:
+                block, pairs = b, p
+                break
+
+        first = int(start_ms * self.sample_rate / 1000.0) // block
+        last = -(-int(end_ms * self.sample_rate / 1000.0) // block)
+        first = min(max(0, first), len(pairs))
+        last = min(max(first, last), len(pairs))
+        selected = np.asarray(pairs[first:last])
+        times = np.arange(first, last) * block * 1000.0 / self.sample_rate
+        return (times, selected[:, 0], selected[:, 1])
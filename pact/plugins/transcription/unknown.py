@@ -16,7 +16,11 @@ class NeedsConfiguration:
         on_update_progress = lambda n: print(f'{n}%'),
 
         # Called when service returns full transcription.
-        on_finished = lambda s: print(f'Final transcription: {s}')
+        on_finished = lambda s: print(f'Final transcription: {s}'),
+
+        # (filename, start_ms, end_ms) the audiosegment came from, if
+        # known, for caching.
+        clip = None
     ):
 
         # Note: not just calling 'print' here, because when pact uses
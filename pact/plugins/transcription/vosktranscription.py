@@ -1,16 +1,29 @@
 from pydub import AudioSegment
 from pydub import playback
-from tempfile import NamedTemporaryFile
 from vosk import Model, KaldiRecognizer, SetLogLevel
 import json
 import os
 import sys
 import tkinter
 import threading
+import time
 import wave
 
+import pact.cache
+import pact.pcm
+
 SetLogLevel(-1)
 
+try:
+    # Lets vosk read slices of the audio without copying them to
+    # bytes first.
+    from vosk import _ffi
+    def _waveform(mv):
+        return _ffi.from_buffer(mv)
+except ImportError:
+    def _waveform(mv):
+        return bytes(mv)
+
 
 class TranscriptionCallback:
     """Called during transcribe_wav()."""
@@ -43,6 +56,9 @@ class TranscriptionCallback:
         # is returned as a 'result', or a 'final result'.
         self.sentences = []
 
+        # The parsed vosk results, including word timings, for caching.
+        self.results = []
+
         self.should_be_stopped = False
 
     def totalbytes(self, t):
@@ -80,6 +96,7 @@ class TranscriptionCallback:
 
     def result(self, r):
         t = json.loads(r)
+        self.results.append(t)
         self.sentences.append(t.get('text'))
         self.current_partial_result = None
 
@@ -137,17 +154,267 @@ def transcribe_wav(f, model, callback):
         callback.final_result(rec.FinalResult())
 
 
+def feed_recognizer(rec, data, callback, chunk_frames = 4000):
+    """Feed mono 16-bit PCM (anything supporting the buffer protocol,
+    e.g. bytes or a numpy int16 array) to the recognizer, in slices of
+    chunk_frames frames, without copying it."""
+    mv = memoryview(data).cast('B')
+    callback.totalbytes(len(mv))
+    chunk_bytes = chunk_frames * 2
+    pos = 0
+    end_of_stream = False
+    while not end_of_stream and not callback.should_stop():
+        piece = mv[pos:pos + chunk_bytes]
+        pos += len(piece)
+        callback.bytesread(len(piece))
+
+        if len(piece) == 0:
+            end_of_stream = True
+        if rec.AcceptWaveform(_waveform(piece)):
+            callback.result(rec.Result())
+        else:
+            callback.partial_result(rec.PartialResult())
+
+    if not callback.should_stop():
+        callback.final_result(rec.FinalResult())
+
+
+def transcribe_pcm(data, rate, model, callback):
+    """Transcribe mono 16-bit PCM in memory using the given vosk model."""
+    rec = KaldiRecognizer(model, rate)
+    rec.SetWords(True)
+    feed_recognizer(rec, data, callback)
+
+
 def transcribe_audiosegment(chunk, model, cb = TranscriptionCallback()):
     """Transcrabe an audiosegment using the given vosk model, calling back to provide updates."""
-    # Per https://github.com/jiaaro/pydub/blob/master/pydub/playback.py,
-    # playback falls back to ffplay, so we'll assume that's what's being used.
-    # In this case, pydub actually dumps content to a temp .wav file, and
-    # then plays with that.
-    # Since that's how we're playing it, just use that for vosk as well.
-    chunk = chunk.set_channels(1)
-    with NamedTemporaryFile("w+b", suffix=".wav") as f:
-        chunk.export(f.name, format='wav')
-        transcribe_wav(f.name, model, cb)
+    # Clips from pact.pcm.speech_segment are already mono 16-bit, at
+    # the rate vosk models use, so their data is fed to vosk as-is.
+    # Anything else is converted in memory.
+    if chunk.channels != 1:
+        chunk = chunk.set_channels(1)
+    if chunk.sample_width != 2:
+        chunk = chunk.set_sample_width(2)
+    transcribe_pcm(chunk.raw_data, chunk.frame_rate, model, cb)
+
+
+def rss_mb():
+    """Resident memory of this process in MB, or None if it can't be
+    read (only Linux has /proc)."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+    except (OSError, ValueError):
+        return None
+
+
+class ModelRegistry:
+    """Vosk models, loaded once per model directory and shared by all
+    transcriptions.  Loading a big model takes seconds, so it can be
+    started in the background with preload()."""
+
+    class Entry:
+        def __init__(self):
+            self.loaded = threading.Event()
+            self.model = None
+            self.error = None
+            self.load_seconds = None
+            self.rss_mb_before = None
+            self.rss_mb_after = None
+
+    def __init__(self, model_class = None):
+        self.model_class = model_class or Model
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def _entry(self, model_dir):
+        """The entry for the dir, and whether the caller should load it."""
+        key = os.path.abspath(model_dir)
+        with self.lock:
+            if key in self.entries:
+                return (self.entries[key], False)
+            e = ModelRegistry.Entry()
+            self.entries[key] = e
+            return (e, True)
+
+    def _load(self, model_dir, entry):
+        entry.rss_mb_before = rss_mb()
+        t = time.perf_counter()
+        try:
+            entry.model = self.model_class(model_dir)
+        except Exception as ex:
+            entry.error = ex
+        entry.load_seconds = round(time.perf_counter() - t, 2)
+        entry.rss_mb_after = rss_mb()
+        entry.loaded.set()
+
+    def get(self, model_dir):
+        """The model, loading it (or waiting for the preload) if needed."""
+        entry, should_load = self._entry(model_dir)
+        if should_load:
+            self._load(model_dir, entry)
+        entry.loaded.wait()
+        if entry.error is not None:
+            raise entry.error
+        return entry.model
+
+    def preload(self, model_dir):
+        """Start loading the model on a background thread."""
+        entry, should_load = self._entry(model_dir)
+        if should_load:
+            t = threading.Thread(target = self._load, args = (model_dir, entry), daemon = True)
+            t.start()
+
+    def unload(self, model_dir):
+        key = os.path.abspath(model_dir)
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def stats(self):
+        """Load time and resident memory before and after loading, by
+        model dir, for the models that have finished loading."""
+        with self.lock:
+            entries = list(self.entries.items())
+        return {
+            d: {
+                'load_seconds': e.load_seconds,
+                'rss_mb_before': e.rss_mb_before,
+                'rss_mb_after': e.rss_mb_after,
+                'error': str(e.error) if e.error else None
+            }
+            for d, e in entries if e.loaded.is_set()
+        }
+
+
+# Shared by everything in the process.
+models = ModelRegistry()
+
+
+def transcribe_track(in_filename, model, timeline, should_stop = lambda: False, save_interval_s = 30):
+    """Transcribe the whole track into the WordTimeline, carrying on
+    from where it got to before.  The timeline is saved every
+    save_interval_s seconds, and at the end."""
+    rate = pact.pcm.ANALYSIS_RATE
+    start_ms = timeline.done_ms
+    rec = KaldiRecognizer(model, rate)
+    rec.SetWords(True)
+
+    def _add_result(r, pos_ms):
+        words = [
+            (start_ms + w['start'] * 1000, start_ms + w['end'] * 1000, w['word'], w.get('conf', 1.0))
+            for w in json.loads(r).get('result', [])
+        ]
+        timeline.add_words(words, pos_ms)
+
+    fed = 0
+    chunk_bytes = 8000
+    last_save = time.perf_counter()
+    blocks = pact.pcm.decode_blocks(in_filename, start_ms, rate = rate, channels = 1, block_samples = rate * 10)
+    for block in blocks:
+        mv = memoryview(block).cast('B')
+        for i in range(0, len(mv), chunk_bytes):
+            if should_stop():
+                timeline.save()
+                return
+            piece = mv[i:i + chunk_bytes]
+            fed += len(piece) // 2
+            if rec.AcceptWaveform(_waveform(piece)):
+                # Everything fed so far is in the result, so a restart
+                # can begin from here.
+                _add_result(rec.Result(), start_ms + fed * 1000 / rate)
+        if time.perf_counter() - last_save >= save_interval_s:
+            timeline.save()
+            last_save = time.perf_counter()
+
+    _add_result(rec.FinalResult(), start_ms + fed * 1000 / rate)
+    timeline.finish()
+    timeline.save()
+
+
+def model_id(model_dir):
+    """Name of the model for cache keys."""
+    return os.path.basename(os.path.normpath(os.path.abspath(model_dir)))
+
+
+class TranscriptionCache:
+    """Vosk results for clips of a file, saved to disk for the file and
+    model.
+
+    A request for the same clip again is served from the saved
+    results.  A clip inside one that's already been transcribed (give
+    or take EDGE_TOLERANCE_MS) gets the words whose times fall inside
+    it, using the word timings.  Either way the text is in the same
+    form as a fresh transcription: each result's words, with the
+    results joined by '. '.
+    """
+
+    # Don't let the cache file grow forever.
+    MAX_CLIPS = 500
+
+    # Clip bounds closer than this are the same clip.
+    SAME_CLIP_MS = 1
+
+    # A cached clip can be this much shorter at either end than a
+    # requested clip and still be used for it.  No word is this short.
+    EDGE_TOLERANCE_MS = 100
+
+    def __init__(self, in_filename, model_id):
+        self.path = pact.cache.cache_file(in_filename, 'transcriptions', model_id)
+        data = pact.cache.load(self.path) or {}
+        self.clips = data.get('clips', [])
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def text(results):
+        """Transcription text for the results, same as TranscriptionCallback."""
+        return '. '.join([ r.get('text') for r in results if r.get('text') ])
+
+    def get(self, start_ms, end_ms):
+        """Transcription for the clip, or None if it can't be made from
+        the cached results."""
+        with self.lock:
+            clips = list(self.clips)
+        for c in clips:
+            if abs(c['start'] - start_ms) < self.SAME_CLIP_MS and abs(c['end'] - end_ms) < self.SAME_CLIP_MS:
+                return TranscriptionCache.text(c['results'])
+
+        t = TranscriptionCache.EDGE_TOLERANCE_MS
+        for c in clips:
+            if c['start'] - t <= start_ms and end_ms <= c['end'] + t:
+                inside = [
+                    { 'text': ' '.join([
+                        w['word'] for w in r.get('result', [])
+                        if start_ms <= c['start'] + (w['start'] + w['end']) * 500 < end_ms
+                    ]) }
+                    for r in c['results']
+                ]
+                return TranscriptionCache.text(inside)
+        return None
+
+    def add(self, start_ms, end_ms, results):
+        with self.lock:
+            self.clips = [
+                c for c in self.clips
+                if not (abs(c['start'] - start_ms) < self.SAME_CLIP_MS and abs(c['end'] - end_ms) < self.SAME_CLIP_MS)
+            ]
+            self.clips.append({ 'start': start_ms, 'end': end_ms, 'results': results })
+            self.clips = self.clips[-TranscriptionCache.MAX_CLIPS:]
+            pact.cache.save(self.path, { 'clips': self.clips })
+
+
+# TranscriptionCaches by (file, model id), shared so that strategies
+# running on different threads see each other's results.
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def transcription_cache(in_filename, model_id):
+    with _caches_lock:
+        key = (in_filename, model_id)
+        if key not in _caches:
+            _caches[key] = TranscriptionCache(in_filename, model_id)
+        return _caches[key]
 
 
 class VoskTranscriptionStrategy:
@@ -167,6 +434,10 @@ class VoskTranscriptionStrategy:
         def stopped(self):
             return self._stop_event.is_set()
 
+        def wait(self, seconds):
+            """Sleep, waking early if stopped.  Returns stopped()."""
+            return self._stop_event.wait(seconds)
+
 
     def __init__(self, model_dir):
         if not os.path.exists(model_dir):
@@ -177,24 +448,49 @@ class VoskTranscriptionStrategy:
         self.transcription_thread = None
         self.model_dir = model_dir
 
+    def preload(self):
+        """Start loading the model in the background, so the first
+        transcription doesn't wait for it."""
+        models.preload(self.model_dir)
+
+
+    def transcription_cache(self, in_filename):
+        return transcription_cache(in_filename, model_id(self.model_dir))
 
-    def start(self, audiosegment, on_update_transcription, on_update_progress, on_finished, on_daemon_thread = True):
-        self.callback = TranscriptionCallback(
+    def start(self, audiosegment, on_update_transcription, on_update_progress, on_finished, on_daemon_thread = True, clip = None):
+        """Transcribe the audiosegment.  If clip, the (filename,
+        start_ms, end_ms) the audiosegment was taken from, is given,
+        the results are cached, and cached results are used if there
+        are any."""
+        callback = TranscriptionCallback(
             on_update_transcription = on_update_transcription,
             on_update_progress = on_update_progress,
             on_finished = on_finished
         )
+        self.callback = callback
+
+        cache = None
+        if clip is not None:
+            cache = self.transcription_cache(clip[0])
+            cached = cache.get(clip[1], clip[2])
+            if cached is not None:
+                if on_update_progress:
+                    on_update_progress(100)
+                if on_finished:
+                    on_finished(cached)
+                return
 
         def __do_transcription():
-            model = Model(self.model_dir)
-            transcribe_audiosegment(audiosegment, model, self.callback)
+            model = models.get(self.model_dir)
+            transcribe_audiosegment(audiosegment, model, callback)
+            if cache is not None and not callback.should_stop():
+                cache.add(clip[1], clip[2], callback.results)
 
         # Design flaw ... could create separate classes for different
         # behavious.  Shouldn't change behaviour based on param.
         # TODO re-org this.
         if on_daemon_thread:
-            self.transcription_thread = VoskTranscriptionStrategy.StoppableThread(target=__do_transcription)
-            self.transcription_thread.setDaemon(True)
+            self.transcription_thread = VoskTranscriptionStrategy.StoppableThread(target=__do_transcription, daemon=True)
             self.transcription_thread.start()
         else:
             __do_transcription()
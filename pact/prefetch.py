@@ -0,0 +1,126 @@
+"""Getting the clips of the bookmarks next to the one being edited
+ready in the background.
+
+When a clip popup is open for bookmark i, the next one opened is
+usually i + 1 (or i - 1).  NeighbourPrefetch extracts those clips
+(and their speech clips) into the clip cache and transcribes them
+into the transcription cache, one at a time, so that the next popup
+has both right away.
+
+It's low priority: it waits a bit before starting so the popup's own
+work goes first, and it's stopped (with the usual
+TranscriptionCallback / StoppableThread stop) whenever an interactive
+transcription starts.  resume() carries on with whatever was left.
+"""
+
+import threading
+
+import pact.utils
+from pact.plugins.transcription import vosktranscription
+
+
+class NeighbourPrefetch:
+
+    # Seconds to wait before starting, and between clips.
+    DELAY = 1.0
+
+    def __init__(self, transcription_strategy, pcm_store = None, word_timeline = None):
+        self.model_dir = None
+        if isinstance(transcription_strategy, vosktranscription.VoskTranscriptionStrategy):
+            self.model_dir = transcription_strategy.model_dir
+        self.pcm_store = pcm_store
+        self.word_timeline = word_timeline
+        self.music_file = None
+        self.pending = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.strategy = None
+
+    def start(self, music_file, bookmarks):
+        """Stop any current prefetch, and prefetch the clips of the
+        bookmarks, in order."""
+        self.stop()
+        with self.lock:
+            self.music_file = music_file
+            self.pending = [
+                b.clip_bounds_ms for b in bookmarks
+                if b.clip_bounds_ms and not b.transcription
+            ]
+        self.resume()
+
+    def resume(self):
+        with self.lock:
+            if len(self.pending) == 0 or (self.thread is not None and self.thread.is_alive()):
+                return
+            # Each run gets its own strategy (so stopping it doesn't
+            # touch the popup's, or a new run's if the stopped one is
+            # still finishing its clip).
+            self.strategy = None
+            if self.model_dir is not None:
+                self.strategy = vosktranscription.VoskTranscriptionStrategy(self.model_dir)
+            self.thread = vosktranscription.VoskTranscriptionStrategy.StoppableThread(
+                target=self.__run, args=(self.strategy,), daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stop the prefetch.  Doesn't wait for the thread (it might be
+        waiting on the model loading), it finishes on its own."""
+        with self.lock:
+            t, strategy = self.thread, self.strategy
+            self.thread = None
+            self.strategy = None
+        if t is None:
+            return
+        t.stop()
+        if strategy is not None:
+            strategy.stop()
+
+    def _next(self):
+        with self.lock:
+            return self.pending[0] if len(self.pending) > 0 else None
+
+    def _done(self, bounds):
+        with self.lock:
+            if bounds in self.pending:
+                self.pending.remove(bounds)
+
+    def __run(self, strategy):
+        thread = threading.current_thread()
+        while not thread.wait(NeighbourPrefetch.DELAY):
+            bounds = self._next()
+            if bounds is None:
+                return
+            try:
+                self.prefetch(bounds, thread, strategy)
+            except Exception as e:
+                print(f'prefetch of {bounds} failed: {e}')
+            if not thread.stopped():
+                self._done(bounds)
+
+    def prefetch(self, bounds, thread, strategy):
+        s, e = bounds
+        if self.pcm_store is None or not self.pcm_store.ready():
+            pact.utils.clip_cache.get(self.music_file, s, e)
+        if thread.stopped() or strategy is None:
+            return
+        if self.word_timeline is not None and self.word_timeline.covers(s, e):
+            return
+        # The popup gets the speech clip even if the transcription's
+        # cached.
+        speech = pact.utils.clip_cache.speech(self.music_file, s, e)
+        if strategy.transcription_cache(self.music_file).get(s, e) is not None:
+            return
+
+        strategy.start(
+            speech,
+            on_update_transcription = None,
+            on_update_progress = None,
+            on_finished = None,
+            clip = (self.music_file, s, e)
+        )
+        if thread.stopped():
+            # stop() came in while starting.
+            strategy.stop()
+        t = strategy.transcription_thread
+        if t is not None:
+            t.join()
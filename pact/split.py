@@ -6,13 +6,23 @@
 
 
 import argparse
-import ffmpeg
+import bisect
+import concurrent.futures
+import itertools
 import logging
 import os
 import re
+import statistics
 import subprocess
 import sys
+import time
 
+import numpy as np
+
+import pact.cache
+import pact.decoder
+import pact.mp3index
+import pact.pcm
 import pact.utils
 from pact.utils import Profile
 import pact.music
@@ -30,39 +40,85 @@ DEFAULT_DURATION = 0.3
 # dB threshold for splits.
 DEFAULT_THRESHOLD = -10
 
+# Phrase length that auto_settings aims for.
+DEFAULT_TARGET_PHRASE_MS = 3000.0
 
-def raw_chunks(
+# Bumped when the auto_settings sweep changes, so old cached sweeps
+# are redone.
+AUTO_SETTINGS_VERSION = 2
+
+
+class ChunkCollector:
+    """Builds the list of (start, end) chunks from the silence start and
+    end times, as the silences are found.
+
+    Chunks start when silence ends, and chunks end when silence starts.
+    """
+
+    def __init__(self, start_ms = None, end_ms = None, onChunkStartFound = lambda ms: None):
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.onChunkStartFound = onChunkStartFound
+        self.chunk_starts = []
+        self.chunk_ends = []
+
+    def silence_start(self, t):
+        self.chunk_ends.append(t)
+        if len(self.chunk_starts) == 0:
+            # Started with non-silence.
+            self.chunk_starts.append(self.start_ms or 0.)
+
+    def silence_end(self, t):
+        self.onChunkStartFound(t)
+        self.chunk_starts.append(t)
+
+    def add_event(self, event, t):
+        """Add a ('silence_start', t) or ('silence_end', t) event."""
+        if event == 'silence_start':
+            self.silence_start(t)
+        else:
+            self.silence_end(t)
+
+    def chunks(self):
+        chunk_starts = list(self.chunk_starts)
+        chunk_ends = list(self.chunk_ends)
+        if len(chunk_starts) == 0:
+            # No silence found.
+            chunk_starts.append(self.start_ms or 0.)
+
+        if len(chunk_starts) > len(chunk_ends):
+            # Finished with non-silence.
+            chunk_ends.append(self.end_ms or 10 * 3600 * 1000.)
+
+        chunks = list(zip(chunk_starts, chunk_ends))
+        return [
+            c for c in chunks
+            if c[0] < c[1]
+        ]
+
+
+def silence_events(
         in_filename,
         silence_threshold,
         silence_duration,
         start_ms = None,
-        end_ms = None,
-        onChunkStartFound = lambda ms: None
+        end_ms = None
 ):
-    """Given an in_filename, find possible split points (phrase start
-    times) using ffmpeg.
+    """Generator of ('silence_start', ms) and ('silence_end', ms) events,
+    yielded as ffmpeg finds them.
 
-    Note that potential phrase start times are actually when any
-    silence in the clip *ends*.
+    If the caller stops iterating early (i.e., the generator is
+    closed), the ffmpeg process is killed.
     """
 
-    kwargs = {}
-    if start_ms is not None:
-        kwargs['ss'] = (start_ms/1000.0)
-    if end_ms is not None:
-        kwargs['t'] = (end_ms-start_ms)/1000.0
-
     ffmpegcmd = (
-        ffmpeg
-        .input(in_filename, **kwargs)
+        pact.mp3index.ffmpeg_input(in_filename, start_ms, end_ms)
         .filter('silencedetect', n='{}dB'.format(silence_threshold), d=silence_duration)
         .output('-', format='null')
         .compile()
     ) + ['-nostats']  # FIXME: use .nostats() once it's implemented in ffmpeg-python.
     logger.debug(f'Running command: {subprocess.list2cmdline(ffmpegcmd)}')
 
-    ppopen = Profile('split.subprocess')
-
     timematch = r'(?P<deltafromstart>[0-9]+(\.?[0-9]*))'
     start_re = re.compile(f'silence_start: {timematch}$')
     end_re = re.compile(f'silence_end: {timematch} ')
@@ -73,50 +129,589 @@ def raw_chunks(
     def time_ms(m):
         return base_start + round(float(m.group('deltafromstart')) * 1000)
 
-    # Chunks start when silence ends, and chunks end when silence starts.
-    chunk_starts = []
-    chunk_ends = []
     with subprocess.Popen(
             ffmpegcmd,
             stderr=subprocess.PIPE,
             stdout = subprocess.PIPE) as p:
-        # ffmpeg outputs e.g. "silence_end: 123.234" to stderr.
-        for line in p.stderr:
-            s = line.decode('utf-8').strip()
-            end_match = end_re.search(s)
-            start_match = start_re.search(s)
-            if start_match or end_match:
-                logger.info(s)
-            else:
-                logger.debug(s)
-            if start_match:
-                t = time_ms(start_match)
-                logger.info(f'start ms: {t}')
-                chunk_ends.append(time_ms(start_match))
-                if len(chunk_starts) == 0:
-                    # Started with non-silence.
-                    chunk_starts.append(start_ms or 0.)
-            if end_match:
-                t = time_ms(end_match)
-                logger.info(f'end ms: {t}')
-                onChunkStartFound(t)
-                chunk_starts.append(t)
-
-    if len(chunk_starts) == 0:
-        # No silence found.
-        chunk_starts.append(start_ms)
+        try:
+            # ffmpeg outputs e.g. "silence_end: 123.234" to stderr.
+            for line in p.stderr:
+                s = line.decode('utf-8').strip()
+                end_match = end_re.search(s)
+                start_match = start_re.search(s)
+                if start_match or end_match:
+                    logger.info(s)
+                else:
+                    logger.debug(s)
+                if start_match:
+                    t = time_ms(start_match)
+                    logger.info(f'start ms: {t}')
+                    yield ('silence_start', t)
+                if end_match:
+                    t = time_ms(end_match)
+                    logger.info(f'end ms: {t}')
+                    yield ('silence_end', t)
+        finally:
+            if p.poll() is None:
+                logger.debug('Killing ffmpeg')
+                p.kill()
 
-    if len(chunk_starts) > len(chunk_ends):
-        # Finished with non-silence.
-        chunk_ends.append(end_ms or 10 * 3600 * 1000.)
 
+def raw_chunks(
+        in_filename,
+        silence_threshold,
+        silence_duration,
+        start_ms = None,
+        end_ms = None,
+        onChunkStartFound = lambda ms: None
+):
+    """Given an in_filename, find possible split points (phrase start
+    times) using ffmpeg.
+
+    Note that potential phrase start times are actually when any
+    silence in the clip *ends*.
+    """
+    ppopen = Profile('split.subprocess')
+    collector = ChunkCollector(start_ms, end_ms, onChunkStartFound)
+    events = silence_events(
+        in_filename,
+        silence_threshold,
+        silence_duration,
+        start_ms = start_ms,
+        end_ms = end_ms)
+    for event, t in events:
+        collector.add_event(event, t)
     ppopen.stop()
-    chunks = list(zip(chunk_starts, chunk_ends))
+    return collector.chunks()
+
+
+class Levels:
+    """Windowed levels (in dB) of the decoded audio, from which chunks
+    can be found for any threshold and duration without decoding
+    again."""
+
+    def __init__(self, in_filename, start_ms = None, end_ms = None, window_ms = 10, measure = 'peak', onProgress = lambda ms: None):
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.rate = pact.pcm.sample_rate(in_filename)
+        self.window_size = max(1, int(self.rate * window_ms / 1000))
+
+        # Decode in blocks of whole windows, so long files don't have
+        # to be held in memory.
+        block_samples = self.window_size * 6000
+        if start_ms is not None and end_ms is not None and (end_ms - start_ms) * self.rate / 1000 <= block_samples:
+            # Short ranges (e.g. the clip popup) fit in one block, get
+            # it from the decoder service.
+            blocks = [ pact.decoder.service.decode(in_filename, start_ms, end_ms, self.rate, 1)[0] ]
+        else:
+            blocks = pact.pcm.decode_blocks(in_filename, start_ms, end_ms, self.rate, block_samples = block_samples)
+        self.nsamples = 0
+        dbs = []
+        for block in blocks:
+            self.nsamples += len(block)
+            dbs.append(pact.pcm.window_db(block, self.window_size, measure))
+            onProgress((start_ms or 0) + self.nsamples * 1000.0 / self.rate)
+        self.db = np.concatenate(dbs) if len(dbs) > 0 else np.zeros(0)
+
+    def time_ms(self, window_index):
+        sample_index = min(window_index * self.window_size, self.nsamples)
+        return (self.start_ms or 0.) + round(sample_index * 1000 / self.rate)
+
+    def chunks(self, silence_threshold, silence_duration, onChunkStartFound = lambda ms: None):
+        min_windows = int(np.ceil(silence_duration * self.rate / self.window_size))
+        runs = pact.pcm.silent_runs(self.db < silence_threshold, min_windows)
+        collector = ChunkCollector(self.start_ms, self.end_ms, onChunkStartFound)
+        for s, e in runs:
+            collector.silence_start(self.time_ms(s))
+            # Like ffmpeg, a silence running to the end of the audio
+            # "ends" at the end.
+            collector.silence_end(self.time_ms(e))
+        return collector.chunks()
+
+
+def numpy_raw_chunks(
+        in_filename,
+        silence_threshold,
+        silence_duration,
+        start_ms = None,
+        end_ms = None,
+        onChunkStartFound = lambda ms: None,
+        window_ms = 10,
+        measure = 'peak'
+):
+    """Same as raw_chunks, but finds the silences in-process with numpy.
+
+    The audio is decoded to PCM once, and the level (in dB) of each
+    window_ms window is compared against the threshold.  Runs of quiet
+    windows lasting at least silence_duration are silences.  With the
+    default 'peak' measure, results are close to (within a window of)
+    ffmpeg's silencedetect, which works sample-by-sample.  'rms' is
+    available too, but needs a much lower threshold.
+    """
+    p = Profile('split.numpy')
+    levels = Levels(in_filename, start_ms, end_ms, window_ms, measure)
+    chunks = levels.chunks(silence_threshold, silence_duration, onChunkStartFound)
+    p.stop()
+    return chunks
+
+
+def sweep(
+        in_filename,
+        thresholds,
+        durations,
+        start_ms = None,
+        end_ms = None,
+        window_ms = 10
+):
+    """Chunk stats for each threshold/duration pair, for tuning.
+
+    The audio is only decoded once, and then each setting is
+    evaluated against the same levels.  Returns a list of dicts, one
+    per setting.
+    """
+    t = time.perf_counter()
+    levels = Levels(in_filename, start_ms, end_ms, window_ms)
+    decode_seconds = time.perf_counter() - t
+    ret = sweep_levels(levels, thresholds, durations)
+    for r in ret:
+        r['decode_seconds'] = decode_seconds
+    return ret
+
+
+def sweep_levels(levels, thresholds, durations):
+    """Chunk stats for each threshold/duration pair, for already-decoded Levels."""
+
+    def _stats(vals, prefix):
+        if len(vals) == 0:
+            return { f'min_{prefix}': None, f'median_{prefix}': None }
+        return { f'min_{prefix}': min(vals), f'median_{prefix}': statistics.median(vals) }
+
+    ret = []
+    for threshold in thresholds:
+        for duration in durations:
+            t = time.perf_counter()
+            chunks = levels.chunks(threshold, duration)
+            elapsed = time.perf_counter() - t
+
+            # The last chunk may run to the "end" of the file.
+            lengths = [ c[1] - c[0] for c in chunks if c[1] != 10 * 3600 * 1000. ]
+            r = {
+                'threshold': threshold,
+                'duration': duration,
+                'chunks': len(chunks),
+                'seconds': elapsed
+            }
+            r.update(_stats(lengths, 'chunk'))
+            r.update(_stats(silences(chunks), 'silence'))
+            ret.append(r)
+    return ret
+
+
+def auto_settings(
+        in_filename,
+        target_phrase_ms = DEFAULT_TARGET_PHRASE_MS,
+        compute = True,
+        use_cache = True,
+        onProgress = lambda ms: None):
+    """(threshold, duration) for the file, picked from its loudness.
+
+    A fixed threshold finds far too many breaks in quiet recordings,
+    and too few in loud ones.  This decodes the file once and splits
+    its window levels into a quiet and a loud group.  Thresholds
+    between the two are tried with a few durations, and the setting
+    whose median chunk length is closest to target_phrase_ms wins
+    (the lowest threshold, on ties).  Thresholds inside the speech
+    levels are never tried: they'd match the target length by
+    breaking in the middle of phrases.
+
+    The sweep results are cached, so a different target_phrase_ms is
+    picked from them without decoding again.  If compute is False,
+    returns None if the sweep hasn't been cached yet.  If use_cache is
+    False, the cache isn't read or written.  onProgress is called with
+    how far (in ms) the decode has got.
+    """
+    path = pact.cache.cache_file(in_filename, 'loudness')
+    data = (pact.cache.load(path) if use_cache else None) or {}
+    results = data.get('sweep')
+    if data.get('version') != AUTO_SETTINGS_VERSION:
+        results = None
+    if results is None:
+        if not compute:
+            return None
+        p = Profile('auto_settings')
+        results = _auto_settings_sweep(in_filename, onProgress)
+        p.stop()
+        if use_cache:
+            pact.cache.save(path, { 'version': AUTO_SETTINGS_VERSION, 'sweep': results })
+
+    best = (DEFAULT_THRESHOLD, DEFAULT_DURATION)
+    best_score = None
+    for threshold, duration, median_chunk in sorted(results):
+        score = abs(np.log(median_chunk / target_phrase_ms))
+        if best_score is None or score < best_score:
+            best = (threshold, duration)
+            best_score = score
+    return best
+
+
+def quiet_thresholds(db):
+    """Thresholds between the quiet and loud levels in db.
+
+    The levels are split in two where the groups are best separated
+    (Otsu's method on a histogram).  The thresholds are spread between
+    the top of the quiet group and the bottom of the loud one,
+    leaving out the noise in the gaps and the quiet ends of words.
+    """
+    # Digital silence would stretch the histogram.
+    db = np.maximum(db, -100.)
+    counts, edges = np.histogram(db, bins = 200)
+    centres = (edges[:-1] + edges[1:]) / 2
+    below = np.cumsum(counts)
+    above = below[-1] - below
+    sums = np.cumsum(counts * centres)
+    mean_below = sums / np.maximum(below, 1)
+    mean_above = (sums[-1] - sums) / np.maximum(above, 1)
+    split = centres[np.argmax(below * above * (mean_below - mean_above) ** 2)]
+
+    quiet = db[db < split]
+    loud = db[db >= split]
+    if len(quiet) == 0 or len(loud) == 0:
+        return []
+    top = np.percentile(quiet, 95)
+    bottom = np.percentile(loud, 5)
+    return sorted(set([ round(float(top + (bottom - top) * k), 1) for k in (0.25, 0.5, 0.75) ]))
+
+
+def _auto_settings_sweep(in_filename, onProgress):
+    """[ threshold, duration, median_chunk ] for each setting
+    auto_settings picks from."""
+    levels = Levels(in_filename, onProgress = onProgress)
+    if len(levels.db) == 0:
+        return []
+    durations = [ 0.2, 0.3, 0.5, 0.8 ]
     return [
-        c for c in chunks
-        if c[0] < c[1]
+        [ r['threshold'], r['duration'], r['median_chunk'] ]
+        for r in sweep_levels(levels, quiet_thresholds(levels.db), durations)
+        if r['median_chunk'] is not None and r['median_chunk'] > 0
+    ]
+
+
+def _scan_window(args):
+    """Process pool worker for parallel_raw_chunks."""
+    engine, in_filename, silence_threshold, silence_duration, start_ms, end_ms = args
+    return ENGINES[engine](
+        in_filename,
+        silence_threshold,
+        silence_duration,
+        start_ms = start_ms,
+        end_ms = end_ms)
+
+
+def window_silences(chunks, start_ms, end_ms):
+    """The silences in a scanned window, i.e. the gaps around the chunks."""
+    if len(chunks) == 0:
+        return [ (start_ms, end_ms) ]
+    ret = []
+    if chunks[0][0] > start_ms:
+        ret.append((start_ms, chunks[0][0]))
+    for i in range(0, len(chunks) - 1):
+        ret.append((chunks[i][1], chunks[i + 1][0]))
+    if chunks[-1][1] < end_ms:
+        ret.append((chunks[-1][1], end_ms))
+    return ret
+
+
+def parallel_raw_chunks(
+        in_filename,
+        silence_threshold,
+        silence_duration,
+        start_ms = None,
+        end_ms = None,
+        onChunkStartFound = lambda ms: None,
+        engine = 'ffmpeg',
+        window_ms = 10 * 60 * 1000,
+        overlap_ms = 10 * 1000,
+        processes = None
+):
+    """Same as raw_chunks, but the range is split into overlapping
+    windows which are scanned on all cores.
+
+    A silence that crosses a window boundary shows up in both
+    windows, possibly truncated, so the window silences are merged
+    wherever they overlap.  The overlap must be longer than the
+    silence_duration, so that any silence cut short at the end of one
+    window is found in full by the next one.
+    """
+    p = Profile('split.parallel')
+    range_start = start_ms or 0
+    range_end = end_ms
+    if range_end is None:
+        range_end = pact.pcm.duration_ms(in_filename)
+    overlap_ms = max(overlap_ms, 2 * silence_duration * 1000)
+
+    windows = []
+    s = range_start
+    while s < range_end:
+        e = s + window_ms
+        if e + overlap_ms >= range_end:
+            # Last window, scan to the end of the range (or file).
+            windows.append((s, end_ms))
+            break
+        windows.append((s, e + overlap_ms))
+        s = e
+
+    if len(windows) == 1:
+        return ENGINES[engine](
+            in_filename,
+            silence_threshold,
+            silence_duration,
+            start_ms = start_ms,
+            end_ms = end_ms,
+            onChunkStartFound = onChunkStartFound)
+
+    jobs = [
+        (engine, in_filename, silence_threshold, silence_duration, w[0], w[1])
+        for w in windows
     ]
 
+    collector = ChunkCollector(start_ms, end_ms, onChunkStartFound)
+    def add_silence(silence):
+        collector.silence_start(silence[0])
+        collector.silence_end(silence[1])
+
+    # Windows come back in order, so a merged silence is final as
+    # soon as a later silence starts after it ends.
+    pending = None
+    with concurrent.futures.ProcessPoolExecutor(max_workers = processes) as executor:
+        for w, chunks in zip(windows, executor.map(_scan_window, jobs)):
+            wend = w[1]
+            if wend is None:
+                wend = range_end
+            for silence in window_silences(chunks, w[0], wend):
+                if pending is not None and silence[0] <= pending[1]:
+                    pending[1] = max(pending[1], silence[1])
+                    continue
+                if pending is not None:
+                    add_silence(pending)
+                pending = list(silence)
+
+    if pending is not None:
+        add_silence(pending)
+
+    p.stop()
+    return collector.chunks()
+
+
+# Silence detection engines, usable with segment_start_times.
+ENGINES = {
+    'ffmpeg': raw_chunks,
+    'numpy': numpy_raw_chunks,
+    'parallel': parallel_raw_chunks
+}
+
+
+def clip_chunks(chunks, start_ms = None, end_ms = None):
+    """Get the chunks (from a scan of a larger range) that fall within
+    start_ms and end_ms, trimmed to that range.  Gives the same
+    result as raw_chunks for the smaller range would.
+    """
+    s = start_ms or 0.
+    e = float('inf') if end_ms is None else end_ms
+    ret = []
+    for c in chunks:
+        cs = max(c[0], s)
+        ce = min(c[1], e)
+        if cs < ce:
+            ret.append((cs, ce))
+    return ret
+
+
+class SilenceCache:
+    """raw_chunks results, saved to disk for the file/threshold/duration.
+
+    Each scan's range and chunks are stored, and any later request
+    for a range that falls within an already-scanned range is served
+    from the stored chunks.
+    """
+
+    # Don't let the cache file grow forever.
+    MAX_SCANS = 50
+
+    def __init__(self, in_filename, silence_threshold, silence_duration, engine = 'ffmpeg'):
+        self.path = pact.cache.cache_file(
+            in_filename, 'silences', engine, silence_threshold, silence_duration)
+        data = pact.cache.load(self.path) or {}
+        self.scans = data.get('scans', [])
+
+    @staticmethod
+    def _covers(scan, start_ms, end_ms):
+        if scan['start'] > (start_ms or 0):
+            return False
+        if scan['end'] is None:
+            return True
+        return end_ms is not None and end_ms <= scan['end']
+
+    def get(self, start_ms = None, end_ms = None):
+        """Cached chunks for the range, or None if it hasn't been scanned."""
+        for scan in self.scans:
+            if SilenceCache._covers(scan, start_ms, end_ms):
+                chunks = [ tuple(c) for c in scan['chunks'] ]
+                return clip_chunks(chunks, start_ms, end_ms)
+        return None
+
+    def add(self, chunks, start_ms = None, end_ms = None):
+        """Store a scan, replacing any scans that it covers.  Scans
+        saved by other threads since this cache was loaded are kept."""
+        s = start_ms or 0
+        with pact.cache.lock(self.path):
+            data = pact.cache.load(self.path) or {}
+            scans = [
+                scan for scan in data.get('scans', [])
+                if not SilenceCache._covers(
+                        { 'start': s, 'end': end_ms }, scan['start'], scan['end'])
+            ]
+            scans.append({
+                'start': s,
+                'end': end_ms,
+                'chunks': [ list(c) for c in chunks ]
+            })
+            self.scans = scans[-SilenceCache.MAX_SCANS:]
+            pact.cache.save(self.path, { 'scans': self.scans })
+
+
+class ScanCheckpoint:
+    """Progress of an unfinished ffmpeg scan, saved to disk every so
+    often, so that if a scan of a 20-hour file is interrupted (app
+    closed, crash) a later scan can pick up where it left off.
+
+    The checkpoint is only ever saved right after a silence ends, so
+    resuming the scan at that point starts in non-silence, and ffmpeg
+    finds the following silences the same as an uninterrupted scan.
+    """
+
+    # Seconds between saves.
+    SAVE_INTERVAL = 10
+
+    def __init__(self, in_filename, silence_threshold, silence_duration, start_ms = None, end_ms = None):
+        self.path = pact.cache.cache_file(
+            in_filename, 'checkpoint', silence_threshold, silence_duration, start_ms, end_ms)
+        data = pact.cache.load(self.path) or {}
+        self.events = [ tuple(e) for e in data.get('events', []) ]
+        self.offset_ms = data.get('offset', start_ms)
+        self.last_save = time.monotonic()
+
+    def add_event(self, event, t):
+        self.events.append((event, t))
+        elapsed = time.monotonic() - self.last_save
+        if event == 'silence_end' and elapsed >= ScanCheckpoint.SAVE_INTERVAL:
+            self.offset_ms = t
+            self.save()
+
+    def save(self):
+        pact.cache.save(self.path, {
+            'offset': self.offset_ms,
+            'events': [ list(e) for e in self.events ]
+        })
+        self.last_save = time.monotonic()
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def resumable_raw_chunks(
+        in_filename,
+        silence_threshold,
+        silence_duration,
+        start_ms = None,
+        end_ms = None,
+        onChunkStartFound = lambda ms: None
+):
+    """raw_chunks, checkpointing progress, and resuming from the last
+    checkpoint of an earlier interrupted scan of the same range."""
+    checkpoint = ScanCheckpoint(in_filename, silence_threshold, silence_duration, start_ms, end_ms)
+    collector = ChunkCollector(start_ms, end_ms, onChunkStartFound)
+    if len(checkpoint.events) > 0:
+        logger.info(f'resuming scan at {checkpoint.offset_ms} ms')
+    for event, t in checkpoint.events:
+        collector.add_event(event, t)
+
+    events = silence_events(
+        in_filename,
+        silence_threshold,
+        silence_duration,
+        start_ms = checkpoint.offset_ms,
+        end_ms = end_ms)
+    for event, t in events:
+        collector.add_event(event, t)
+        checkpoint.add_event(event, t)
+
+    checkpoint.clear()
+    return collector.chunks()
+
+
+def cached_raw_chunks(
+        in_filename,
+        silence_threshold,
+        silence_duration,
+        start_ms = None,
+        end_ms = None,
+        onChunkStartFound = lambda ms: None,
+        engine = 'ffmpeg'
+):
+    """raw_chunks, only scanning the file if the range hasn't already
+    been scanned.  ffmpeg scans are checkpointed, see ScanCheckpoint."""
+    cache = SilenceCache(in_filename, silence_threshold, silence_duration, engine)
+    chunks = cache.get(start_ms, end_ms)
+    if chunks is not None:
+        logger.info(f'using cached chunks from {cache.path}')
+        for c in chunks:
+            onChunkStartFound(c[0])
+        return chunks
+
+    scan = ENGINES[engine]
+    if engine == 'ffmpeg':
+        scan = resumable_raw_chunks
+    chunks = scan(
+        in_filename,
+        silence_threshold,
+        silence_duration,
+        start_ms = start_ms,
+        end_ms = end_ms,
+        onChunkStartFound = onChunkStartFound)
+    cache.add(chunks, start_ms, end_ms)
+    return chunks
+
+
+class SilenceIndex:
+    """Sorted index of the raw chunks of an entire file.
+
+    The chunks are the sound between the silences, so the silence
+    intervals are just the gaps between consecutive chunks.  Lookups
+    for a given range are done with bisect, rather than re-scanning
+    the file.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = sorted([ tuple(c) for c in chunks ])
+        self.starts = [ c[0] for c in self.chunks ]
+        self.ends = [ c[1] for c in self.chunks ]
+
+    def chunks_between(self, start_ms = None, end_ms = None):
+        """Same result as raw_chunks for the range."""
+        i = 0
+        if start_ms is not None:
+            i = bisect.bisect_right(self.ends, start_ms)
+        j = len(self.chunks)
+        if end_ms is not None:
+            j = bisect.bisect_left(self.starts, end_ms)
+        return clip_chunks(self.chunks[i:j], start_ms, end_ms)
+
+    def segment_start_times(self, start_ms = None, end_ms = None, min_duration_ms = 5000.0, shift_ms = 200):
+        """Same result as segment_start_times for the range."""
+        chunk_starts = [ c[0] for c in self.chunks_between(start_ms, end_ms) ]
+        return correct_raw_np(chunk_starts, min_duration_ms, shift_ms).tolist()
+
 
 def silences(chunks):
     """Get the silences between the chunks, for stats."""
@@ -191,39 +786,265 @@ def correct_raw(segstarts, min_duration_ms = 5000.0, shift_ms = 200):
     return ret
 
 
-def segment_start_times(
+def sensible_start_times_np(start_times, min_duration):
+    """Array version of sensible_start_times, same results.
+
+    For each start time, the index of the next start time that's at
+    least min_duration later is found for the whole array at once
+    with searchsorted.  Then the kept start times are just the chain
+    of "next" indexes from the first start time, which is a very
+    cheap walk.
+    """
+    a = np.sort(np.asarray(start_times, dtype=np.float64))
+    n = len(a)
+    if n == 0:
+        return a
+
+    indexes = np.arange(n)
+    nxt = np.searchsorted(a, a + min_duration, side='left')
+    nxt = np.maximum(nxt, indexes + 1)
+
+    # a + min_duration can round differently than the
+    # "candidate - last >= min_duration" check in
+    # sensible_start_times, so nudge the indexes to match it exactly.
+    padded = np.append(a, np.inf)
+    while True:
+        too_close = (nxt < n) & (padded[nxt] - a < min_duration)
+        too_far = (nxt > indexes + 1) & (padded[nxt - 1] - a >= min_duration)
+        if not (too_close.any() or too_far.any()):
+            break
+        nxt = nxt + too_close - too_far
+
+    nxt = nxt.tolist()
+    kept = []
+    i = 0
+    while i < n:
+        kept.append(i)
+        i = nxt[i]
+    return a[kept]
+
+
+def correct_raw_np(segstarts, min_duration_ms = 5000.0, shift_ms = 200):
+    """Array version of correct_raw, same results.  See correct_raw
+    for notes."""
+    a = np.asarray(segstarts, dtype=np.float64)
+    if len(a) < 2:
+        return a
+    shifted = np.maximum(a - shift_ms, a[0])
+    return sensible_start_times_np(np.unique(shifted), min_duration_ms)
+
+
+def iter_chunk_starts(events, start_ms = None, end_ms = None):
+    """Generator of chunk starts from silence events, as they happen.
+    Gives the same starts as the ChunkCollector chunks."""
+    start = start_ms or 0.
+    end = float('inf') if end_ms is None else end_ms
+    had_events = False
+    for event, t in events:
+        if event == 'silence_start':
+            if not had_events and start < t:
+                # Started with non-silence.
+                yield start
+        elif t < end:
+            yield t
+        had_events = True
+    if not had_events and start < end:
+        # No silence found.
+        yield start
+
+
+def iter_corrected_starts(segstarts, min_duration_ms = 5000.0, shift_ms = 200):
+    """Generator version of correct_raw, for segstarts in increasing
+    order.  Since they're in order, the shifted starts don't need
+    sorting, and sensible_start_times only needs the last start kept.
+    """
+    first = None
+    last = None
+    for c in segstarts:
+        if first is None:
+            first = last = c
+            yield c
+            continue
+        c = max(c - shift_ms, first)
+        if c != last and c - last >= min_duration_ms:
+            last = c
+            yield c
+
+
+def iter_segment_start_times(
         in_filename,
         start_ms = None,
         end_ms = None,
-        silence_threshold = DEFAULT_THRESHOLD,
-        silence_duration = DEFAULT_DURATION,
+        silence_threshold = None,
+        silence_duration = None,
         min_duration_ms = 5000.0,
         shift_ms = 200,
-        onChunkStartFound = lambda ms: None):
-    cs = raw_chunks(
+        use_cache = True,
+        engine = 'ffmpeg'):
+    """Generator version of segment_start_times, yielding the start
+    times as ffmpeg finds them.  If the caller stops iterating, the
+    ffmpeg process is killed, so there's no cost for scanning audio
+    that nobody looks at.  The other engines don't stream, so with
+    them the whole range is scanned first.
+
+    auto_settings decodes the whole track, so it isn't run here: if
+    the threshold or duration aren't given, the cached auto settings
+    are used, or the defaults.
+    """
+    silence_threshold, silence_duration = _with_auto_settings(
+        in_filename, silence_threshold, silence_duration, compute = False, use_cache = use_cache)
+    if engine != 'ffmpeg':
+        chunks = find_chunks(
+            in_filename,
+            silence_threshold,
+            silence_duration,
+            start_ms = start_ms,
+            end_ms = end_ms,
+            use_cache = use_cache,
+            engine = engine)
+        starts = [ c[0] for c in chunks ]
+        yield from iter_corrected_starts(starts, min_duration_ms, shift_ms)
+        return
+
+    cache = None
+    if use_cache:
+        cache = SilenceCache(in_filename, silence_threshold, silence_duration)
+        chunks = cache.get(start_ms, end_ms)
+        if chunks is not None:
+            starts = [ c[0] for c in chunks ]
+            yield from iter_corrected_starts(starts, min_duration_ms, shift_ms)
+            return
+
+    ffmpeg_events = silence_events(
+        in_filename,
+        silence_threshold,
+        silence_duration,
+        start_ms = start_ms,
+        end_ms = end_ms)
+    collector = ChunkCollector(start_ms, end_ms)
+
+    def events():
+        for event, t in ffmpeg_events:
+            collector.add_event(event, t)
+            yield (event, t)
+        # Only reached if the full range was scanned.
+        if cache is not None:
+            cache.add(collector.chunks(), start_ms, end_ms)
+
+    try:
+        starts = iter_chunk_starts(events(), start_ms, end_ms)
+        yield from iter_corrected_starts(starts, min_duration_ms, shift_ms)
+    finally:
+        ffmpeg_events.close()
+
+
+def _is_full_track(start_ms, end_ms):
+    return not start_ms and end_ms is None
+
+
+def _with_auto_settings(in_filename, silence_threshold, silence_duration, compute, use_cache = True):
+    """Fill in the threshold and/or duration from auto_settings if not
+    given.  If compute is False, or the settings can't be computed,
+    uses the cached settings, or the defaults if there aren't any
+    yet."""
+    if silence_threshold is not None and silence_duration is not None:
+        return (silence_threshold, silence_duration)
+    settings = auto_settings(in_filename, compute = compute, use_cache = use_cache)
+    if settings is None:
+        settings = (DEFAULT_THRESHOLD, DEFAULT_DURATION)
+    auto_threshold, auto_duration = settings
+    if silence_threshold is None:
+        silence_threshold = auto_threshold
+    if silence_duration is None:
+        silence_duration = auto_duration
+    return (silence_threshold, silence_duration)
+
+
+def find_chunks(
+        in_filename,
+        silence_threshold,
+        silence_duration,
+        start_ms = None,
+        end_ms = None,
+        onChunkStartFound = lambda ms: None,
+        use_cache = True,
+        engine = 'ffmpeg'):
+    """Raw chunks using the given engine, cached or not."""
+    if use_cache:
+        return cached_raw_chunks(
+            in_filename,
+            silence_threshold,
+            silence_duration,
+            start_ms = start_ms,
+            end_ms = end_ms,
+            onChunkStartFound = onChunkStartFound,
+            engine = engine)
+    return ENGINES[engine](
         in_filename,
         silence_threshold,
         silence_duration,
         start_ms = start_ms,
         end_ms = end_ms,
         onChunkStartFound = onChunkStartFound)
+
+
+def segment_start_times(
+        in_filename,
+        start_ms = None,
+        end_ms = None,
+        silence_threshold = None,
+        silence_duration = None,
+        min_duration_ms = 5000.0,
+        shift_ms = 200,
+        onChunkStartFound = lambda ms: None,
+        use_cache = True,
+        engine = 'ffmpeg'):
+    """Sensible clip start times for the range.  If the silence
+    threshold and duration aren't given, they're picked using
+    auto_settings.  auto_settings decodes the whole track, so for a
+    range only cached settings are used, or the defaults."""
+    silence_threshold, silence_duration = _with_auto_settings(
+        in_filename,
+        silence_threshold,
+        silence_duration,
+        compute = _is_full_track(start_ms, end_ms),
+        use_cache = use_cache)
+    cs = find_chunks(
+        in_filename,
+        silence_threshold,
+        silence_duration,
+        start_ms = start_ms,
+        end_ms = end_ms,
+        onChunkStartFound = onChunkStartFound,
+        use_cache = use_cache,
+        engine = engine)
     chunk_starts = [c[0] for c in cs]
-    return correct_raw(chunk_starts, min_duration_ms, shift_ms)
+    return correct_raw_np(chunk_starts, min_duration_ms, shift_ms).tolist()
 
 
 if __name__ == '__main__':
     # Sample calls:
     # python -m pact.split samples/input.mp3 --endms 1000 -v --raw
     # python -m pact.split samples/input.mp3 --endms 1000 -v
+    # python -m pact.split samples/input.mp3 --engine numpy --no-cache
+    # python -m pact.split samples/input.mp3 --first 10
+    # python -m pact.split samples/input.mp3 --sweep --thresholds=-10,-20 --durations=0.3,0.5
 
     parser = argparse.ArgumentParser(description='Get start times for clips')
     parser.add_argument('in_filename', help='Input filename')
-    parser.add_argument('--silence-threshold', default=DEFAULT_THRESHOLD, type=int, help='Silence threshold (in dB)')
-    parser.add_argument('--silence-duration', default=DEFAULT_DURATION, type=float, help='Silence duration')
+    parser.add_argument('--silence-threshold', type=float, help='Silence threshold (in dB), default is auto')
+    parser.add_argument('--silence-duration', type=float, help='Silence duration, default is auto')
+    parser.add_argument('--target-phrase-ms', type=float, default=DEFAULT_TARGET_PHRASE_MS, help='Phrase length for auto threshold/duration')
     parser.add_argument('--startms', default=0, type=int, help='Start ms')
     parser.add_argument('--endms', type=int, help='End ms')
     parser.add_argument('-v', dest='verbose', action='store_true', help='Verbose mode')
     parser.add_argument('--raw', dest='raw', action='store_true', help='Raw chunks only')
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false', help='Ignore cached scans')
+    parser.add_argument('--engine', default='ffmpeg', choices=ENGINES.keys(), help='Silence detection engine')
+    parser.add_argument('--first', type=int, help='Stream the first N start times only, then stop')
+    parser.add_argument('--sweep', dest='sweep', action='store_true', help='Stats for each of --thresholds and --durations')
+    parser.add_argument('--thresholds', default='-10,-15,-20,-25,-30', help='Sweep thresholds (dB), comma-separated')
+    parser.add_argument('--durations', default='0.2,0.3,0.5,0.8', help='Sweep durations, comma-separated')
 
     args = parser.parse_args()
     if args.verbose:
@@ -237,15 +1058,57 @@ if __name__ == '__main__':
             print(pact.utils.TimeUtils.time_string(ms))
             ref_start = ms
 
+    starttime = time.perf_counter()
+    def print_elapsed():
+        elapsed = time.perf_counter() - starttime
+        print(f'{args.engine} engine: {elapsed:.3f} seconds (including auto settings)')
+
+    if not args.sweep and (args.silence_threshold is None or args.silence_duration is None):
+        # Streaming the first few starts shouldn't wait for a full
+        # track decode.
+        compute = _is_full_track(args.startms, args.endms) and args.first is None
+        settings = auto_settings(
+            args.in_filename, args.target_phrase_ms, compute = compute, use_cache = args.use_cache)
+        t, d = settings or (DEFAULT_THRESHOLD, DEFAULT_DURATION)
+        if args.silence_threshold is None:
+            args.silence_threshold = t
+        if args.silence_duration is None:
+            args.silence_duration = d
+        kind = 'auto' if settings is not None else 'default (no cached auto settings)'
+        print(f'{kind} settings: threshold {args.silence_threshold} dB, duration {args.silence_duration}')
+
+    if args.sweep:
+        results = sweep(
+            in_filename = args.in_filename,
+            thresholds = [ float(t) for t in args.thresholds.split(',') ],
+            durations = [ float(d) for d in args.durations.split(',') ],
+            start_ms = args.startms,
+            end_ms = args.endms
+        )
+        print(f'decoded in {results[0]["decode_seconds"]:.3f} seconds')
+        print('threshold  duration  chunks  min_chunk  median_chunk  min_silence  median_silence  ms')
+        for r in results:
+            vals = [
+                r['threshold'], r['duration'], r['chunks'],
+                r['min_chunk'], r['median_chunk'],
+                r['min_silence'], r['median_silence'],
+                round(r['seconds'] * 1000, 1)
+            ]
+            print('  '.join([ f'{v}' for v in vals ]))
+        sys.exit(0)
+
     if args.raw:
-        rc = raw_chunks(
+        rc = find_chunks(
             in_filename = args.in_filename,
             silence_threshold = args.silence_threshold,
             silence_duration = args.silence_duration,
             start_ms = args.startms,
             end_ms = args.endms,
-            onChunkStartFound = onChunkStartFound
+            onChunkStartFound = onChunkStartFound,
+            use_cache = args.use_cache,
+            engine = args.engine
         )
+        print_elapsed()
 
         print('\n\n')
         print('First, last 5 raw chunks:')
@@ -257,6 +1120,23 @@ if __name__ == '__main__':
         print(f'{len(rc)} chunks')
         sys.exit(0)
 
+    elif args.first is not None:
+        # islice stops before asking for anything if --first is 0, so
+        # nothing is scanned.
+        starts = iter_segment_start_times(
+            in_filename = args.in_filename,
+            silence_threshold = args.silence_threshold,
+            silence_duration = args.silence_duration,
+            min_duration_ms = 5000.0,
+            start_ms = args.startms,
+            end_ms = args.endms,
+            use_cache = args.use_cache,
+            engine = args.engine
+        )
+        for c in itertools.islice(starts, args.first):
+            print(pact.utils.TimeUtils.time_string(c))
+        print_elapsed()
+
     else:
         ct = segment_start_times(
             in_filename = args.in_filename,
@@ -265,8 +1145,11 @@ if __name__ == '__main__':
             min_duration_ms = 5000.0,
             start_ms = args.startms,
             end_ms = args.endms,
-            onChunkStartFound = onChunkStartFound
+            onChunkStartFound = onChunkStartFound,
+            use_cache = args.use_cache,
+            engine = args.engine
         )
+        print_elapsed()
         durations = [
             ct[i + 1] - ct[i]
             for i in range(0, len(ct) - 1)
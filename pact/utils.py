@@ -1,12 +1,17 @@
+from collections import OrderedDict
 from tempfile import NamedTemporaryFile
 import os
 import sys
+import threading
 import ffmpeg
 import json
 import pydub
 from importlib import import_module
 import time
 
+import pact.decoder
+import pact.pcm
+
 
 class Profile(object):
     """Convenience for finding bottlenecks."""
@@ -58,7 +63,18 @@ def lookup(selected_text, lookup_module_name):
 
 
 def audiosegment_from_mp3_time_range(path_to_mp3, starttime_ms, endtime_ms):
-    """Make an audio clip from mp3 _very quickly_ using ffmpeg-python."""
+    """Make an audio clip from mp3 _very quickly_ using ffmpeg-python.
+
+    Decodes just the frames of the clip with the shared decoder
+    service, and cuts at the exact sample.
+    """
+    try:
+        samples, rate, channels = pact.decoder.service.decode(path_to_mp3, starttime_ms, endtime_ms)
+        return pydub.AudioSegment(
+            data = samples.tobytes(), sample_width = 2, frame_rate = rate, channels = channels)
+    except ValueError as e:
+        print(f'can\'t decode {path_to_mp3} with the decoder service: {e}')
+
     # ref https://github.com/jiaaro/pydub/issues/135
 
     duration_ms = endtime_ms - starttime_ms
@@ -83,6 +99,84 @@ def audiosegment_from_mp3_time_range(path_to_mp3, starttime_ms, endtime_ms):
     return seg
 
 
+class ClipCache:
+    """LRU cache of extracted clips, keyed by (file, start, end, rate,
+    channels).
+
+    A clip window extracts the same clip over and over (transcribe,
+    re-transcribe, export), so keep recent clips around, up to
+    max_bytes of audio data.  hits and misses show how much decoding
+    is saved.
+    """
+
+    def __init__(self, max_bytes = 100 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.clips = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, path_to_mp3, starttime_ms, endtime_ms, rate = None, channels = None):
+        """The clip, extracting it if it's not in the cache.  rate and
+        channels default to the file's own."""
+        key = (os.path.abspath(path_to_mp3), starttime_ms, endtime_ms, rate, channels)
+        with self.lock:
+            if key in self.clips:
+                self.hits += 1
+                self.clips.move_to_end(key)
+                return self.clips[key]
+            self.misses += 1
+
+        if rate is None and channels is None:
+            seg = audiosegment_from_mp3_time_range(path_to_mp3, starttime_ms, endtime_ms)
+        else:
+            samples, rate, channels = pact.decoder.service.decode(
+                path_to_mp3, starttime_ms, endtime_ms, rate = rate, channels = channels)
+            seg = pydub.AudioSegment(
+                data = memoryview(samples).cast('B'), sample_width = 2, frame_rate = rate, channels = channels)
+        self.add(key, seg)
+        return seg
+
+    def speech(self, path_to_mp3, starttime_ms, endtime_ms):
+        """The clip for speech recognition, same as
+        pact.pcm.speech_segment."""
+        return self.get(path_to_mp3, starttime_ms, endtime_ms, rate = pact.pcm.ANALYSIS_RATE, channels = 1)
+
+    def add(self, key, seg):
+        nbytes = len(seg.raw_data)
+        if nbytes > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.clips:
+                return
+            self.clips[key] = seg
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, evicted = self.clips.popitem(last = False)
+                self.size -= len(evicted.raw_data)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.clips = OrderedDict()
+            self.size = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'clips': len(self.clips),
+            'bytes': self.size
+        }
+
+
+# Shared by all clip windows.
+clip_cache = ClipCache()
+
+
 def play_beep():
     """Make a beep sound."""
     # Note using sys.stdout instead of print
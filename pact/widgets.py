@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class SliderMarkersWidget:
 
     @staticmethod
@@ -49,3 +52,75 @@ class SliderMarkersWidget:
         for p in self.polygons:
             self.canvas.delete(p)
         self.polygons = []
+
+
+class WaveformWidget:
+    """Waveform sparkline drawn on a Tk Canvas.
+
+    The min/max envelope is a single polyline, and the candidate breaks
+    are vertical lines.  The clip bounds are a shaded rectangle behind
+    the waveform, which is just moved when the bounds change, so
+    nothing else is redrawn.
+    """
+
+    @staticmethod
+    def x_for_value(val, minval, maxval, width):
+        return width * (val - minval) / (maxval - minval)
+
+    @staticmethod
+    def envelope_coordinates(times, signal, minval, maxval, width, height):
+        """Flattened (x, y) polyline coordinates for the signal.  The
+        signal is scaled so that its loudest point fills the height."""
+        n = min(len(times), len(signal))
+        if n == 0:
+            return ()
+        times = np.asarray(times[0:n], dtype = np.float64)
+        signal = np.asarray(signal[0:n], dtype = np.float64)
+        loudest = max(1.0, np.abs(signal).max())
+        middle = height / 2.0
+        xs = WaveformWidget.x_for_value(times, minval, maxval, width)
+        ys = middle - signal * (middle - 1) / loudest
+        return tuple(np.column_stack((xs, ys)).ravel().tolist())
+
+    def __init__(self, canvas, width, height, minvalue, maxvalue):
+        self.canvas = canvas
+        self.width = width
+        self.height = height
+        self.minvalue = minvalue
+        self.maxvalue = maxvalue
+        self.signal_line = None
+        self.break_lines = []
+        self.clip_rect = None
+
+    def set_signal(self, times, signal, fill = 'steelblue'):
+        if self.signal_line is not None:
+            self.canvas.delete(self.signal_line)
+            self.signal_line = None
+        coords = WaveformWidget.envelope_coordinates(
+            times, signal, self.minvalue, self.maxvalue, self.width, self.height)
+        if len(coords) >= 4:
+            self.signal_line = self.canvas.create_line(coords, fill = fill)
+
+    def set_breaks(self, break_times, fill = 'red'):
+        for b in self.break_lines:
+            self.canvas.delete(b)
+        self.break_lines = []
+        for t in break_times:
+            x = WaveformWidget.x_for_value(t, self.minvalue, self.maxvalue, self.width)
+            self.break_lines.append(self.canvas.create_line(x, 0, x, self.height, fill = fill))
+
+    def set_clip_bounds(self, start, end, fill = '#FFFDD0'):
+        """Shade the clip, or remove the shading if start >= end."""
+        if start >= end:
+            if self.clip_rect is not None:
+                self.canvas.delete(self.clip_rect)
+                self.clip_rect = None
+            return
+        x0 = WaveformWidget.x_for_value(start, self.minvalue, self.maxvalue, self.width)
+        x1 = WaveformWidget.x_for_value(end, self.minvalue, self.maxvalue, self.width)
+        if self.clip_rect is None:
+            self.clip_rect = self.canvas.create_rectangle(
+                x0, 0, x1, self.height, fill = fill, outline = '')
+            self.canvas.tag_lower(self.clip_rect)
+        else:
+            self.canvas.coords(self.clip_rect, x0, 0, x1, self.height)
@@ -0,0 +1,94 @@
+"""Words of a whole track with their times.
+
+The track is transcribed once in the background, and any clip's
+transcription is then just the words between its bounds, found by
+bisect.
+
+The timeline is saved next to the .pact file (foo.pact ->
+foo.words.json), with the fingerprint of the mp3 and the model it
+came from, so a stale one is ignored.  Each word is a compact
+[ start_ms, end_ms, word, confidence ] list.  done_ms is how far the
+transcription has got, so it can pick up where it left off.
+"""
+
+import bisect
+import os
+import threading
+
+import pact.cache
+
+
+class WordTimeline:
+
+    VERSION = 1
+
+    def __init__(self, path, music_file, model_id):
+        self.path = path
+        self.fingerprint = pact.cache.fingerprint(music_file)
+        self.model_id = model_id
+        self.starts = []
+        self.words = []
+        self.done_ms = 0
+        self.complete = False
+        self.lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def path_for(session_file):
+        return os.path.splitext(session_file)[0] + '.words.json'
+
+    def _load(self):
+        data = pact.cache.load(self.path)
+        if data is None:
+            return
+        same = (
+            data.get('version') == WordTimeline.VERSION and
+            data.get('fingerprint') == self.fingerprint and
+            data.get('model') == self.model_id
+        )
+        if not same:
+            print(f'ignoring word timeline {self.path}, it\'s for a different mp3 or model')
+            return
+        self.words = [ tuple(w) for w in data['words'] ]
+        self.starts = [ w[0] for w in self.words ]
+        self.done_ms = data['done_ms']
+        self.complete = data['complete']
+
+    def save(self):
+        with self.lock:
+            data = {
+                'version': WordTimeline.VERSION,
+                'fingerprint': self.fingerprint,
+                'model': self.model_id,
+                'done_ms': self.done_ms,
+                'complete': self.complete,
+                'words': [ list(w) for w in self.words ]
+            }
+        pact.cache.save(self.path, data)
+
+    def add_words(self, words, done_ms):
+        """Add (start_ms, end_ms, word, confidence) for words after the
+        existing ones, and mark the track as transcribed to done_ms."""
+        with self.lock:
+            for s, e, w, c in words:
+                self.words.append((int(round(s)), int(round(e)), w, round(c, 2)))
+                self.starts.append(int(round(s)))
+            self.done_ms = max(self.done_ms, done_ms)
+
+    def finish(self):
+        with self.lock:
+            self.complete = True
+
+    def covers(self, start_ms, end_ms):
+        """True if the track has been transcribed past the range."""
+        return self.complete or end_ms <= self.done_ms
+
+    def words_between(self, start_ms, end_ms):
+        """The words starting in the range."""
+        with self.lock:
+            i = bisect.bisect_left(self.starts, start_ms)
+            j = bisect.bisect_left(self.starts, end_ms)
+            return self.words[i:j]
+
+    def text(self, start_ms, end_ms):
+        return ' '.join([ w[2] for w in self.words_between(start_ms, end_ms) ])
@@ -0,0 +1,73 @@
+"""Things shared by the tests.
+
+Tests that write cache files point pact.cache at a test dir:
+
+    def setUp(self):
+        self.addCleanup(helpers.use_test_cache_dir())
+"""
+
+import json
+import os
+import shutil
+import time
+
+import pact.cache
+
+
+TEST_CACHE_DIR = 'test/generated-ignored/cache'
+
+
+def use_test_cache_dir(clear = True):
+    """Point pact.cache at TEST_CACHE_DIR (emptied first, if clear).
+    Returns a function that points it back."""
+    orig = pact.cache.cache_dir
+    pact.cache.cache_dir = TEST_CACHE_DIR
+    if clear and os.path.exists(TEST_CACHE_DIR):
+        shutil.rmtree(TEST_CACHE_DIR)
+    def restore():
+        pact.cache.cache_dir = orig
+    return restore
+
+
+class FakeModel:
+    """Records the dirs it's loaded from.  Takes load_seconds to load,
+    and fails for dirs with 'bad' in the name."""
+
+    loads = []
+    load_seconds = 0
+
+    def __init__(self, model_dir):
+        if FakeModel.load_seconds:
+            time.sleep(FakeModel.load_seconds)
+        if 'bad' in model_dir:
+            raise Exception('Failed to create a model')
+        FakeModel.loads.append(model_dir)
+
+
+class FakeRecognizer:
+    """"Transcribes" the audio as its length in ms, at 16 kHz.  If
+    gate is set, waits for it before each chunk, releasing the at_gate
+    semaphore (if set) first."""
+
+    gate = None
+    at_gate = None
+
+    def __init__(self, model, rate):
+        self.nbytes = 0
+
+    def SetWords(self, b):
+        pass
+
+    def AcceptWaveform(self, data):
+        if FakeRecognizer.gate is not None:
+            if FakeRecognizer.at_gate is not None:
+                FakeRecognizer.at_gate.release()
+            FakeRecognizer.gate.wait()
+        self.nbytes += len(data)
+        return False
+
+    def PartialResult(self):
+        return json.dumps({ 'partial': '' })
+
+    def FinalResult(self):
+        return json.dumps({ 'text': str(self.nbytes // 32) })
@@ -6,10 +6,23 @@ import os
 import sys
 import shutil
 from tkinter import Tk
+
+sys.path.append(os.path.abspath(sys.path[0]) + '/../')
+import helpers
 import pact.app
 import time
 
 
+def setUpModule():
+    # Loading an mp3 starts background scans and builds that write
+    # cache files; keep them out of the real cache dir.
+    global restore_cache_dir
+    restore_cache_dir = helpers.use_test_cache_dir(clear = False)
+
+
+def tearDownModule():
+    restore_cache_dir()
+
 
 class TKinterTestCase(unittest.TestCase):
 
@@ -303,7 +316,7 @@ class TestApp_transcription(TKinterTestCase):
         self.pump_events()
 
         class FakeTranscriptionStrategy:
-            def start(self, audiosegment, on_update_transcription, on_update_progress, on_finished):
+            def start(self, audiosegment, on_update_transcription, on_update_progress, on_finished, clip = None):
                 on_update_progress(42)
                 on_finished('un perro')
             def stop(self):
@@ -0,0 +1,33 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.abspath(sys.path[0]) + '/../')
+import pact.split
+from benchmark import fixtures
+
+
+class TestBenchmarkFixtures(unittest.TestCase):
+
+    def setUp(self):
+        self.orig_fixture_dir = fixtures.fixture_dir
+        fixtures.fixture_dir = 'test/generated-ignored/fixtures'
+
+    def tearDown(self):
+        fixtures.fixture_dir = self.orig_fixture_dir
+
+    def test_known_gaps_are_found(self):
+        mp3 = fixtures.fixture(20)
+        gaps = fixtures.known_gaps(mp3)
+        self.assertTrue(len(gaps) > 0, 'sanity check')
+        chunks = pact.split.raw_chunks(mp3, -30, 0.3)
+        a = fixtures.accuracy(gaps, chunks)
+        self.assertTrue(a['ok'], a)
+
+    def test_accuracy_counts_missed_and_spurious(self):
+        gaps = [ (1000, 1500), (3000, 3600) ]
+        chunks = [ (0, 1010), (1490, 2000), (2500, 5000) ]
+        a = fixtures.accuracy(gaps, chunks)
+        self.assertEqual((a['matched'], a['missed'], a['spurious']), (1, 1, 1))
+        self.assertEqual(a['max_error_ms'], 10)
+        self.assertFalse(a['ok'])
@@ -1,9 +1,14 @@
 import unittest
 import sys
 import os
+import multiprocessing
+from unittest.mock import patch
 
 sys.path.append(os.path.abspath(sys.path[0]) + '/../')
+import helpers
+import pact.bulktranscription
 from pact.bulktranscription import make_bounds
+from pact.plugins.transcription import vosktranscription
 
 class TestBulkTranscription_make_bounds(unittest.TestCase):
 
@@ -18,3 +23,50 @@ class TestBulkTranscription_make_bounds(unittest.TestCase):
             actual = make_bounds(c[0], endtime)
             self.assertEqual(actual, c[1])
 
+
+@unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), 'workers need fork to get the fakes')
+class TestBulkTranscription_parallel(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(helpers.use_test_cache_dir())
+        vosktranscription._caches.clear()
+        self.orig_models = vosktranscription.models
+        vosktranscription.models = vosktranscription.ModelRegistry(helpers.FakeModel)
+        self.model_dir = 'test/generated-ignored/model'
+        os.makedirs(self.model_dir, exist_ok = True)
+        self.mp3 = 'test/assets/testing.mp3'
+
+    def tearDown(self):
+        vosktranscription.models = self.orig_models
+
+    def parallel(self, starts, end_time, bookmark_done_callback = None):
+        return pact.bulktranscription.get_transcribed_bookmarks_parallel(
+            self.mp3, starts, end_time, self.model_dir, workers = 3,
+            bookmark_done_callback = bookmark_done_callback,
+            transcription_file = None)
+
+    def test_results_in_order(self):
+        starts = [ 0, 1000, 3000, 3500, 7000, 9000, 12000 ]
+        done = []
+        with patch.object(vosktranscription, 'KaldiRecognizer', helpers.FakeRecognizer):
+            bookmarks = self.parallel(starts, 14000, lambda b: done.append(b.position_ms))
+
+        self.assertEqual(done, starts)
+        self.assertEqual([ b.clip_bounds_ms for b in bookmarks ], make_bounds(starts, 14000))
+        self.assertEqual(
+            [ b.transcription for b in bookmarks ],
+            [ '1000', '2000', '500', '3500', '2000', '3000', '2000' ])
+
+    def test_cache_shared_with_serial(self):
+        starts = [ 0, 1000, 3000 ]
+        with patch.object(vosktranscription, 'KaldiRecognizer', helpers.FakeRecognizer):
+            expected = [ b.transcription for b in self.parallel(starts, 4000) ]
+
+        # Everything's cached now, so nothing reaches the recognizer.
+        with patch.object(vosktranscription, 'KaldiRecognizer', side_effect = AssertionError('not cached')):
+            again = self.parallel(starts, 4000)
+            strategy = vosktranscription.VoskTranscriptionStrategy(self.model_dir)
+            serial = pact.bulktranscription.get_transcribed_bookmarks(
+                self.mp3, starts, 4000, strategy, transcription_file = None)
+        self.assertEqual([ b.transcription for b in again ], expected)
+        self.assertEqual([ b.transcription for b in serial ], expected)
@@ -0,0 +1,86 @@
+import unittest
+import sys
+import os
+from concurrent.futures import wait
+import numpy as np
+
+sys.path.append(os.path.abspath(sys.path[0]) + '/../')
+import helpers
+import pact.decoder
+import pact.mp3index
+
+
+class TestDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(helpers.use_test_cache_dir())
+        pact.mp3index._loaded = {}
+        self.mp3 = 'test/assets/testing.mp3'
+        self.decoder = pact.decoder.Decoder(workers = 2)
+
+    def tearDown(self):
+        self.decoder.shutdown()
+
+    def test_decode_range_is_exact(self):
+        samples, rate, channels = self.decoder.decode(self.mp3, 7320, 10400)
+        expected, erate, echannels = pact.mp3index.decode_range(self.mp3, 7320, 10400)
+        self.assertEqual((rate, channels), (erate, echannels))
+        self.assertEqual(len(samples), len(expected))
+        if self.decoder.backend == 'ffmpeg':
+            self.assertEqual(samples.tobytes(), expected.tobytes())
+
+    def test_rate_and_channels(self):
+        samples, rate, channels = self.decoder.decode(self.mp3, 1000, 3000, rate = 16000, channels = 1)
+        self.assertEqual((rate, channels), (16000, 1))
+        self.assertEqual(len(samples), 32000)
+
+    def test_concurrent_requests_in_order(self):
+        ranges = [ (i * 1000, i * 1000 + 500) for i in range(0, 8) ]
+        futures = [ self.decoder.submit(self.mp3, s, e, 16000, 1) for s, e in ranges ]
+        wait(futures)
+        for f in futures:
+            self.assertEqual(len(f.result()[0]), 8000)
+
+    def test_stats(self):
+        self.assertEqual(self.decoder.stats()['requests'], 0)
+        self.decoder.decode(self.mp3, 0, 500)
+        self.decoder.decode(self.mp3, 500, 1000)
+        with self.assertRaises(Exception):
+            self.decoder.decode('test/assets/missing.mp3', 0, 500)
+        stats = self.decoder.stats()
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['errors'], 1)
+        self.assertGreater(stats['max_ms'], 0)
+        self.assertLessEqual(stats['p50_ms'], stats['max_ms'])
+
+    @unittest.skipUnless(pact.decoder.av, 'PyAV not installed')
+    def test_pyav_matches_ffmpeg(self):
+        ffmpeg = pact.decoder.Decoder(workers = 1, backend = 'ffmpeg')
+        pyav = pact.decoder.Decoder(workers = 1, backend = 'pyav')
+        try:
+            for s, e, rate, channels in [
+                    (7320, 10400, None, None),
+                    (7320, 10400, 16000, 1),
+                    (0, 3000, 16000, 1),
+                    (12345, 14000, 8000, 1),
+                    (20000, 21000, 16000, 1)
+            ]:
+                a, _, _ = ffmpeg.decode(self.mp3, s, e, rate, channels)
+                b, _, _ = pyav.decode(self.mp3, s, e, rate, channels)
+                self.assertEqual(len(a), len(b), (s, e, rate))
+                if len(a) > 0:
+                    diff = np.abs(a.astype(np.int32) - b.astype(np.int32)).max()
+                    self.assertLessEqual(diff, 1, (s, e, rate))
+        finally:
+            ffmpeg.shutdown()
+            pyav.shutdown()
+
+    def test_pyav_needs_pyav(self):
+        if pact.decoder.av is not None:
+            return
+        with self.assertRaises(ValueError):
+            pact.decoder.Decoder(backend = 'pyav')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import sys
+import os
+import threading
+from unittest.mock import patch
+import ffmpeg
+
+sys.path.append(os.path.abspath(sys.path[0]) + '/../')
+import helpers
+import pact.cache
+import pact.mp3index
+import pact.pcm
+import pact.split
+import pact.utils
+
+
+class TestMp3Index(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(helpers.use_test_cache_dir())
+        pact.mp3index._loaded = {}
+
+
+    def lame_tagged_mp3(self):
+        """testing.mp3 has no LAME tag, ffmpeg-encoded files do."""
+        f = 'test/generated-ignored/tagged.mp3'
+        (
+            ffmpeg
+            .input('test/assets/testing.mp3')
+            .output(f, audio_bitrate='64k', loglevel='error')
+            .overwrite_output()
+            .run()
+        )
+        return f
+
+    def assert_exact_clips(self, f):
+        index = pact.mp3index.frame_index(f)
+        full = pact.pcm.decode(f, rate = index.sample_rate, channels = index.channels)
+        self.assertAlmostEqual(index.duration_ms(), len(full) * 1000.0 / index.sample_rate, places = 3)
+        for s, e in [ (0, 1000), (7320, 10400), (12345, 14000) ]:
+            samples, rate, channels = pact.mp3index.decode_range(f, s, e)
+            first = int(round(s * rate / 1000.0))
+            self.assertEqual(len(samples), int(round((e - s) * rate / 1000.0)))
+            self.assertEqual(samples.tobytes(), full[first:first + len(samples)].tobytes(), (s, e))
+
+    def test_clips_match_full_decode(self):
+        self.assert_exact_clips('test/assets/testing.mp3')
+
+    def test_clips_match_full_decode_with_lame_tag(self):
+        f = self.lame_tagged_mp3()
+        index = pact.mp3index.scan(f)
+        self.assertGreater(index.skip_samples, pact.mp3index.DECODER_DELAY, 'sanity check')
+        self.assert_exact_clips(f)
+
+    def test_index_is_cached(self):
+        index = pact.mp3index.frame_index('test/assets/testing.mp3')
+        self.assertEqual(index.frame_count(), 589)
+        pact.mp3index._loaded = {}
+        cached = pact.mp3index.frame_index('test/assets/testing.mp3')
+        self.assertEqual(cached.offsets.tolist(), index.offsets.tolist())
+        self.assertEqual(cached.sample_rate, 22050)
+
+    def test_concurrent_first_use(self):
+        f = self.lame_tagged_mp3()
+        real_scan = pact.mp3index.scan
+        scans = []
+        def scan(in_filename):
+            scans.append(in_filename)
+            return real_scan(in_filename)
+
+        results = []
+        errors = []
+        def get():
+            try:
+                results.append(pact.mp3index.frame_index(f))
+            except Exception as e:
+                errors.append(e)
+
+        with patch('pact.mp3index.scan', side_effect = scan):
+            threads = [ threading.Thread(target = get) for i in range(0, 8) ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(scans), 1, 'built once')
+        self.assertEqual(len(set([ id(r) for r in results ])), 1)
+        leftovers = [ p for p in os.listdir(pact.cache.cache_dir) if p.endswith('.tmp') ]
+        self.assertEqual(leftovers, [])
+
+    def test_range_past_end_of_file(self):
+        index = pact.mp3index.frame_index('test/assets/testing.mp3')
+        with self.assertRaises(ValueError):
+            index.byte_range(20000, 21000)
+        samples = pact.pcm.decode('test/assets/testing.mp3', 20000, 21000)
+        self.assertEqual(len(samples), 0)
+        chunks = pact.split.raw_chunks('test/assets/testing.mp3', -30, 0.3, start_ms = 20000, end_ms = 21000)
+        self.assertEqual(chunks, [ (20000, 21000) ], 'same as before the frame index')
+        seg = pact.utils.audiosegment_from_mp3_time_range('test/assets/testing.mp3', 20000, 21000)
+        self.assertEqual(len(seg), 0)
+
+    def test_frame_at(self):
+        index = pact.mp3index.frame_index('test/assets/testing.mp3')
+        self.assertEqual(index.frame_at(0), 0)
+        self.assertEqual(index.frame_at(index.time_ms(100) + 1), 100)
+        self.assertEqual(index.frame_at(10 ** 9), index.frame_count() - 1)
+
+    def test_not_an_mp3(self):
+        with self.assertRaises(ValueError):
+            pact.mp3index.scan('test/assets/test-config.ini')
@@ -0,0 +1,182 @@
+import unittest
+import sys
+import os
+import threading
+from unittest.mock import patch
+import numpy as np
+
+sys.path.append(os.path.abspath(sys.path[0]) + '/../')
+import helpers
+import pact.mp3index
+import pact.pcm
+
+
+def setUpModule():
+    # Don't write frame indexes to the real cache dir.
+    global restore_cache_dir
+    restore_cache_dir = helpers.use_test_cache_dir(clear = False)
+
+
+def tearDownModule():
+    restore_cache_dir()
+
+
+class TestPcm_silent_runs(unittest.TestCase):
+
+    def test_runs(self):
+        silent = np.array([ True, True, False, True, True, True, False, True ])
+        self.assertEqual(pact.pcm.silent_runs(silent, 1), [ (0, 2), (3, 6), (7, 8) ])
+        self.assertEqual(pact.pcm.silent_runs(silent, 2), [ (0, 2), (3, 6) ])
+        self.assertEqual(pact.pcm.silent_runs(silent, 3), [ (3, 6) ])
+
+    def test_no_runs(self):
+        self.assertEqual(pact.pcm.silent_runs(np.array([ False, False ]), 1), [])
+        self.assertEqual(pact.pcm.silent_runs(np.array([], dtype=bool), 1), [])
+
+
+class TestPcm_window_db(unittest.TestCase):
+
+    def test_peak_and_rms(self):
+        full = 32767
+        samples = np.array([ 0, full, -full, 0, 0, 0, 0 ], dtype=np.int16)
+        peak = pact.pcm.window_db(samples, 2, 'peak')
+        self.assertEqual(len(peak), 4, 'partial last window included')
+        self.assertAlmostEqual(peak[0], 0, places=2)
+        self.assertAlmostEqual(peak[1], 0, places=2)
+        self.assertLess(peak[2], -100)
+
+        rms = pact.pcm.window_db(samples, 2, 'rms')
+        self.assertAlmostEqual(rms[0], -3.01, places=1)
+
+    def test_decode(self):
+        samples = pact.pcm.decode('test/assets/testing.mp3', 1000, 2000, rate = 16000)
+        self.assertEqual(samples.dtype, np.int16)
+        self.assertAlmostEqual(len(samples), 16000, delta = 200)
+
+
+class TestPcm_PcmStore(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(helpers.use_test_cache_dir())
+
+    def test_segment_matches_decode(self):
+        store = pact.pcm.PcmStore('test/assets/testing.mp3')
+        self.assertFalse(store.ready())
+        store.build()
+        self.assertTrue(store.ready())
+
+        seg = store.segment(7320, 10400)
+        self.assertEqual(len(seg), 3080)
+        self.assertEqual(seg.frame_rate, store.rate)
+        expected = pact.pcm.decode('test/assets/testing.mp3', rate = store.rate)
+        s = int(round(7320 * store.rate / 1000.0))
+        self.assertEqual(seg.raw_data.tobytes(), expected[s:s + len(seg.raw_data) // 2].tobytes())
+
+    def test_existing_store_is_reused(self):
+        pact.pcm.PcmStore('test/assets/testing.mp3').build()
+        store = pact.pcm.PcmStore('test/assets/testing.mp3')
+        self.assertTrue(store.ready())
+
+    def test_concurrent_builds(self):
+        stores = [ pact.pcm.PcmStore('test/assets/testing.mp3') for i in range(0, 4) ]
+        real_decode = pact.pcm.PcmStore._decode_to_file
+        calls = []
+        def decode(store, should_stop):
+            calls.append(store)
+            real_decode(store, should_stop)
+        with patch.object(pact.pcm.PcmStore, '_decode_to_file', autospec = True, side_effect = decode):
+            threads = [ threading.Thread(target = s.build) for s in stores ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all([ s.ready() for s in stores ]))
+        self.assertEqual(len(set([ len(s.samples) for s in stores ])), 1)
+        leftovers = [ p for p in os.listdir(helpers.TEST_CACHE_DIR) if p.endswith('.tmp') ]
+        self.assertEqual(leftovers, [])
+
+    def test_stopped_build(self):
+        store = pact.pcm.PcmStore('test/assets/testing.mp3')
+        store.build(should_stop = lambda: True)
+        self.assertFalse(store.ready())
+        self.assertFalse(os.path.exists(store.path))
+        self.assertEqual(os.listdir(helpers.TEST_CACHE_DIR), [])
+
+        store.build()
+        self.assertTrue(store.ready())
+
+    def test_range_past_end(self):
+        store = pact.pcm.PcmStore('test/assets/testing.mp3')
+        store.build()
+        self.assertEqual(len(store.segment(10 ** 9, 2 * 10 ** 9)), 0)
+
+
+class TestPcm_iter_segments(unittest.TestCase):
+
+    def setUp(self):
+        self.orig_max_gap = pact.pcm.BATCH_MAX_GAP_MS
+
+    def tearDown(self):
+        pact.pcm.BATCH_MAX_GAP_MS = self.orig_max_gap
+
+    def segments(self, ranges):
+        """Segments, and the number of times ffmpeg was run."""
+        real_decode_blocks = pact.pcm.decode_blocks
+        calls = []
+        def decode_blocks(*args, **kwargs):
+            calls.append(args)
+            return real_decode_blocks(*args, **kwargs)
+        with patch('pact.pcm.decode_blocks', side_effect = decode_blocks):
+            segs = pact.pcm.segments('test/assets/testing.mp3', ranges)
+        return (segs, len(calls))
+
+    def assert_same_as_single_clips(self, ranges, segs):
+        self.assertEqual(len(segs), len(ranges))
+        for r, seg in zip(ranges, segs):
+            expected, _, _ = pact.mp3index.decode_range('test/assets/testing.mp3', r[0], r[1])
+            self.assertEqual(seg.raw_data, expected.tobytes(), r)
+
+    def test_one_decode_for_all_ranges(self):
+        ranges = [ (0, 1000), (1000, 2500), (2500, 7320), (7320, 10400) ]
+        segs, decodes = self.segments(ranges)
+        self.assertEqual(decodes, 1)
+        self.assert_same_as_single_clips(ranges, segs)
+
+    def test_overlapping_and_unsorted_ranges(self):
+        ranges = [ (7320, 10400), (500, 3000), (0, 1000), (2000, 2500), (3000, 3000) ]
+        segs, decodes = self.segments(ranges)
+        self.assertEqual(decodes, 1)
+        self.assert_same_as_single_clips(ranges, segs)
+
+    def test_gap_longer_than_a_block(self):
+        ranges = [ (0, 1000), (12000, 13000) ]
+        segs, decodes = self.segments(ranges)
+        self.assertEqual(decodes, 1)
+        self.assert_same_as_single_clips(ranges, segs)
+
+    def test_far_apart_ranges_decoded_separately(self):
+        pact.pcm.BATCH_MAX_GAP_MS = 1000
+        ranges = [ (0, 1000), (1500, 2000), (10000, 11000) ]
+        segs, decodes = self.segments(ranges)
+        self.assertEqual(decodes, 2)
+        self.assert_same_as_single_clips(ranges, segs)
+
+    def test_range_past_end_of_file(self):
+        segs, _ = self.segments([ (14000, 20000) ])
+        self.assertAlmostEqual(len(segs[0]), 1386, delta = 1)
+
+    def test_rate_and_channels(self):
+        segs = pact.pcm.segments('test/assets/testing.mp3', [ (1000, 2000) ], rate = 16000, channels = 1)
+        self.assertEqual((segs[0].frame_rate, segs[0].channels), (16000, 1))
+        self.assertEqual(len(segs[0].raw_data), 32000)
+
+
+class TestPcm_speech_segment(unittest.TestCase):
+
+    def test_mono_16k_in_memory(self):
+        seg = pact.pcm.speech_segment('test/assets/testing.mp3', 7320, 10400)
+        self.assertEqual((seg.frame_rate, seg.channels, seg.sample_width), (16000, 1, 2))
+        self.assertEqual(len(seg.raw_data), int(round(3.08 * 16000)) * 2)
+        expected = pact.pcm.decode('test/assets/testing.mp3', 7320, 10400)
+        self.assertEqual(seg.raw_data, expected.tobytes())
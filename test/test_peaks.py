@@ -0,0 +1,108 @@
+import unittest
+import sys
+import os
+import threading
+from unittest.mock import patch
+import numpy as np
+
+sys.path.append(os.path.abspath(sys.path[0]) + '/../')
+import helpers
+import pact.peaks
+import pact.pcm
+
+
+def python_envelope(samples, window_size):
+    """The envelope calc that get_signal_plot_data used to do."""
+    def chunks(lst, n):
+        for i in range(0, len(lst), n):
+            yield lst[i:i + n]
+    minmax = [ [ min(c), max(c) ] for c in chunks(samples, window_size) ]
+    return [j for sub in minmax for j in sub]
+
+
+class TestPeaks_envelope(unittest.TestCase):
+
+    def flat(self, samples, window_size):
+        mins, maxs = pact.peaks.envelope(samples, window_size)
+        return np.column_stack((mins, maxs)).ravel().tolist()
+
+    def test_same_as_python_version(self):
+        rng = np.random.default_rng(0)
+        for n in [ 0, 5, 100, 1000, 1234 ]:
+            samples = rng.integers(-32768, 32767, n, dtype = np.int16)
+            self.assertEqual(self.flat(samples, 100), python_envelope(samples, 100), n)
+
+    def test_same_as_python_version_for_a_minute(self):
+        # A minute of 44.1kHz stereo, as decoded in
+        # get_signal_plot_data, with a partial window at the end.
+        rng = np.random.default_rng(0)
+        samples = rng.integers(-32768, 32767, 60 * 44100 * 2 + 1234, dtype = np.int16)
+        self.assertEqual(self.flat(samples, 10000), python_envelope(samples, 10000))
+
+
+class TestPeakPyramid(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(helpers.use_test_cache_dir())
+        self.mp3 = 'test/assets/testing.mp3'
+
+
+    def built(self):
+        p = pact.peaks.PeakPyramid(self.mp3)
+        self.assertFalse(p.ready())
+        p.build()
+        return pact.peaks.PeakPyramid(self.mp3)
+
+    def test_levels_match_decoded_samples(self):
+        p = self.built()
+        self.assertTrue(p.ready(), 'reloaded from file')
+        samples = pact.pcm.decode(self.mp3, rate = p.sample_rate)
+        self.assertEqual(len(p.levels), pact.peaks.LEVELS)
+        for block, pairs in p.levels:
+            self.assertEqual(len(pairs), -(-len(samples) // block))
+            for i in sorted(set([ 0, min(5, len(pairs) - 1), len(pairs) - 1 ])):
+                chunk = samples[i * block:(i + 1) * block]
+                self.assertEqual(pairs[i].tolist(), [ chunk.min(), chunk.max() ], (block, i))
+
+    def test_peaks_uses_coarsest_level_with_enough_points(self):
+        p = self.built()
+        times, mins, maxs = p.peaks(0, 10000, points = 100)
+        block = (times[1] - times[0]) * p.sample_rate / 1000.0
+        self.assertEqual(block, 1024, '220500 samples / 1024 = 215 blocks')
+        self.assertTrue(all(mins <= maxs))
+        self.assertEqual(len(times), len(mins))
+
+    def test_concurrent_builds(self):
+        pyramids = [ pact.peaks.PeakPyramid(self.mp3) for i in range(0, 4) ]
+        real_calculate = pact.peaks.PeakPyramid._calculate
+        calls = []
+        def calculate(p, should_stop):
+            calls.append(p)
+            return real_calculate(p, should_stop)
+        with patch.object(pact.peaks.PeakPyramid, '_calculate', autospec = True, side_effect = calculate):
+            threads = [ threading.Thread(target = p.build) for p in pyramids ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all([ p.ready() for p in pyramids ]))
+        leftovers = [ f for f in os.listdir(helpers.TEST_CACHE_DIR) if f.endswith('.tmp') ]
+        self.assertEqual(leftovers, [])
+
+    def test_stopped_build(self):
+        p = pact.peaks.PeakPyramid(self.mp3)
+        p.build(should_stop = lambda: True)
+        self.assertFalse(p.ready())
+        self.assertFalse(os.path.exists(p.path))
+
+        p.build()
+        self.assertTrue(p.ready())
+
+    def test_peaks_for_range(self):
+        p = self.built()
+        times, mins, maxs = p.peaks(7320, 10400, points = 10000)
+        self.assertLessEqual(times[0], 7320)
+        self.assertGreater(times[0], 7320 - 256 * 1000.0 / p.sample_rate)
+        self.assertLess(times[-1], 10400)
+        self.assertEqual(len(p.peaks(10 ** 8, 10 ** 8 + 1000)[0]), 0, 'past end')
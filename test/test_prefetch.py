@@ -0,0 +1,106 @@
+import unittest
+import sys
+import os
+import threading
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(sys.path[0]) + '/../')
+import helpers
+import pact.music
+import pact.prefetch
+import pact.utils
+from pact.plugins.transcription import vosktranscription
+
+
+class TestNeighbourPrefetch(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(helpers.use_test_cache_dir())
+        vosktranscription._caches.clear()
+        self.orig_models = vosktranscription.models
+        vosktranscription.models = vosktranscription.ModelRegistry(helpers.FakeModel)
+        self.orig_delay = pact.prefetch.NeighbourPrefetch.DELAY
+        pact.prefetch.NeighbourPrefetch.DELAY = 0.01
+        pact.utils.clip_cache.clear()
+        helpers.FakeRecognizer.gate = None
+        helpers.FakeRecognizer.at_gate = None
+
+        self.patcher = patch.object(vosktranscription, 'KaldiRecognizer', helpers.FakeRecognizer)
+        self.patcher.start()
+
+        self.mp3 = 'test/assets/testing.mp3'
+        os.makedirs('test/generated-ignored/model', exist_ok = True)
+        strategy = vosktranscription.VoskTranscriptionStrategy('test/generated-ignored/model')
+        self.prefetch = pact.prefetch.NeighbourPrefetch(strategy)
+        self.cache = strategy.transcription_cache(self.mp3)
+
+    def tearDown(self):
+        helpers.FakeRecognizer.gate = None
+        helpers.FakeRecognizer.at_gate = None
+        self.prefetch.stop()
+        self.patcher.stop()
+        vosktranscription.models = self.orig_models
+        pact.prefetch.NeighbourPrefetch.DELAY = self.orig_delay
+
+    def bookmark(self, s, e, transcription = None):
+        b = pact.music.Bookmark(s)
+        b.clip_bounds_ms = [ s, e ]
+        b.transcription = transcription
+        return b
+
+    def test_clips_extracted_and_transcribed(self):
+        bookmarks = [ self.bookmark(1000, 2000), self.bookmark(3000, 4500), self.bookmark(5000, 6000, 'done') ]
+        self.prefetch.start(self.mp3, bookmarks)
+        self.prefetch.thread.join()
+
+        self.assertEqual(self.cache.get(1000, 2000), '1000')
+        self.assertEqual(self.cache.get(3000, 4500), '1500')
+        self.assertIsNone(self.cache.get(5000, 6000), 'already has a transcription')
+        self.assertEqual(pact.utils.clip_cache.stats()['misses'], 4, 'clip and speech clip for each')
+        pact.utils.clip_cache.get(self.mp3, 1000, 2000)
+        pact.utils.clip_cache.speech(self.mp3, 3000, 4500)
+        self.assertEqual(pact.utils.clip_cache.stats()['hits'], 2)
+
+    def test_stop_and_resume(self):
+        helpers.FakeRecognizer.gate = threading.Event()
+        helpers.FakeRecognizer.at_gate = threading.Semaphore(0)
+        self.prefetch.start(self.mp3, [ self.bookmark(1000, 2000), self.bookmark(3000, 4000) ])
+        t = self.prefetch.thread
+        helpers.FakeRecognizer.at_gate.acquire()
+
+        self.prefetch.stop()
+        helpers.FakeRecognizer.gate.set()
+        t.join()
+        self.assertIsNone(self.cache.get(1000, 2000), 'stopped, not cached')
+        self.assertEqual(len(self.prefetch.pending), 2)
+
+        self.prefetch.resume()
+        self.prefetch.thread.join()
+        self.assertEqual(self.cache.get(1000, 2000), '1000')
+        self.assertEqual(self.cache.get(3000, 4000), '1000')
+        self.assertEqual(self.prefetch.pending, [])
+
+    def test_resume_while_stopped_run_is_finishing(self):
+        helpers.FakeRecognizer.gate = threading.Event()
+        helpers.FakeRecognizer.at_gate = threading.Semaphore(0)
+        self.prefetch.start(self.mp3, [ self.bookmark(1000, 2000), self.bookmark(3000, 4000) ])
+        old_thread, old_strategy = self.prefetch.thread, self.prefetch.strategy
+        helpers.FakeRecognizer.at_gate.acquire()
+
+        self.prefetch.stop()
+        self.prefetch.resume()
+        self.assertTrue(old_thread.is_alive(), 'still inside its clip')
+        self.assertIsNot(self.prefetch.strategy, old_strategy)
+        new_thread = self.prefetch.thread
+        helpers.FakeRecognizer.at_gate.acquire()
+
+        helpers.FakeRecognizer.gate.set()
+        old_thread.join()
+        new_thread.join()
+        self.assertEqual(self.cache.get(1000, 2000), '1000')
+        self.assertEqual(self.cache.get(3000, 4000), '1000')
+        self.assertEqual(self.prefetch.pending, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,32 @@
 import unittest
+from unittest.mock import patch
 import sys
 import os
 import logging
+import itertools
+import threading
+import subprocess
+import numpy as np
 
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger(__file__)
 logger.setLevel(logging.INFO)
 
 sys.path.append(os.path.abspath(sys.path[0]) + '/../')
+import helpers
+import pact.pcm
 import pact.split
+from benchmark import fixtures
+
+
+def setUpModule():
+    # Don't write cache files to the real cache dir.
+    global restore_cache_dir
+    restore_cache_dir = helpers.use_test_cache_dir(clear = False)
+
+
+def tearDownModule():
+    restore_cache_dir()
 
 
 class TestSplit_sensible_start_times(unittest.TestCase):
@@ -29,6 +47,31 @@ class TestSplit_sensible_start_times(unittest.TestCase):
             self.assert_compressed(c[0], c[1], c[2])
 
 
+class TestSplit_numpy_start_times(unittest.TestCase):
+    """The numpy versions have to give the same answers as the originals."""
+
+    def test_sensible_start_times_np(self):
+        cases = [
+            [ [*range(0, 12)], 5 ],
+            [ [0, 1, 5, 8, 20], 4 ],
+            [ [0, 4, 10, 20], 5 ],
+            [ [0, 1, 1.1, 1.2, 1.3, 2, 2.1, 2.2 ], 1 ],
+            [ [0, 1.3, 2, 1, 2.1, 1.1, 1.2, 2.2 ], 1 ],
+            [ [0.1, 0.2, 0.30000000000000004, 0.4], 0.1 ]
+        ]
+        for arr, minlen in cases:
+            actual = pact.split.sensible_start_times_np(arr, minlen).tolist()
+            self.assertEqual(actual, pact.split.sensible_start_times(list(arr), minlen), arr)
+
+    def test_correct_raw_np(self):
+        rng = np.random.default_rng(1)
+        cases = [ [], [100], [0, 100, 300, 5000, 5100, 5200, 11000], [500, 600, 5600, 5700] ]
+        cases += [ np.round(np.cumsum(rng.exponential(800, 500))).tolist() for _ in range(5) ]
+        for c in cases:
+            actual = pact.split.correct_raw_np(c, 1000, 200).tolist()
+            self.assertEqual(actual, pact.split.correct_raw(list(c), 1000, 200), c)
+
+
 class TestSplit_raw_chunks_characterization(unittest.TestCase):
 
     def setUp(self):
@@ -98,6 +141,359 @@ class TestSplit_raw_chunks_characterization(unittest.TestCase):
         test_case('no chunks', 10000, 10400, [])
 
 
+class TestSplit_numpy_engine(unittest.TestCase):
+
+    def test_close_to_ffmpeg(self):
+        kwargs = {
+            'in_filename': 'test/assets/testing.mp3',
+            'silence_threshold': -10,
+            'silence_duration': 0.3
+        }
+        expected = pact.split.raw_chunks(**kwargs)
+        actual = pact.split.numpy_raw_chunks(**kwargs)
+        self.assertEqual(len(actual), len(expected))
+        for a, e in zip(actual, expected):
+            self.assertAlmostEqual(a[0], e[0], delta = 15)
+            self.assertAlmostEqual(a[1], e[1], delta = 15)
+
+    def test_range(self):
+        actual = pact.split.numpy_raw_chunks(
+            in_filename = 'test/assets/testing.mp3',
+            silence_threshold = -10,
+            silence_duration = 0.3,
+            start_ms = 7800,
+            end_ms = 8200
+        )
+        self.assertEqual(actual, [(7800, 8200)])
+
+
+class TestSplit_sweep(unittest.TestCase):
+
+    def test_sweep_matches_individual_scans(self):
+        f = 'test/assets/testing.mp3'
+        results = pact.split.sweep(f, [ -10, -20 ], [ 0.3, 0.5 ])
+        self.assertEqual(len(results), 4)
+        for r in results:
+            chunks = pact.split.numpy_raw_chunks(f, r['threshold'], r['duration'])
+            self.assertEqual(r['chunks'], len(chunks), r)
+            silences = pact.split.silences(chunks)
+            if len(silences) > 0:
+                self.assertEqual(r['min_silence'], min(silences))
+
+
+class TestSplit_auto_settings(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(helpers.use_test_cache_dir())
+
+    def test_settings_are_cached(self):
+        f = 'test/assets/testing.mp3'
+        self.assertIsNone(pact.split.auto_settings(f, compute = False), 'not calculated yet')
+        threshold, duration = pact.split.auto_settings(f)
+        self.assertEqual(pact.split.auto_settings(f, compute = False), (threshold, duration))
+
+    def test_shorter_target_gives_more_chunks(self):
+        f = 'test/assets/testing.mp3'
+        def chunk_count(target):
+            # Same windowed levels the sweep measures.
+            threshold, duration = pact.split.auto_settings(f, target)
+            return len(pact.split.numpy_raw_chunks(f, threshold, duration))
+        self.assertGreater(chunk_count(1000), chunk_count(5000))
+
+    def test_progress(self):
+        f = 'test/assets/testing.mp3'
+        progress = []
+        pact.split.auto_settings(f, onProgress = progress.append)
+        self.assertGreater(len(progress), 0)
+        self.assertEqual(progress, sorted(progress))
+        self.assertAlmostEqual(progress[-1], pact.pcm.duration_ms(f), delta = 100)
+
+    def test_finds_the_known_gaps(self):
+        orig_fixture_dir = fixtures.fixture_dir
+        fixtures.fixture_dir = 'test/generated-ignored/fixtures'
+        try:
+            mp3 = fixtures.fixture(60)
+        finally:
+            fixtures.fixture_dir = orig_fixture_dir
+        threshold, duration = pact.split.auto_settings(mp3)
+        a = fixtures.accuracy(fixtures.known_gaps(mp3), pact.split.raw_chunks(mp3, threshold, duration))
+        self.assertTrue(a['ok'], (threshold, duration, a))
+
+    def test_other_targets_reuse_the_sweep(self):
+        f = 'test/assets/testing.mp3'
+        pact.split.auto_settings(f, 1000)
+        with patch.object(pact.split, 'Levels', side_effect = AssertionError('decoded again')):
+            self.assertIsNotNone(pact.split.auto_settings(f, 5000))
+            self.assertIsNotNone(pact.split.auto_settings(f, 2500, compute = False))
+
+    def test_no_cache_does_not_save_settings(self):
+        f = 'test/assets/testing.mp3'
+        pact.split.segment_start_times(f, use_cache = False)
+        self.assertIsNone(pact.split.auto_settings(f, compute = False))
+
+    def test_ranges_do_not_compute_settings(self):
+        f = 'test/assets/testing.mp3'
+        with patch.object(pact.split, 'Levels', side_effect = AssertionError('full track decoded')):
+            pact.split.segment_start_times(f, start_ms = 1000, end_ms = 5000, use_cache = False)
+        self.assertIsNone(pact.split.auto_settings(f, compute = False))
+
+
+class TestSplit_parallel_raw_chunks(unittest.TestCase):
+
+    def assert_matches_single_pass(self, start_ms, end_ms):
+        kwargs = {
+            'in_filename': 'test/assets/testing.mp3',
+            'silence_threshold': -10,
+            'silence_duration': 0.3,
+            'start_ms': start_ms,
+            'end_ms': end_ms
+        }
+        expected = pact.split.raw_chunks(**kwargs)
+        # Small windows so that silences cross window boundaries.
+        actual = pact.split.parallel_raw_chunks(**kwargs, window_ms = 2000, overlap_ms = 500)
+        self.assertEqual(actual, expected)
+
+    def test_full_file(self):
+        self.assert_matches_single_pass(None, None)
+
+    def test_range(self):
+        self.assert_matches_single_pass(1000, 12000)
+
+    def test_window_silences(self):
+        chunks = [ (10, 20), (30, 40) ]
+        self.assertEqual(pact.split.window_silences(chunks, 0, 50), [ (0, 10), (20, 30), (40, 50) ])
+        self.assertEqual(pact.split.window_silences(chunks, 10, 40), [ (20, 30) ])
+        self.assertEqual(pact.split.window_silences([], 10, 40), [ (10, 40) ])
+
+
+class TestSplit_iter_segment_start_times(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(helpers.use_test_cache_dir())
+
+    def test_same_as_segment_start_times(self):
+        cases = [
+            [ None, None, 2000 ],
+            [ None, None, 500 ],
+            [ 1000, 12000, 2000 ],
+            [ 7320, 10400, 500 ],
+            [ 10000, 10400, 500 ]
+        ]
+        for start_ms, end_ms, min_duration_ms in cases:
+            kwargs = {
+                'in_filename': 'test/assets/testing.mp3',
+                'start_ms': start_ms,
+                'end_ms': end_ms,
+                'min_duration_ms': min_duration_ms,
+                # The streaming version doesn't compute auto settings.
+                'silence_threshold': -30,
+                'silence_duration': 0.3,
+                'use_cache': False
+            }
+            expected = pact.split.segment_start_times(**kwargs)
+            actual = list(pact.split.iter_segment_start_times(**kwargs))
+            self.assertEqual(actual, expected, kwargs)
+
+    def test_auto_settings_not_computed(self):
+        f = 'test/assets/testing.mp3'
+        with patch.object(pact.split, 'Levels', side_effect = AssertionError('full track decoded')):
+            starts = pact.split.iter_segment_start_times(f, min_duration_ms = 500)
+            self.assertEqual(len(list(itertools.islice(starts, 2))), 2)
+        self.assertIsNone(pact.split.auto_settings(f, compute = False))
+
+        expected = pact.split.auto_settings(f)
+        with patch.object(pact.split, 'silence_events', wraps = pact.split.silence_events) as events:
+            list(pact.split.iter_segment_start_times(f))
+        self.assertEqual(events.call_args[0][1:3], expected, 'cached settings used')
+
+    def test_other_engines(self):
+        for engine in [ 'numpy', 'parallel' ]:
+            kwargs = {
+                'in_filename': 'test/assets/testing.mp3',
+                'start_ms': 1000,
+                'end_ms': 12000,
+                'min_duration_ms': 500,
+                'use_cache': False,
+                'engine': engine
+            }
+            expected = pact.split.segment_start_times(**kwargs)
+            actual = list(pact.split.iter_segment_start_times(**kwargs))
+            self.assertEqual(actual, expected, engine)
+
+    def test_numpy_engine_does_not_run_ffmpeg_scan(self):
+        with patch.object(pact.split, 'silence_events', side_effect = AssertionError('used ffmpeg')):
+            starts = pact.split.iter_segment_start_times(
+                'test/assets/testing.mp3', min_duration_ms = 500, use_cache = False, engine = 'numpy')
+            self.assertGreater(len(list(starts)), 0)
+
+    def test_corrected_starts_same_as_correct_raw(self):
+        cases = [ [], [100], [0, 100, 300, 5000, 5100, 5200, 11000], [500, 600, 5600, 5700] ]
+        for c in cases:
+            actual = list(pact.split.iter_corrected_starts(c, 1000, 200))
+            self.assertEqual(actual, pact.split.correct_raw(c, 1000, 200), c)
+
+    def test_stopping_early_kills_ffmpeg(self):
+        procs = []
+        real_popen = subprocess.Popen
+        def popen(*args, **kwargs):
+            p = real_popen(*args, **kwargs)
+            procs.append(p)
+            return p
+
+        with patch('subprocess.Popen', side_effect = popen):
+            starts = pact.split.iter_segment_start_times(
+                in_filename = 'test/assets/testing.mp3',
+                min_duration_ms = 500,
+                use_cache = False)
+            self.assertEqual(next(starts), 0.0)
+            starts.close()
+
+        self.assertEqual(len(procs), 1)
+        self.assertIsNotNone(procs[0].poll(), 'process finished')
+
+
+class TestSplit_cached_raw_chunks(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(helpers.use_test_cache_dir())
+
+    def get_chunks(self, start_ms, end_ms):
+        return pact.split.cached_raw_chunks(
+            in_filename = 'test/assets/testing.mp3',
+            silence_threshold = -10,
+            silence_duration = 0.3,
+            start_ms = start_ms,
+            end_ms = end_ms
+        )
+
+    def test_repeat_call_uses_cache(self):
+        expected = self.get_chunks(7320, 10400)
+        self.assertEqual(expected, [ (7645, 8379), (8893, 9998) ], 'sanity check')
+        with patch('pact.split.raw_chunks', side_effect = Exception('ffmpeg called')):
+            self.assertEqual(self.get_chunks(7320, 10400), expected)
+
+    def test_range_inside_scanned_range_uses_cache(self):
+        self.get_chunks(0, 100000)
+        cases = [
+            [ 7320, 10400, [(7645, 8379), (8893, 9998)] ],
+            [ 8000, 8800, [(8000, 8379)] ],
+            [ 7320, 8200, [(7645, 8200)] ],
+            [ 7800, 8200, [(7800, 8200)] ],
+            [ 10000, 10400, [] ]
+        ]
+        with patch('pact.split.raw_chunks', side_effect = Exception('ffmpeg called')):
+            for c in cases:
+                self.assertEqual(self.get_chunks(c[0], c[1]), c[2])
+
+    def test_range_outside_scanned_range_calls_ffmpeg(self):
+        self.get_chunks(7320, 10400)
+        actual = self.get_chunks(7320, 12000)
+        self.assertEqual(actual, [ (7645, 8379), (8893, 9998), (10419, 12000) ])
+
+    def test_different_threshold_not_cached(self):
+        self.get_chunks(7320, 10400)
+        c = pact.split.SilenceCache('test/assets/testing.mp3', -20, 0.3)
+        self.assertIsNone(c.get(7320, 10400))
+
+    def test_adds_from_other_instances_are_kept(self):
+        a = pact.split.SilenceCache('test/assets/testing.mp3', -20, 0.3)
+        b = pact.split.SilenceCache('test/assets/testing.mp3', -20, 0.3)
+        a.add([ (0, 1000) ], 0, 1000)
+        b.add([ (5000, 6000) ], 5000, 6000)
+        c = pact.split.SilenceCache('test/assets/testing.mp3', -20, 0.3)
+        self.assertEqual(c.get(0, 1000), [ (0, 1000) ])
+        self.assertEqual(c.get(5000, 6000), [ (5000, 6000) ])
+
+    def test_concurrent_adds(self):
+        def add(i):
+            c = pact.split.SilenceCache('test/assets/testing.mp3', -20, 0.3)
+            c.add([ (i * 1000, i * 1000 + 500) ], i * 1000, i * 1000 + 500)
+        threads = [ threading.Thread(target = add, args = (i,)) for i in range(0, 10) ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        c = pact.split.SilenceCache('test/assets/testing.mp3', -20, 0.3)
+        self.assertEqual(len(c.scans), 10)
+
+
+class TestSplit_resumable_raw_chunks(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(helpers.use_test_cache_dir())
+        self.orig_interval = pact.split.ScanCheckpoint.SAVE_INTERVAL
+        pact.split.ScanCheckpoint.SAVE_INTERVAL = 0
+
+    def tearDown(self):
+        pact.split.ScanCheckpoint.SAVE_INTERVAL = self.orig_interval
+
+    def scan(self, onChunkStartFound = lambda ms: None):
+        return pact.split.resumable_raw_chunks(
+            in_filename = 'test/assets/testing.mp3',
+            silence_threshold = -10,
+            silence_duration = 0.3,
+            onChunkStartFound = onChunkStartFound)
+
+    def test_same_as_raw_chunks_and_checkpoint_cleared(self):
+        expected = pact.split.raw_chunks('test/assets/testing.mp3', -10, 0.3)
+        self.assertEqual(self.scan(), expected)
+        c = pact.split.ScanCheckpoint('test/assets/testing.mp3', -10, 0.3)
+        self.assertEqual(c.events, [])
+
+    def test_interrupted_scan_resumes_from_checkpoint(self):
+        expected = pact.split.raw_chunks('test/assets/testing.mp3', -10, 0.3)
+
+        found = []
+        def crash_at_third(ms):
+            found.append(ms)
+            if len(found) == 3:
+                raise Exception('crash')
+        with self.assertRaises(Exception):
+            self.scan(crash_at_third)
+
+        c = pact.split.ScanCheckpoint('test/assets/testing.mp3', -10, 0.3)
+        self.assertEqual(c.offset_ms, found[1], 'resumes at last chunk start')
+
+        real_events = pact.split.silence_events
+        resumed_at = []
+        def events(*args, **kwargs):
+            resumed_at.append(kwargs['start_ms'])
+            return real_events(*args, **kwargs)
+        with patch('pact.split.silence_events', side_effect = events):
+            found = []
+            actual = self.scan(lambda ms: found.append(ms))
+
+        self.assertEqual(resumed_at, [c.offset_ms])
+        self.assertEqual(actual, expected)
+        self.assertEqual(found, [ ch[0] for ch in expected if ch[0] > 0 ])
+
+
+class TestSplit_SilenceIndex(unittest.TestCase):
+
+    def setUp(self):
+        chunks = pact.split.raw_chunks(
+            in_filename = 'test/assets/testing.mp3',
+            silence_threshold = -10,
+            silence_duration = 0.3
+        )
+        self.index = pact.split.SilenceIndex(chunks)
+
+    def test_chunks_between_matches_raw_chunks(self):
+        cases = [
+            [ 7320, 10400, [(7645, 8379), (8893, 9998)] ],
+            [ 8000, 8800, [(8000, 8379)] ],
+            [ 7320, 8200, [(7645, 8200)] ],
+            [ 7800, 8200, [(7800, 8200)] ],
+            [ 10000, 10400, [] ]
+        ]
+        for c in cases:
+            self.assertEqual(self.index.chunks_between(c[0], c[1]), c[2])
+
+    def test_segment_start_times(self):
+        actual = self.index.segment_start_times(7320, 10400, min_duration_ms = 1000, shift_ms = 200)
+        self.assertEqual(actual, [7645, 8693])
+
+
 class TestSplit_silences(unittest.TestCase):
 
     def test_two_chunks(self):
@@ -2,6 +2,8 @@ import unittest
 import sys
 import os
 
+import helpers
+import pact.pcm
 import pact.utils
 
 class TestUtils_timeutils(unittest.TestCase):
@@ -81,3 +83,51 @@ class TestUtils_Recent(unittest.TestCase):
 
         loaded = pact.utils.Recent(self.size, self.filename)
         self.assertEqual(loaded.entries, self.recent.entries, 'loaded')
+
+
+class TestUtils_ClipCache(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(helpers.use_test_cache_dir(clear = False))
+        self.mp3 = 'test/assets/testing.mp3'
+
+    def test_repeated_clip_is_a_hit(self):
+        cache = pact.utils.ClipCache()
+        a = cache.get(self.mp3, 1000, 2000)
+        b = cache.get(self.mp3, 1000, 2000)
+        self.assertIs(a, b)
+        self.assertEqual(len(a), 1000)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.get(self.mp3, 1000, 2500)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_speech_clips_cached_separately(self):
+        cache = pact.utils.ClipCache()
+        full = cache.get(self.mp3, 1000, 2000)
+        speech = cache.speech(self.mp3, 1000, 2000)
+        self.assertEqual((speech.frame_rate, speech.channels), (pact.pcm.ANALYSIS_RATE, 1))
+        self.assertNotEqual(full.frame_rate, speech.frame_rate)
+        self.assertIs(cache.speech(self.mp3, 1000, 2000), speech)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        expected = pact.pcm.speech_segment(self.mp3, 1000, 2000)
+        self.assertEqual(speech.raw_data, expected.raw_data)
+
+    def test_least_recently_used_is_evicted(self):
+        clip_bytes = len(pact.utils.ClipCache().get(self.mp3, 0, 1000).raw_data)
+        cache = pact.utils.ClipCache(max_bytes = 2 * clip_bytes)
+        cache.get(self.mp3, 0, 1000)
+        cache.get(self.mp3, 1000, 2000)
+        cache.get(self.mp3, 0, 1000)
+        cache.get(self.mp3, 2000, 3000)  # evicts 1000-2000
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.size, 2 * clip_bytes)
+
+        cache.get(self.mp3, 0, 1000)
+        self.assertEqual(cache.hits, 2)
+        cache.get(self.mp3, 1000, 2000)
+        self.assertEqual(cache.misses, 4)
+
+    def test_clip_bigger_than_budget_not_cached(self):
+        cache = pact.utils.ClipCache(max_bytes = 10)
+        cache.get(self.mp3, 0, 1000)
+        self.assertEqual(cache.stats()['clips'], 0)
@@ -0,0 +1,154 @@
+import unittest
+import sys
+import os
+import json
+import threading
+import numpy as np
+import pydub
+import vosk
+
+sys.path.append(os.path.abspath(sys.path[0]) + '/../')
+import helpers
+from pact.plugins.transcription import vosktranscription
+
+
+class RecordingRecognizer(helpers.FakeRecognizer):
+    """Records what it's fed, and finishes a result every second
+    chunk, "recognized" as the chunk's size."""
+
+    def __init__(self):
+        super().__init__(None, 16000)
+        self.fed = []
+
+    def AcceptWaveform(self, data):
+        super().AcceptWaveform(data)
+        # data is a cffi buffer, like the real KaldiRecognizer gets.
+        self.fed.append(bytes(vosk._ffi.buffer(data, len(data))))
+        return len(self.fed) % 2 == 0
+
+    def Result(self):
+        return json.dumps({ 'text': str(len(self.fed[-1])) })
+
+
+class TestVosk_feed_recognizer(unittest.TestCase):
+
+    def test_feeds_all_data_in_chunks(self):
+        samples = np.arange(0, 10000, dtype = np.int16)
+        rec = RecordingRecognizer()
+        finished = []
+        cb = vosktranscription.TranscriptionCallback(on_finished = lambda s: finished.append(s))
+        vosktranscription.feed_recognizer(rec, samples, cb)
+
+        self.assertEqual([ len(d) for d in rec.fed ], [ 8000, 8000, 4000, 0 ])
+        self.assertEqual(b''.join(rec.fed), samples.tobytes())
+        self.assertEqual(finished, [ '8000. 0. 625' ], 'last is the 20000 bytes as ms')
+
+    def test_stopped(self):
+        rec = RecordingRecognizer()
+        finished = []
+        cb = vosktranscription.TranscriptionCallback(on_finished = lambda s: finished.append(s))
+        cb.stop()
+        vosktranscription.feed_recognizer(rec, np.zeros(10000, np.int16), cb)
+        self.assertEqual(rec.fed, [])
+        self.assertEqual(finished, [])
+
+    def test_memoryview_backed_segment(self):
+        samples = np.arange(0, 100, dtype = np.int16)
+        seg = pydub.AudioSegment(
+            data = memoryview(samples).cast('B'), sample_width = 2, frame_rate = 16000, channels = 1)
+        rec = RecordingRecognizer()
+        vosktranscription.feed_recognizer(rec, seg.raw_data, vosktranscription.TranscriptionCallback())
+        self.assertEqual(b''.join(rec.fed), samples.tobytes())
+
+
+class TestVosk_ModelRegistry(unittest.TestCase):
+
+    def setUp(self):
+        helpers.FakeModel.loads = []
+        helpers.FakeModel.load_seconds = 0.05
+        self.addCleanup(setattr, helpers.FakeModel, 'load_seconds', 0)
+        self.registry = vosktranscription.ModelRegistry(helpers.FakeModel)
+
+    def test_model_loaded_once_and_shared(self):
+        m = self.registry.get('model/a')
+        self.assertIs(self.registry.get('model/a'), m)
+        self.assertIs(self.registry.get('model/../model/a'), m, 'same dir')
+        self.assertIsNot(self.registry.get('model/b'), m)
+        self.assertEqual(helpers.FakeModel.loads, [ 'model/a', 'model/b' ])
+
+    def test_get_waits_for_preload(self):
+        self.registry.preload('model/a')
+        self.registry.preload('model/a')
+        results = []
+        threads = [
+            threading.Thread(target = lambda: results.append(self.registry.get('model/a')))
+            for i in range(0, 3)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(helpers.FakeModel.loads), 1)
+        self.assertEqual(len(set([ id(m) for m in results ])), 1)
+
+    def test_stats(self):
+        self.assertEqual(self.registry.stats(), {})
+        self.registry.get('model/a')
+        stats = self.registry.stats()[os.path.abspath('model/a')]
+        self.assertGreaterEqual(stats['load_seconds'], 0.05)
+        self.assertIsNone(stats['error'])
+        if sys.platform.startswith('linux'):
+            self.assertGreater(stats['rss_mb_after'], 0)
+
+    def test_load_error(self):
+        with self.assertRaises(Exception):
+            self.registry.get('model/bad')
+        self.assertIsNotNone(self.registry.stats()[os.path.abspath('model/bad')]['error'])
+
+
+class TestVosk_TranscriptionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(helpers.use_test_cache_dir())
+        vosktranscription._caches.clear()
+        self.mp3 = 'test/assets/testing.mp3'
+        self.results = [
+            { 'text': 'uno dos', 'result': [
+                { 'word': 'uno', 'start': 0.1, 'end': 0.5, 'conf': 1.0 },
+                { 'word': 'dos', 'start': 0.6, 'end': 1.0, 'conf': 0.9 } ] },
+            { 'text': 'tres', 'result': [
+                { 'word': 'tres', 'start': 1.5, 'end': 2.0, 'conf': 1.0 } ] }
+        ]
+
+
+    def test_same_clip_from_disk(self):
+        c = vosktranscription.TranscriptionCache(self.mp3, 'model-a')
+        self.assertIsNone(c.get(1000, 3000))
+        c.add(1000, 3000, self.results)
+
+        c = vosktranscription.TranscriptionCache(self.mp3, 'model-a')
+        self.assertEqual(c.get(1000, 3000), 'uno dos. tres')
+        self.assertIsNone(vosktranscription.TranscriptionCache(self.mp3, 'model-b').get(1000, 3000))
+
+    def test_clip_inside_cached_clip_uses_words(self):
+        c = vosktranscription.TranscriptionCache(self.mp3, 'model-a')
+        c.add(1000, 3000, self.results)
+        self.assertEqual(c.get(1500, 3000), 'dos. tres')
+        self.assertEqual(c.get(1000, 2000), 'uno dos')
+        self.assertEqual(c.get(950, 3050), 'uno dos. tres', 'within tolerance')
+        self.assertEqual(c.get(950, 3050), c.get(1000, 3000), 'same text as the exact clip')
+        self.assertIsNone(c.get(500, 3000), 'not covered')
+
+    def test_strategy_uses_cache(self):
+        os.makedirs('test/generated-ignored/model', exist_ok = True)
+        strategy = vosktranscription.VoskTranscriptionStrategy('test/generated-ignored/model')
+        strategy.transcription_cache(self.mp3).add(1000, 3000, self.results)
+        finished = []
+        strategy.start(
+            None, None, None, lambda s: finished.append(s),
+            clip = (self.mp3, 1000, 3000))
+        self.assertEqual(finished, [ 'uno dos. tres' ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,7 @@ import sys
 import os
 
 sys.path.append(os.path.abspath(sys.path[0]) + '/../')
-from pact.widgets import SliderMarkersWidget
+from pact.widgets import SliderMarkersWidget, WaveformWidget
 
 class TestSliderMarkersWidgetHelper(unittest.TestCase):
 
@@ -53,3 +53,78 @@ class TestSliderMarkersWidgetHelper(unittest.TestCase):
             500 * location, 10
         )
         self.assertEqual(expected_coords, c)
+
+
+class FakeCanvas:
+    """Records canvas calls, so widgets can be tested without a display."""
+    def __init__(self):
+        self.items = {}
+        self.next_id = 1
+        self.coords_calls = 0
+
+    def _create(self, kind, *coords, **kwargs):
+        i = self.next_id
+        self.next_id += 1
+        self.items[i] = (kind, coords)
+        return i
+
+    def create_line(self, *coords, **kwargs):
+        return self._create('line', *coords)
+
+    def create_rectangle(self, *coords, **kwargs):
+        return self._create('rectangle', *coords)
+
+    def delete(self, i):
+        del self.items[i]
+
+    def coords(self, i, *coords):
+        self.coords_calls += 1
+        self.items[i] = (self.items[i][0], coords)
+
+    def tag_lower(self, i):
+        pass
+
+    def kinds(self):
+        return sorted([ v[0] for v in self.items.values() ])
+
+
+class TestWaveformWidget(unittest.TestCase):
+
+    def test_envelope_coordinates(self):
+        times = [ 100, 100, 150, 150, 200, 200 ]
+        signal = [ -10, 20, -40, 40, 0, 0 ]
+        c = WaveformWidget.envelope_coordinates(times, signal, 100, 200, 500, 42)
+        expected = (
+            0, 26, 0, 11,
+            250, 41, 250, 1,
+            500, 21, 500, 21
+        )
+        self.assertEqual(c, expected, 'loudest point fills the height')
+
+    def test_empty_signal(self):
+        self.assertEqual(WaveformWidget.envelope_coordinates([], [], 0, 100, 500, 30), ())
+
+    def test_signal_and_breaks_replace_old_ones(self):
+        c = FakeCanvas()
+        w = WaveformWidget(c, 500, 30, 0, 100)
+        w.set_signal([ 0, 0, 100, 100 ], [ -1, 1, -1, 1 ])
+        w.set_breaks([ 10, 20 ])
+        self.assertEqual(c.kinds(), [ 'line', 'line', 'line' ])
+        w.set_breaks([ 50 ])
+        w.set_signal([ 0, 0, 100, 100 ], [ -2, 2, -2, 2 ])
+        self.assertEqual(c.kinds(), [ 'line', 'line' ])
+
+    def test_clip_bounds_moved_not_redrawn(self):
+        c = FakeCanvas()
+        w = WaveformWidget(c, 500, 30, 0, 100)
+        w.set_signal([ 0, 0, 100, 100 ], [ -1, 1, -1, 1 ])
+        w.set_clip_bounds(10, 20)
+        rect = w.clip_rect
+        self.assertEqual(c.items[rect], ('rectangle', (50, 0, 100, 30)))
+        w.set_clip_bounds(20, 40)
+        self.assertEqual(w.clip_rect, rect)
+        self.assertEqual(c.coords_calls, 1)
+        self.assertEqual(c.items[rect], ('rectangle', (100, 0, 200, 30)))
+        self.assertEqual(len(c.items), 2, 'signal untouched')
+        w.set_clip_bounds(40, 40)
+        self.assertEqual(c.kinds(), [ 'line' ])
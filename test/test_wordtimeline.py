@@ -0,0 +1,90 @@
+import unittest
+import sys
+import os
+import json
+import shutil
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(sys.path[0]) + '/../')
+import helpers
+from pact.wordtimeline import WordTimeline
+from pact.plugins.transcription import vosktranscription
+
+
+class TestWordTimeline(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(helpers.use_test_cache_dir(clear = False))
+        self.dir = 'test/generated-ignored/timeline'
+        if os.path.exists(self.dir):
+            shutil.rmtree(self.dir)
+        os.makedirs(self.dir)
+        self.mp3 = 'test/assets/testing.mp3'
+        self.path = WordTimeline.path_for(f'{self.dir}/session.pact')
+
+
+    def timeline(self, model = 'model-a'):
+        return WordTimeline(self.path, self.mp3, model)
+
+    def test_path_next_to_session(self):
+        self.assertEqual(WordTimeline.path_for('a/b/session.pact'), 'a/b/session.words.json')
+
+    def test_words_between(self):
+        t = self.timeline()
+        t.add_words([ (100, 400, 'uno', 1.0), (500, 900, 'dos', 0.5), (1500, 1800, 'tres', 0.9) ], 2000)
+        self.assertEqual(t.text(0, 2000), 'uno dos tres')
+        self.assertEqual(t.text(500, 1500), 'dos')
+        self.assertEqual(t.text(450, 1600), 'dos tres')
+        self.assertEqual(t.text(2000, 3000), '')
+        self.assertTrue(t.covers(0, 2000))
+        self.assertFalse(t.covers(1000, 2500))
+        t.finish()
+        self.assertTrue(t.covers(1000, 2500))
+
+    def test_save_and_reload(self):
+        t = self.timeline()
+        t.add_words([ (100.4, 400.6, 'uno', 0.987654) ], 1000)
+        t.save()
+
+        loaded = self.timeline()
+        self.assertEqual(loaded.words, [ (100, 401, 'uno', 0.99) ])
+        self.assertEqual(loaded.done_ms, 1000)
+        self.assertFalse(loaded.complete)
+        self.assertEqual(self.timeline('model-b').words, [], 'other model ignored')
+
+    def test_transcribe_track_resumes(self):
+
+        class FakeRecognizer:
+            """A result with one word every 16 chunks (4 seconds)."""
+            def __init__(self, model, rate):
+                self.chunks = 0
+                self.results = 0
+            def SetWords(self, b):
+                pass
+            def AcceptWaveform(self, data):
+                self.chunks += 1
+                return self.chunks % 16 == 0
+            def Result(self):
+                self.results += 1
+                return json.dumps({ 'result': [ { 'word': f'w{self.results}', 'start': 1.0, 'end': 1.5, 'conf': 1.0 } ] })
+            def FinalResult(self):
+                return json.dumps({ 'text': '' })
+
+        t = self.timeline()
+        stops = iter([ False ] * 40 + [ True ])
+        with patch.object(vosktranscription, 'KaldiRecognizer', FakeRecognizer):
+            vosktranscription.transcribe_track(self.mp3, None, t, should_stop = lambda: next(stops))
+            self.assertEqual(t.done_ms, 8000)
+            self.assertEqual(t.text(0, 20000), 'w1 w2')
+            self.assertFalse(self.timeline().complete)
+
+            resumed = self.timeline()
+            vosktranscription.transcribe_track(self.mp3, None, resumed)
+
+        self.assertTrue(resumed.complete)
+        self.assertEqual(resumed.words[2][0:3], (9000, 9500, 'w1'))
+        self.assertTrue(self.timeline().complete, 'saved')
+
+
+if __name__ == '__main__':
+    unittest.main()